@@ -0,0 +1,78 @@
+"""Compares the single-pass HTMLRenderer with the previous rendering path
+
+The previous path rendered the client HTML and then restyled every cell
+through a BeautifulSoup DOM. It is only measured when beautifulsoup4 is
+installed.
+
+Usage:
+    python benchmarks/bench_html_renderer.py [--cells 10000 100000 1000000]
+"""
+
+# Copyright (c) MariaDB Foundation.
+# Distributed under the terms of the Modified BSD License.
+
+import argparse
+import time
+
+from mariadb_kernel.html_renderer import HTMLRenderer
+from mariadb_kernel.result_set import ResultSet
+
+NUM_COLUMNS = 10
+
+
+def make_result_set(num_cells):
+    columns = [f"column_{i}" for i in range(NUM_COLUMNS)]
+    rs = ResultSet(columns)
+    for r in range(num_cells // NUM_COLUMNS):
+        rs.append_row([f"value <{r}, {c}>" for c in range(NUM_COLUMNS)])
+    return rs
+
+
+def legacy_render(rs):
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(rs.to_html(), "html.parser")
+    for cell in soup.find_all(["td", "th"]):
+        cell["style"] = "text-align:left;white-space:pre"
+    return str(soup)
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    out = func(*args)
+    return time.perf_counter() - start, len(out)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--cells", type=int, nargs="+", default=[10000, 100000, 1000000])
+    ap.add_argument(
+        "--legacy-max-cells",
+        type=int,
+        default=100000,
+        help="Skip the BeautifulSoup path above this many cells (it is slow)",
+    )
+    args = ap.parse_args()
+
+    try:
+        import bs4
+    except ImportError:
+        bs4 = None
+
+    renderer = HTMLRenderer()
+    print(
+        f"{'cells':>10} {'renderer (s)':>14} {'size (KiB)':>11} {'legacy (s)':>11} {'size (KiB)':>11}"
+    )
+    for cells in args.cells:
+        rs = make_result_set(cells)
+        new_time, new_size = timed(renderer.render, rs)
+        line = f"{cells:>10} {new_time:>14.3f} {new_size / 1024:>11.0f}"
+        if bs4 is not None and cells <= args.legacy_max_cells:
+            old_time, old_size = timed(legacy_render, rs)
+            line += f" {old_time:>11.3f} {old_size / 1024:>11.0f}"
+            line += f"   ({old_time / new_time:.0f}x faster)"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
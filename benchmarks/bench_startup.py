@@ -0,0 +1,97 @@
+"""Measures how long importing the kernel takes, module by module
+
+Every run imports the kernel in a fresh interpreter started with
+-X importtime, the table shows the median cumulative and self import
+times of the slowest modules. The modules the kernel should only import
+when a cell needs them are listed if they were loaded at startup.
+
+Usage:
+    python benchmarks/bench_startup.py [--runs 5] [--top 20]
+"""
+
+# Copyright (c) MariaDB Foundation.
+# Distributed under the terms of the Modified BSD License.
+
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+# Modules that must not be imported before a cell uses them
+LAZY_MODULES = ("pandas", "numpy", "matplotlib", "json2html", "bs4", "pymysql")
+
+CHECK = "import sys; print(' '.join(m for m in {} if m in sys.modules))"
+
+
+def import_times(module):
+    """Imports module in a new interpreter, returns the wall time and
+    {module: (cumulative usec, self usec)}"""
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    wall = time.perf_counter() - start
+
+    times = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        if not self_us.strip().isdigit():
+            # The header line
+            continue
+        times[name.strip()] = (int(cumulative_us), int(self_us))
+    return wall, times
+
+
+def loaded_lazy_modules(module):
+    code = f"import {module}; " + CHECK.format(LAZY_MODULES)
+    out = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    )
+    return out.stdout.split()
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--module", default="mariadb_kernel.kernel")
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--top", type=int, default=20, help="Number of modules shown")
+    args = ap.parse_args()
+
+    walls = []
+    runs = []
+    for _ in range(args.runs):
+        wall, times = import_times(args.module)
+        walls.append(wall)
+        runs.append(times)
+
+    medians = {}
+    for name in runs[0]:
+        samples = [times[name] for times in runs if name in times]
+        medians[name] = (
+            statistics.median(cumulative for cumulative, _ in samples),
+            statistics.median(own for _, own in samples),
+        )
+
+    print(f"{'module':<50} {'cumulative (ms)':>16} {'self (ms)':>10}")
+    slowest = sorted(medians.items(), key=lambda item: item[1][0], reverse=True)
+    for name, (cumulative, own) in slowest[: args.top]:
+        print(f"{name:<50} {cumulative / 1000:>16.1f} {own / 1000:>10.1f}")
+
+    print()
+    print(f"Interpreter start and import of {args.module}: ", end="")
+    print(f"{statistics.median(walls):.3f} s (median of {args.runs} runs)")
+    loaded = loaded_lazy_modules(args.module)
+    if loaded:
+        print("Imported at startup, but should be lazy:", ", ".join(loaded))
+    else:
+        print("None of", ", ".join(LAZY_MODULES), "were imported")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Measures the per statement cost of handing code over to the client
+
+The previous path created .mariadb_statement in the current directory,
+wrote the statement, and unlinked the file after every statement. The
+StatementFile used now is created once per client in a private directory
+(on /dev/shm when available) and rewritten in place.
+
+Only the file handling is measured, no client or server is needed.
+
+Usage:
+    python benchmarks/bench_statement_file.py [--statements 10000] [--size 200]
+"""
+
+# Copyright (c) MariaDB Foundation.
+# Distributed under the terms of the Modified BSD License.
+
+import argparse
+import time
+from pathlib import Path
+
+from mariadb_kernel.mariadb_client import StatementFile
+
+
+def legacy_write(code):
+    statement_file_path = Path.cwd().joinpath(".mariadb_statement")
+    with statement_file_path.open("w") as f:
+        f.write(code)
+    statement_file_path.unlink()
+
+
+def timed(func, code, num_statements):
+    start = time.perf_counter()
+    for _ in range(num_statements):
+        func(code)
+    return time.perf_counter() - start
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--statements", type=int, default=10000)
+    ap.add_argument(
+        "--size", type=int, default=200, help="Length of a statement in bytes"
+    )
+    args = ap.parse_args()
+
+    code = "select '" + "x" * max(0, args.size - 10) + "';"
+
+    old_time = timed(legacy_write, code, args.statements)
+    statement_file = StatementFile()
+    try:
+        new_time = timed(statement_file.write, code, args.statements)
+    finally:
+        statement_file.remove()
+
+    print(f"{'path':>16} {'per statement (us)':>19}")
+    print(f"{'legacy':>16} {old_time / args.statements * 1e6:>19.1f}")
+    print(f"{'StatementFile':>16} {new_time / args.statements * 1e6:>19.1f}")
+    print(f"({old_time / new_time:.1f}x faster, in {statement_file.dir})")
+
+
+if __name__ == "__main__":
+    main()
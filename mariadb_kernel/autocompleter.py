@@ -0,0 +1,194 @@
+"""Completion of the code typed in a cell
+
+Keywords, built-in functions and magic commands are known upfront, the
+names of databases, tables, columns and stored routines come from a
+SchemaIndex, so answering a completion request doesn't need a query once
+the index is warm.
+"""
+
+# Copyright (c) MariaDB Foundation.
+# Distributed under the terms of the Modified BSD License.
+
+import re
+
+from mariadb_kernel.maria_magics import supported_magics
+from mariadb_kernel.maria_magics.cell_magic import CellMagic
+from mariadb_kernel.schema_index import (
+    PrefixList,
+    quote_identifier,
+    split_name,
+    unquote,
+)
+
+KEYWORDS = (
+    "ADD ALL ALTER ANALYZE AND AS ASC AUTO_INCREMENT BEFORE BEGIN BETWEEN "
+    "BIGINT BINARY BLOB BOTH BY CALL CASCADE CASE CHANGE CHAR CHARACTER "
+    "CHECK COLLATE COLUMN COLUMNS COMMENT COMMIT CONSTRAINT CREATE CROSS "
+    "CURRENT_DATE CURRENT_TIMESTAMP DATABASE DATABASES DATE DATETIME DECIMAL "
+    "DECLARE DEFAULT DELETE DELIMITER DESC DESCRIBE DISTINCT DIV DO DOUBLE "
+    "DROP DUPLICATE EACH ELSE ELSEIF END ENGINE ENUM ESCAPE EVENT EXCEPT "
+    "EXISTS EXPLAIN FALSE FETCH FLOAT FLUSH FOR FOREIGN FROM FULL FULLTEXT "
+    "FUNCTION GRANT GROUP HANDLER HAVING IF IGNORE IN INDEX INDEXES INFILE "
+    "INNER INSERT INT INTEGER INTERSECT INTERVAL INTO IS ITERATE JOIN JSON "
+    "KEY KEYS KILL LEADING LEAVE LEFT LIKE LIMIT LINES LOAD LOCAL LOCK LONGTEXT "
+    "LOOP MEDIUMINT MODIFY NATURAL NOT NULL OFFSET ON OPTIMIZE OR ORDER OUTER "
+    "OUTFILE OVER PARTITION PRIMARY PROCEDURE PROCESSLIST QUERY RANGE READ "
+    "REFERENCES REGEXP RENAME REPAIR REPEAT REPLACE RETURN RETURNS REVOKE "
+    "RIGHT RLIKE ROLLBACK ROW ROWS SCHEMA SCHEMAS SELECT SEQUENCE SESSION SET "
+    "SHOW SIGNAL SMALLINT START STATUS TABLE TABLES TEMPORARY TEXT THEN TIME "
+    "TIMESTAMP TINYINT TO TRANSACTION TRIGGER TRUE TRUNCATE UNION UNIQUE "
+    "UNLOCK UNSIGNED UPDATE USE USING VALUES VARCHAR VARIABLES VIEW WARNINGS "
+    "WHEN WHERE WHILE WINDOW WITH WRITE XOR ZEROFILL"
+).split()
+
+FUNCTIONS = (
+    "ABS AVG BIT_AND BIT_OR CAST CEIL CEILING CHAR_LENGTH COALESCE CONCAT "
+    "CONCAT_WS CONVERT COUNT CURDATE CURTIME DATE_ADD DATE_FORMAT DATE_SUB "
+    "DATEDIFF DAY DAYNAME DAYOFWEEK DAYOFYEAR DENSE_RANK EXP EXTRACT FIELD "
+    "FIND_IN_SET FIRST_VALUE FLOOR FORMAT FROM_UNIXTIME GREATEST "
+    "GROUP_CONCAT HEX HOUR IFNULL INET_ATON INET_NTOA INSTR ISNULL "
+    "JSON_ARRAY JSON_CONTAINS JSON_EXTRACT JSON_OBJECT JSON_VALUE LAG "
+    "LAST_INSERT_ID LAST_VALUE LCASE LEAD LEAST LENGTH LN LOCATE LOG LOWER "
+    "LPAD LTRIM MAX MD5 MICROSECOND MIN MINUTE MOD MONTH MONTHNAME NOW "
+    "NTILE NULLIF PERCENT_RANK POW POWER QUARTER RAND RANK REGEXP_REPLACE "
+    "REGEXP_SUBSTR REVERSE ROUND ROW_NUMBER RPAD RTRIM SECOND SHA1 SHA2 "
+    "SIGN SLEEP SQRT STD STDDEV STR_TO_DATE SUBSTR SUBSTRING SUBSTRING_INDEX "
+    "SUM SYSDATE TIMEDIFF TIMESTAMPDIFF TO_DAYS TRIM TRUNCATE UCASE UNHEX "
+    "UNIX_TIMESTAMP UPPER UUID VARIANCE WEEK WEEKDAY YEAR"
+).split()
+
+_NAME = r"(?:`[^`]*`|[\w$]+)"
+# The (possibly qualified and partially typed) name before the cursor
+_TYPED_NAME = re.compile(rf"((?:{_NAME}\.)*)(`[^`]*|[\w$]*)$")
+_TYPED_MAGIC = re.compile(r"(?:^|\n)[ \t]*(%%?\w*)$")
+_TABLE_LIST = re.compile(
+    r"\b(?:FROM|JOIN|UPDATE|INTO|TABLE|DESCRIBE|DESC)\s+", re.IGNORECASE
+)
+_TABLE_REF = re.compile(
+    rf"({_NAME}(?:\.{_NAME})?)(?:\s+(?:AS\s+)?(?!(?:{'|'.join(KEYWORDS)})\b)([\w$]+))?"
+    r"\s*(,\s*)?",
+    re.IGNORECASE,
+)
+_PLAIN_NAME = re.compile(r"^[A-Za-z_$][\w$]*$")
+
+
+def _quote(name):
+    if _PLAIN_NAME.match(name):
+        return name
+    return quote_identifier(name)
+
+
+def table_references(code):
+    """Returns {alias or table name: (database, table)} for the tables
+    the code refers to, database is None if the name isn't qualified"""
+    refs = {}
+    for m in _TABLE_LIST.finditer(code):
+        pos = m.end()
+        while True:
+            ref = _TABLE_REF.match(code, pos)
+            if ref is None:
+                break
+            schema, table = split_name(ref.group(1))
+            refs[(ref.group(2) or table).lower()] = (schema, table)
+            if not ref.group(3):
+                break
+            pos = ref.end()
+    return refs
+
+
+class Autocompleter:
+    def __init__(self, schema_index):
+        self.index = schema_index
+        self.magics = None
+
+    def _magic_names(self):
+        if self.magics is None:
+            names = []
+            for name, magic in supported_magics.get().items():
+                prefix = "%%" if issubclass(magic, CellMagic) else "%"
+                names.append(prefix + name)
+            self.magics = PrefixList(names)
+        return self.magics
+
+    def complete(self, code, cursor_pos, database):
+        """Returns the content of a complete_reply, database is the current
+        database of the session"""
+        before = code[:cursor_pos]
+
+        magic = _TYPED_MAGIC.search(before)
+        if magic:
+            typed = magic.group(1)
+            return self._reply(self._magic_names().matches(typed), cursor_pos, typed)
+
+        typed_name = _TYPED_NAME.search(before)
+        qualifier = typed_name.group(1)
+        typed = typed_name.group(2)
+        prefix = unquote(typed.lstrip("`"))
+
+        if qualifier:
+            names = self._qualified_matches(qualifier[:-1], prefix, code, database)
+        else:
+            names = self._matches(prefix, code, database)
+
+        matches = []
+        seen = set()
+        for name in names:
+            text = _quote(name)
+            if typed.startswith("`") and not text.startswith("`"):
+                text = f"`{text}`"
+            if text not in seen:
+                seen.add(text)
+                matches.append(text)
+        return self._reply(matches, cursor_pos, typed)
+
+    def _reply(self, matches, cursor_pos, typed):
+        return {
+            "status": "ok",
+            "matches": matches,
+            "cursor_start": cursor_pos - len(typed),
+            "cursor_end": cursor_pos,
+            "metadata": {},
+        }
+
+    def _qualified_matches(self, qualifier, prefix, code, database):
+        schema, name = split_name(qualifier)
+        if schema is not None:
+            # db.table.<column>
+            return self.index.get_columns(schema, name).matches(prefix)
+
+        matches = []
+        ref = table_references(code).get(name.lower())
+        if ref is not None:
+            # alias.<column>
+            ref_schema, table = ref
+            columns = self.index.get_columns(ref_schema or database, table)
+            matches.extend(columns.matches(prefix))
+        elif name in self.index.get_tables(database):
+            # table.<column>
+            matches.extend(self.index.get_columns(database, name).matches(prefix))
+
+        if name in self.index.get_databases():
+            # db.<table>
+            matches.extend(self.index.get_tables(name).matches(prefix))
+        return matches
+
+    def _matches(self, prefix, code, database):
+        matches = []
+        for schema, table in table_references(code).values():
+            columns = self.index.get_columns(schema or database, table)
+            matches.extend(columns.matches(prefix))
+        if not prefix:
+            # Everything matches an empty prefix, only offer the columns
+            return matches
+
+        matches.extend(self.index.get_tables(database).matches(prefix))
+        matches.extend(self.index.get_databases().matches(prefix))
+
+        matches.extend(self.index.get_routines().matches(prefix))
+
+        # Keywords follow the case the user types them in
+        upper = prefix.upper()
+        lower = prefix == prefix.lower()
+        builtins = sorted({n for n in FUNCTIONS + KEYWORDS if n.startswith(upper)})
+        matches.extend(n.lower() if lower else n for n in builtins)
+        return matches
@@ -0,0 +1,100 @@
+"""A small least recently used cache whose entries expire"""
+
+# Copyright (c) MariaDB Foundation.
+# Distributed under the terms of the Modified BSD License.
+
+from collections import OrderedDict
+import time
+
+
+class LRUCache:
+    def __init__(
+        self,
+        max_entries,
+        ttl,
+        clock=time.monotonic,
+        max_weight=0,
+        weigh=None,
+        on_evict=None,
+    ):
+        """Keeps at most max_entries entries, each for ttl seconds
+        (0 means entries don't expire).
+
+        If weigh is given, it is called with every value and entries are
+        also evicted while the values weigh more than max_weight in total.
+
+        If on_evict is given, it is called with the key and the value of
+        the entries evicted to stay within the limits.
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+        self.max_weight = max_weight
+        self.weigh = weigh
+        self.on_evict = on_evict
+        self.weight = 0
+        self.entries = OrderedDict()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key, default=None):
+        entry = self.entries.get(key)
+        if entry is None:
+            return default
+
+        value, expires = entry
+        if expires is not None and self.clock() >= expires:
+            self.pop(key)
+            return default
+
+        self.entries.move_to_end(key)
+        return value
+
+    def _weigh(self, value):
+        if self.weigh is None:
+            return 0
+        return self.weigh(value)
+
+    def put(self, key, value):
+        """Adds an entry, values heavier than max_weight are not kept"""
+        self.pop(key)
+        weight = self._weigh(value)
+        if self.max_weight and weight > self.max_weight:
+            self._evicted(key, value)
+            return
+
+        expires = None
+        if self.ttl:
+            expires = self.clock() + self.ttl
+        self.entries[key] = (value, expires)
+        self.weight += weight
+        while len(self.entries) > self.max_entries or (
+            self.max_weight and self.weight > self.max_weight
+        ):
+            oldest = next(iter(self.entries))
+            self._evicted(oldest, self.entries[oldest][0])
+            self.pop(oldest)
+
+    def _evicted(self, key, value):
+        if self.on_evict is not None:
+            self.on_evict(key, value)
+
+    def pop(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.weight -= self._weigh(entry[0])
+
+    def items(self):
+        """Returns the (key, value) pairs, least recently used first"""
+        return [(key, entry[0]) for key, entry in self.entries.items()]
+
+    def discard_if(self, predicate):
+        """Removes the entries for which predicate(key, value) is true"""
+        for key, value in self.items():
+            if predicate(key, value):
+                self.pop(key)
+
+    def clear(self):
+        self.entries.clear()
+        self.weight = 0
@@ -3,9 +3,13 @@
 # Copyright (c) MariaDB Foundation.
 # Distributed under the terms of the Modified BSD License.
 
+import copy
 import os
 import json
 
+# The options telling which server to connect to and as whom
+CONNECTION_KEYS = ("user", "host", "port", "password", "socket")
+
 
 class ClientConfig:
     def __init__(self, log, name="mariadb_config.json"):
@@ -29,6 +33,7 @@ class ClientConfig:
             "server_pid": pidfile,  # Server specific option
             "start_server": "True",
             "client_bin": "mysql",
+            "client_backend": "pexpect",  # "pexpect" or "native"
             "server_bin": "mysqld",
             "db_init_bin": "mysql_install_db",
             "extra_server_config": [
@@ -38,6 +43,24 @@ class ClientConfig:
             "extra_db_init_config": [
                 "--auth-root-authentication-method=normal",
             ],
+            "display_max_rows": "200",  # 0 displays every row
+            "stream_results": "False",
+            # Rows of a streamed result kept in memory, 0 keeps them all
+            "stream_keep_rows": "100000",
+            "result_cache": "False",
+            "result_cache_max_entries": "64",
+            "result_cache_max_cells": "1000000",
+            "result_store_max_bytes": "268435456",
+            "result_store_spill": "True",  # Needs pyarrow
+            "startup_timeout": "60",  # sec a cell waits for the server
+            # sec a query for completion or inspection may take
+            "metadata_timeout": "5",
+            # sec the testing server keeps running once no kernel uses it
+            "server_idle_timeout": "600",
+            # Clients kept connected for the next kernels, 0 disables the pool
+            "client_pool_size": "0",
+            # sec the pool keeps running without any kernel starting
+            "client_pool_idle_timeout": "3600",
             "debug": "False",
         }
 
@@ -92,15 +115,61 @@ class ClientConfig:
 
     def get_args(self):
         rv = ""
-        keys = ["user", "host", "port", "password", "socket"]
-        for key in keys:
+        for key in CONNECTION_KEYS:
             value = self.default_config[key]
+            if key == "socket" and not value:
+                continue
             rv += f"--{key}={value} "
 
         # Disable progress reports in statements like LOAD DATA
         rv += " --disable-progress-reports"
         return rv
 
+    def derive(self, options):
+        """Returns a copy of the config connecting with other connection
+        options, e.g. to another server. Raises ValueError for options
+        that are not connection options"""
+        unknown = set(options) - set(CONNECTION_KEYS)
+        if unknown:
+            raise ValueError(
+                f"Unknown connection options {', '.join(sorted(unknown))}, "
+                f"use {', '.join(CONNECTION_KEYS)}"
+            )
+        rv = copy.copy(self)
+        rv.default_config = dict(self.default_config, **options)
+        # The clients connect to localhost through the socket whatever
+        # the port, another host or port means TCP unless a socket is given
+        if ("host" in options or "port" in options) and "socket" not in options:
+            rv.default_config["socket"] = ""
+            if rv.default_config["host"] == "localhost":
+                rv.default_config["host"] = "127.0.0.1"
+        return rv
+
+    def describe(self):
+        """The server and user of the connection, without the password"""
+        cfg = self.default_config
+        if cfg["host"] == "localhost" and cfg["socket"]:
+            server = cfg["socket"]
+        else:
+            server = f"{cfg['host']}:{cfg['port']}"
+        return f"{cfg['user']}@{server}"
+
+    def get_connection_args(self):
+        """Returns the connection options as keyword arguments for a
+        wire-protocol driver (the "native" client backend)"""
+        cfg = self.default_config
+        rv = {
+            "user": cfg["user"],
+            "password": cfg["password"],
+            "host": cfg["host"],
+            "port": int(cfg["port"]),
+        }
+        # Same rule as the command line client: "localhost" means
+        # connecting through the unix socket
+        if cfg["host"] == "localhost" and cfg["socket"]:
+            rv["unix_socket"] = cfg["socket"]
+        return rv
+
     def get_server_args(self):
         rv = []
         rv.extend(self.default_config["extra_server_config"])
@@ -119,6 +188,11 @@ class ClientConfig:
         rv.extend(self.default_config["extra_db_init_config"])
         return rv
 
+    def server_is_local(self):
+        """Whether the server runs on this host, e.g. it can write the
+        files of SELECT ... INTO OUTFILE for the kernel"""
+        return self.default_config["host"] in ("localhost", "127.0.0.1", "::1")
+
     def get_server_paths(self):
         return [
             os.path.dirname(self.default_config["socket"]),
@@ -126,6 +200,9 @@ class ClientConfig:
             os.path.dirname(self.default_config["server_pid"]),
         ]
 
+    def get_server_datadir(self):
+        return self.default_config["server_datadir"]
+
     def get_server_pidfile(self):
         return self.default_config["server_pid"]
 
@@ -135,11 +212,53 @@ class ClientConfig:
     def client_bin(self):
         return self.default_config["client_bin"]
 
+    def client_backend(self):
+        return self.default_config["client_backend"]
+
     def server_bin(self):
         return self.default_config["server_bin"]
 
     def db_init_bin(self):
         return self.default_config["db_init_bin"]
 
+    def display_max_rows(self):
+        return int(self.default_config["display_max_rows"])
+
+    def stream_results(self):
+        return self.default_config["stream_results"] == "True"
+
+    def stream_keep_rows(self):
+        return int(self.default_config["stream_keep_rows"])
+
+    def result_cache(self):
+        return self.default_config["result_cache"] == "True"
+
+    def result_cache_max_entries(self):
+        return int(self.default_config["result_cache_max_entries"])
+
+    def result_cache_max_cells(self):
+        return int(self.default_config["result_cache_max_cells"])
+
+    def result_store_max_bytes(self):
+        return int(self.default_config["result_store_max_bytes"])
+
+    def result_store_spill(self):
+        return self.default_config["result_store_spill"] == "True"
+
+    def server_idle_timeout(self):
+        return float(self.default_config["server_idle_timeout"])
+
+    def client_pool_size(self):
+        return int(self.default_config["client_pool_size"])
+
+    def client_pool_idle_timeout(self):
+        return float(self.default_config["client_pool_idle_timeout"])
+
+    def startup_timeout(self):
+        return float(self.default_config["startup_timeout"])
+
+    def metadata_timeout(self):
+        return float(self.default_config["metadata_timeout"])
+
     def debug_logging(self):
         return self.default_config["debug"] == "True"
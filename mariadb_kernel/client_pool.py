@@ -0,0 +1,264 @@
+"""A pool of command line clients started ahead of the kernels
+
+Launching the command line client and waiting for its prompt is a large
+part of the time a kernel takes to start. With client_pool_size set, a
+pool daemon keeps that many clients connected and waiting, one pool per
+client command line (i.e. per server, user and options). A starting
+kernel takes one of them: the daemon passes the pseudo-terminal of the
+client over a Unix socket, and the kernel drives it like a client it
+launched itself. The daemon then launches a replacement.
+
+Clients are never given back to the pool, a kernel always gets a client
+whose session was never used. If the pool is empty or not running, the
+kernel launches its client as usual and starts the daemon for the next
+kernels. The daemon exits after client_pool_idle_timeout sec without
+requests.
+
+This file is also the daemon, it is run as a script so it doesn't import
+the kernel. Its options come as a line of JSON on stdin.
+"""
+
+# Copyright (c) MariaDB Foundation.
+# Distributed under the terms of the Modified BSD License.
+
+import fcntl
+import hashlib
+import json
+import os
+import pty
+import queue
+import re
+import select
+import shlex
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import termios
+import threading
+import time
+
+PROMPT = re.compile(rb"MariaDB \[.*\]>[ \t]")
+
+# How long a client may take to show its prompt (sec)
+LAUNCH_TIMEOUT = 30
+
+# How long a kernel waits for the daemon to answer (sec)
+CHECKOUT_TIMEOUT = 1
+
+# Seconds to wait before launching clients again after a failure
+RETRY_DELAY = 5
+
+
+def socket_path(cmd):
+    """The socket of the pool of clients started with cmd"""
+    directory = os.path.join(
+        tempfile.gettempdir(), f"mariadb_kernel_pool_{os.getuid()}"
+    )
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    key = hashlib.sha256(cmd.encode()).hexdigest()[:16]
+    return os.path.join(directory, f"{key}.sock")
+
+
+def checkout(cmd):
+    """Returns the pexpect object of a pooled client started with cmd, or
+    None if the pool has no client ready. Raises OSError if no pool runs"""
+    from pexpect import fdpexpect
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(CHECKOUT_TIMEOUT)
+        sock.connect(socket_path(cmd))
+        sock.sendall(b"checkout\n")
+        msg, fds, _, _ = socket.recv_fds(sock, 16, 1)
+    if msg != b"ok" or not fds:
+        return None
+
+    child = fdpexpect.fdspawn(fds[0], encoding="utf-8")
+    # The daemon turned echo off before launching the client
+    child.echo = False
+    return child
+
+
+def start_daemon(cmd, size, idle_timeout):
+    """Starts the pool daemon of cmd in the background"""
+    proc = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__)],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+    # Not on the command line, it holds the password
+    options = {"cmd": cmd, "size": size, "idle_timeout": idle_timeout}
+    proc.stdin.write(json.dumps(options).encode() + b"\n")
+    proc.stdin.close()
+
+
+def launch(cmd, timeout=LAUNCH_TIMEOUT):
+    """Launches a client on a new pseudo-terminal and waits for its
+    prompt. Returns (pid, fd of the terminal), raises OSError"""
+    argv = shlex.split(cmd)
+    pid, fd = pty.fork()
+    if pid == 0:
+        try:
+            attrs = termios.tcgetattr(0)
+            attrs[3] &= ~termios.ECHO
+            termios.tcsetattr(0, termios.TCSANOW, attrs)
+            os.execvp(argv[0], argv)
+        finally:
+            os._exit(127)
+
+    deadline = time.monotonic() + timeout
+    output = b""
+    try:
+        while not PROMPT.search(output):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not select.select([fd], [], [], remaining)[0]:
+                raise OSError(f"No prompt from {argv[0]} after {timeout} sec")
+            try:
+                data = os.read(fd, 65536)
+            except OSError:
+                data = b""
+            if not data:
+                raise OSError(f"{argv[0]} exited: {output[-200:]!r}")
+            output += data
+    except OSError:
+        os.close(fd)
+        _kill(pid)
+        raise
+    return pid, fd
+
+
+def _kill(pid):
+    try:
+        os.kill(pid, signal.SIGKILL)
+        os.waitpid(pid, 0)
+    except (ProcessLookupError, ChildProcessError):
+        pass
+
+
+def _exited(pid):
+    try:
+        return os.waitpid(pid, os.WNOHANG)[0] != 0
+    except ChildProcessError:
+        return True
+
+
+class Pool:
+    def __init__(self, cmd, size):
+        self.cmd = cmd
+        self.size = size
+        # (pid, fd) of the clients waiting for a kernel
+        self.ready = queue.Queue()
+        # pids of the clients given to kernels, reaped once they exit.
+        # serve() adds to it while fill() reaps, both hold the lock
+        self.handed_out = []
+        self.handed_out_lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.closed = False
+
+    def fill(self):
+        """Keeps size clients ready, runs in a thread"""
+        while not self.closed:
+            self.reap()
+            if self.ready.qsize() < self.size:
+                try:
+                    self.ready.put(launch(self.cmd))
+                    continue
+                except OSError:
+                    # e.g. the server is down, don't spin
+                    self.wakeup.wait(RETRY_DELAY)
+            else:
+                self.wakeup.wait(1)
+            self.wakeup.clear()
+
+    def track(self, pid):
+        """Remembers a client given to a kernel, to reap it once it exits"""
+        with self.handed_out_lock:
+            self.handed_out.append(pid)
+
+    def reap(self):
+        """Forgets the clients given to kernels that exited"""
+        with self.handed_out_lock:
+            self.handed_out = [pid for pid in self.handed_out if not _exited(pid)]
+
+    def checkout(self):
+        """Returns (pid, fd) of a ready client, or None"""
+        while True:
+            try:
+                pid, fd = self.ready.get_nowait()
+            except queue.Empty:
+                return None
+            if not _exited(pid):
+                return pid, fd
+            os.close(fd)
+
+    def serve(self, sock, idle_timeout):
+        """Answers the kernels until idle_timeout sec pass without any"""
+        sock.settimeout(idle_timeout)
+        while True:
+            try:
+                conn, _ = sock.accept()
+            except socket.timeout:
+                return
+            with conn:
+                conn.settimeout(CHECKOUT_TIMEOUT)
+                try:
+                    if conn.recv(64).strip() != b"checkout":
+                        continue
+                    client = self.checkout()
+                    if client is None:
+                        conn.sendall(b"empty")
+                    else:
+                        pid, fd = client
+                        socket.send_fds(conn, [b"ok"], [fd])
+                        os.close(fd)
+                        self.track(pid)
+                except OSError:
+                    continue
+            self.wakeup.set()
+
+    def close(self):
+        self.closed = True
+        self.wakeup.set()
+        while True:
+            try:
+                pid, fd = self.ready.get_nowait()
+            except queue.Empty:
+                break
+            # The client exits when its terminal is hung up
+            os.close(fd)
+            _kill(pid)
+
+
+def main():
+    options = json.loads(sys.stdin.readline())
+    path = socket_path(options["cmd"])
+
+    with open(f"{path}.lock", "a") as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            # Another daemon serves this pool
+            return
+
+        if os.path.exists(path):
+            os.unlink(path)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.bind(path)
+        os.chmod(path, 0o600)
+        sock.listen()
+
+        pool = Pool(options["cmd"], options["size"])
+        threading.Thread(target=pool.fill, daemon=True).start()
+        try:
+            pool.serve(sock, options["idle_timeout"])
+        finally:
+            os.unlink(path)
+            sock.close()
+            pool.close()
+
+
+if __name__ == "__main__":
+    main()
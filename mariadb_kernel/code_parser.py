@@ -2,8 +2,8 @@
 
 The parser walks to the code coming from the kernel and separates it into
 SQL code and magic commands.
-The SQL code is passed further by the kernel to the MariaDB client for
-execution.
+The SQL code is split into statements which are passed further, one by
+one, by the kernel to the MariaDB client for execution.
 The magic objects created here are invoked in the kernel to perform
 their duties.
 """
@@ -13,6 +13,240 @@ their duties.
 
 from mariadb_kernel.maria_magics.magic_factory import MagicFactory
 
+import re
+
+# Statements starting with these words contain a compound statement body,
+# semicolons inside their BEGIN...END blocks don't end the statement
+_ROUTINES = ("PROCEDURE", "FUNCTION", "TRIGGER", "EVENT", "PACKAGE")
+_COMPOUND_CREATE = re.compile(
+    r"CREATE\s+(?:OR\s+REPLACE\s+)?(?:DEFINER\s*=\s*\S+\s+)?(?:AGGREGATE\s+)?"
+    rf"(?:{'|'.join(_ROUTINES)})\b",
+    re.IGNORECASE,
+)
+# END followed by one of these words closes a block that was not counted
+# when it was opened (END CASE closes a counted CASE though)
+_END_OF = ("IF", "LOOP", "WHILE", "REPEAT", "FOR", "CASE")
+
+# Statements that only read data and can safely be run a second time
+_READ_ONLY = ("SELECT", "SHOW", "DESC", "DESCRIBE", "EXPLAIN", "WITH", "HELP")
+
+_NEXT_WORD = re.compile(r"\s*([A-Za-z_]+)")
+_INTO = re.compile(r"\bINTO\b", re.IGNORECASE)
+# The statements a WITH clause can be followed by
+_WITH_VERBS = ("SELECT", "INSERT", "REPLACE", "UPDATE", "DELETE")
+_WITH_TOKEN = re.compile(r"['\"`]|[()]|[A-Za-z_]+")
+# BEGIN NOT ATOMIC starts a compound statement, unlike BEGIN [WORK]
+_COMPOUND_BEGIN = re.compile(r"^BEGIN\s+NOT\s+ATOMIC\b", re.IGNORECASE)
+# DDL changing other tables than the first one it names, e.g.
+# DROP TABLE a, b or ALTER TABLE a RENAME TO b
+_MORE_TABLES = re.compile(r"\s*,|.*\b(?:RENAME|EXCHANGE)\b", re.IGNORECASE | re.DOTALL)
+# Statements that don't change data
+_NO_WRITES = ("USE", "SET", "BEGIN", "START", "COMMIT", "DELIMITER", "HELP")
+_TABLE_NAME = r"((?:`[^`]*`|[\w$]+)(?:\.(?:`[^`]*`|[\w$]+))?)"
+_WRITE_TARGET = re.compile(
+    r"(?:(?:INSERT|REPLACE)\s+(?:(?:LOW_PRIORITY|DELAYED|HIGH_PRIORITY|IGNORE)\s+)*"
+    rf"(?:INTO\s+)?{_TABLE_NAME}"
+    rf"|UPDATE\s+(?:(?:LOW_PRIORITY|IGNORE)\s+)*{_TABLE_NAME}\s+SET\b"
+    r"|DELETE\s+(?:(?:LOW_PRIORITY|QUICK|IGNORE)\s+)*FROM\s+"
+    rf"{_TABLE_NAME}\s*(?:$|;|WHERE\b|ORDER\b|LIMIT\b|RETURNING\b)"
+    rf"|TRUNCATE\s+(?:TABLE\s+)?{_TABLE_NAME}"
+    rf"|LOAD\s+(?:DATA|XML)\b.*?\bINTO\s+TABLE\s+{_TABLE_NAME})",
+    re.IGNORECASE | re.DOTALL,
+)
+_SCHEMA_CHANGE = re.compile(
+    r"^\s*(?:CREATE|ALTER|DROP|RENAME)\s+"
+    r"(?:OR\s+REPLACE\s+|TEMPORARY\s+|ONLINE\s+|IGNORE\s+|UNIQUE\s+"
+    r"|FULLTEXT\s+|SPATIAL\s+|DEFINER\s*=\s*\S+\s+|SQL\s+SECURITY\s+\w+\s+"
+    r"|ALGORITHM\s*=\s*\w+\s+)*"
+    r"(\w+)\s+(?:IF\s+(?:NOT\s+)?EXISTS\s+)?((?:`[^`]*`|[\w$]+)(?:\.(?:`[^`]*`|[\w$]+))?)",
+    re.IGNORECASE,
+)
+_DELIMITER_CMD = re.compile(r"^\s*delimiter\s+(\S+)", re.IGNORECASE)
+_DELIMITER_LINE = re.compile(r"^\s*delimiter\s", re.IGNORECASE | re.MULTILINE)
+_COMMENTS = re.compile(r"--(?=\s|$)[^\n]*|#[^\n]*|/\*.*?\*/", re.DOTALL)
+_QUOTED = {
+    "'": re.compile(r"'(?:[^'\\]|\\.)*(?:'|$)", re.DOTALL),
+    '"': re.compile(r'"(?:[^"\\]|\\.)*(?:"|$)', re.DOTALL),
+    "`": re.compile(r"`[^`]*(?:`|$)"),
+}
+
+
+def _token_regex(delimiter):
+    return re.compile(
+        f"(?P<delimiter>{re.escape(delimiter)})"
+        r"|(?P<quote>['\"`])"
+        r"|(?P<line_comment>--(?=\s|$)|\#)"
+        r"|(?P<block_comment>/\*)"
+        r"|(?P<word>[A-Za-z_][A-Za-z0-9_$]*)"
+    )
+
+
+def delimiter_command(code):
+    """Returns the new delimiter if code is a DELIMITER command, else None"""
+    match = _DELIMITER_CMD.match(code)
+    if match is None:
+        return None
+    return match.group(1)
+
+
+def _with_statement_verb(code):
+    """Returns the first word of the statement following the common table
+    expressions of a WITH statement, None if it can't be found"""
+    depth = 0
+    after_group = False
+    pos = 0
+    while True:
+        m = _WITH_TOKEN.search(code, pos)
+        if m is None:
+            return None
+        token = m.group()
+        pos = m.end()
+        if token in _QUOTED:
+            pos = _QUOTED[token].match(code, m.start()).end()
+        elif token == "(":
+            depth += 1
+        elif token == ")":
+            depth = max(depth - 1, 0)
+            after_group = depth == 0
+        elif depth == 0 and after_group and token.upper() in _WITH_VERBS:
+            return token.upper()
+
+
+def is_read_only(statement):
+    """Tells if statement only reads data, so running it twice is harmless"""
+    code = _COMMENTS.sub(" ", statement)
+    match = _NEXT_WORD.match(code)
+    if match is None or match.group(1).upper() not in _READ_ONLY:
+        return False
+    # WITH ... UPDATE and WITH ... DELETE write
+    if match.group(1).upper() == "WITH" and _with_statement_verb(code) != "SELECT":
+        return False
+    # SELECT ... INTO writes to variables or files
+    return _INTO.search(code) is None
+
+
+def schema_change(statement):
+    """Returns (object type, name) for DDL statements, e.g.
+    ("TABLE", "db.t") for "ALTER TABLE db.t ...", None for other statements"""
+    match = _SCHEMA_CHANGE.match(_COMMENTS.sub(" ", statement))
+    if match is None:
+        return None
+    return match.group(1).upper(), match.group(2)
+
+
+def written_tables(statement):
+    """Returns the names of the tables a statement writes to, or None when
+    it can't be told (e.g. CALL or multi-table statements)"""
+    code = _COMMENTS.sub(" ", statement).strip()
+    first = _NEXT_WORD.match(code)
+    if first is None:
+        return []
+    word = first.group(1).upper()
+    if _COMPOUND_BEGIN.match(code):
+        # The block may hold any statement
+        return None
+    if is_read_only(code) or word in _NO_WRITES:
+        return []
+
+    change = _SCHEMA_CHANGE.match(code)
+    if change is not None:
+        kind, name = change.group(1).upper(), change.group(2)
+        if kind not in ("TABLE", "VIEW", "SEQUENCE"):
+            return None
+        if word == "RENAME" or _MORE_TABLES.match(code, change.end()):
+            return None
+        return [name]
+
+    match = _WRITE_TARGET.match(code)
+    if match is None:
+        return None
+    return [name for name in match.groups() if name]
+
+
+def split_statements(code, delimiter):
+    """Lazily yields the statements of code, each ending with its delimiter
+
+    Delimiters inside quoted strings, identifiers, comments and inside the
+    BEGIN...END blocks of stored routines don't end a statement.
+    DELIMITER commands change the delimiter for the rest of the code and
+    are yielded as "DELIMITER <new delimiter>".
+    Raises ValueError when the last statement doesn't end with a delimiter.
+    """
+    tokens = _token_regex(delimiter)
+    start = pos = 0
+    head = []
+    compound = False
+    depth = 0
+
+    while True:
+        m = tokens.search(code, pos)
+        if m is None:
+            break
+        kind = m.lastgroup
+        pos = m.end()
+
+        if kind == "delimiter":
+            if depth > 0:
+                continue
+            statement = code[start:pos].strip()
+            if statement != delimiter:
+                yield statement
+            start = pos
+            head = []
+            compound = False
+        elif kind == "quote":
+            pos = _QUOTED[m.group()].match(code, m.start()).end()
+        elif kind == "line_comment":
+            end = code.find("\n", pos)
+            pos = len(code) if end < 0 else end
+        elif kind == "block_comment":
+            end = code.find("*/", pos)
+            pos = len(code) if end < 0 else end + 2
+        elif not head and m.group().upper() == "DELIMITER":
+            end = code.find("\n", pos)
+            end = len(code) if end < 0 else end
+            args = code[pos:end].split()
+            if not args:
+                raise ValueError("DELIMITER must be followed by a delimiter")
+            delimiter = args[0]
+            tokens = _token_regex(delimiter)
+            yield f"DELIMITER {delimiter}"
+            start = pos = end
+        else:
+            word = m.group().upper()
+            if len(head) < 8:
+                head.append(word)
+                if not compound and _is_compound_head(head, code, m.start()):
+                    compound = True
+                    # BEGIN NOT ATOMIC opens the block itself
+                    depth = 1 if head[0] == "BEGIN" else 0
+                    continue
+            if not compound:
+                continue
+
+            if word in ("BEGIN", "CASE"):
+                depth += 1
+            elif word == "END":
+                following = _NEXT_WORD.match(code, pos)
+                if following and following.group(1).upper() in _END_OF:
+                    pos = following.end()
+                    if following.group(1).upper() != "CASE":
+                        continue
+                depth = max(depth - 1, 0)
+
+    rest = code[start:]
+    if any(q in rest for q in _QUOTED) or _COMMENTS.sub("", rest).strip():
+        raise ValueError(f"Your SQL code doesn't end with delimiter `{delimiter}`")
+
+
+def _is_compound_head(head, code, pos):
+    """Tells if the statement starting with the words in head, the last
+    one at pos in code, has a compound statement body"""
+    if head[0] == "CREATE":
+        # The object type, not any word, e.g. a column named event
+        return len(head) == 1 and _COMPOUND_CREATE.match(code, pos) is not None
+    return head[:3] == ["BEGIN", "NOT", "ATOMIC"]
+
 
 class CodeParser:
     def __init__(self, log, cell_code, delimiter):
@@ -25,7 +259,15 @@ class CodeParser:
         self._parse()
 
     def get_sql(self):
-        return self.sql
+        return list(self.iter_sql())
+
+    def iter_sql(self):
+        """Lazily yields the SQL statements of the cell
+
+        May raise ValueError while iterating when the code is malformed
+        """
+        for code in self.sql:
+            yield from split_statements(code, self.delimiter)
 
     def get_magics(self):
         return self.magics
@@ -64,7 +306,8 @@ class CodeParser:
             return
 
         code = self.code.strip()
-        if not code.endswith(self.delimiter):
+        # Cells changing the delimiter are checked while they are split
+        if not _DELIMITER_LINE.search(code) and not code.endswith(self.delimiter):
             raise ValueError(
                 f"Your SQL code doesn't end with delimiter `{self.delimiter}`"
             )
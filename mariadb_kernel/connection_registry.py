@@ -0,0 +1,127 @@
+"""Keeps the named connections of a kernel
+
+Besides the connection it starts with, named "default", a kernel can
+connect to other servers, or as other users, with %connect. Every
+connection has its own client, so its session (current database,
+variables, temporary tables, delimiter) lasts across cells, and its own
+caches of the schema and of the results, as the servers may hold
+different data under the same names.
+
+Only one connection is active at a time: the attributes of the kernel
+depending on the server (mariadb_client, connection_config, delimiter,
+schema_index, ...) are those of the active connection, they are swapped
+when another one is activated. The results kept by the kernel (last_select, %store) are
+shared by all the connections.
+"""
+
+# Copyright (c) MariaDB Foundation.
+# Distributed under the terms of the Modified BSD License.
+
+from contextlib import contextmanager
+import re
+
+from mariadb_kernel.mariadb_client import create_client, ServerIsDownError
+
+DEFAULT_CONNECTION = "default"
+
+# The attributes of the kernel kept per connection
+CONNECTION_STATE = (
+    "mariadb_client",
+    "metadata_client",
+    "connection_config",
+    "delimiter",
+    "schema_index",
+    "autocompleter",
+    "inspector",
+    "result_cache",
+)
+
+_NAME = re.compile(r"^[A-Za-z_][\w-]*$")
+
+
+class Connection:
+    def __init__(self, name, config, state):
+        self.name = name
+        self.config = config
+        # The values of the CONNECTION_STATE attributes of the kernel,
+        # up to date while the connection is not active
+        self.state = state
+
+
+class ConnectionRegistry:
+    def __init__(self, kernel):
+        self.kernel = kernel
+        default = Connection(DEFAULT_CONNECTION, kernel.client_config, {})
+        self.connections = {DEFAULT_CONNECTION: default}
+        self.active = DEFAULT_CONNECTION
+
+    def names(self):
+        return list(self.connections)
+
+    def get(self, name):
+        return self.connections.get(name)
+
+    def add(self, name, config):
+        """Connects a new client with config and registers it under name.
+        Blocks until the client is connected, raises ValueError for an
+        invalid or used name, and ServerIsDownError or LoginError when the
+        client couldn't connect"""
+        if not _NAME.match(name):
+            raise ValueError(f"Invalid connection name {name}")
+        if name in self.connections:
+            raise ValueError(
+                f"There is already a connection named {name}, "
+                f"close it first with %connect -d {name}"
+            )
+
+        client = create_client(self.kernel.log, config)
+        client.start()
+        if not client.is_started():
+            # start() only logs some failures, e.g. no client installed
+            raise ServerIsDownError()
+        state = self.kernel._connection_state(client, config)
+        self.connections[name] = Connection(name, config, state)
+
+    def activate(self, name):
+        """Makes the kernel run the next statements on connection name"""
+        if name not in self.connections:
+            raise ValueError(f"There is no connection named {name}")
+        if name == self.active:
+            return
+
+        current = self.connections[self.active]
+        current.state = {key: getattr(self.kernel, key) for key in CONNECTION_STATE}
+        for key, value in self.connections[name].state.items():
+            setattr(self.kernel, key, value)
+        self.active = name
+
+    @contextmanager
+    def using(self, name):
+        """Activates connection name for the duration of the block"""
+        previous = self.active
+        self.activate(name)
+        try:
+            yield
+        finally:
+            # The block may have closed the previous connection
+            if previous in self.connections:
+                self.activate(previous)
+
+    def remove(self, name):
+        """Disconnects and forgets connection name"""
+        if name == DEFAULT_CONNECTION:
+            raise ValueError("The default connection can't be closed")
+        if name not in self.connections:
+            raise ValueError(f"There is no connection named {name}")
+        if name == self.active:
+            self.activate(DEFAULT_CONNECTION)
+        connection = self.connections.pop(name)
+        connection.state["mariadb_client"].stop()
+        connection.state["metadata_client"].stop()
+
+    def close(self):
+        """Disconnects all the connections but the default one, which
+        is left active"""
+        for name in self.names():
+            if name != DEFAULT_CONNECTION:
+                self.remove(name)
@@ -0,0 +1,420 @@
+"""The files %load reads, turned into batches for LOAD DATA
+
+Delimited text files are sent to the server as they are, split in chunks
+at line ends that are not inside enclosed fields. JSON Lines and Parquet
+files are converted to CSV on the fly, one chunk at a time, so a file is
+never held in memory as a whole.
+
+Files compressed with gzip, bzip2 or xz are decompressed while they are
+read, zstd needs the zstandard package and Parquet needs pyarrow.
+
+The rows at the start of a file are also used to guess the types of its
+columns when %load creates the target table.
+"""
+
+# Copyright (c) MariaDB Foundation.
+# Distributed under the terms of the Modified BSD License.
+
+from abc import ABC, abstractmethod
+import bz2
+import codecs
+import csv
+import datetime
+import decimal
+import gzip
+import io
+import itertools
+import json
+import lzma
+import math
+import os
+import re
+
+READ_SIZE = 1 << 20
+
+# Rows used to guess the types of the columns
+SAMPLE_ROWS = 1000
+
+# Strings longer than this in the sample make a TEXT column
+MAX_VARCHAR_SAMPLE = 100
+
+_COMPRESSIONS = {
+    ".gz": "gzip",
+    ".gzip": "gzip",
+    ".bz2": "bzip2",
+    ".xz": "xz",
+    ".zst": "zstd",
+    ".zstd": "zstd",
+}
+_FORMATS = {
+    ".jsonl": "jsonl",
+    ".ndjson": "jsonl",
+    ".json": "jsonl",
+    ".parquet": "parquet",
+    ".pq": "parquet",
+}
+
+# How the converted files are written, NULL is the unenclosed word NULL
+CONVERTED_FORMAT = {
+    "delimiter": ",",
+    "enclosure": '"',
+    "escape": "",
+    "lines": "\n",
+    "encoding": "utf8mb4",
+}
+
+
+def detect(path):
+    """Returns the (format, compression) of a file from its name,
+    compression is None for uncompressed files"""
+    root, ext = os.path.splitext(path.lower())
+    compression = _COMPRESSIONS.get(ext)
+    if compression is not None:
+        ext = os.path.splitext(root)[1]
+    return _FORMATS.get(ext, "csv"), compression
+
+
+def open_stream(path, compression):
+    """Opens a file for reading bytes, decompressing them if needed"""
+    if compression is None:
+        return open(path, "rb")
+    if compression == "gzip":
+        return gzip.open(path, "rb")
+    if compression == "bzip2":
+        return bz2.open(path, "rb")
+    if compression == "xz":
+        return lzma.open(path, "rb")
+    try:
+        import zstandard
+    except ImportError:
+        raise ValueError("Reading zstd files needs the zstandard package")
+    return zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True)
+
+
+def stream_chunks(stream, chunk_size, terminator, enclosure=b"", escape=b""):
+    """Yields the content of a stream in chunks of about chunk_size bytes
+    ending with a line terminator that is not inside an enclosed field"""
+
+    def enclosures(data):
+        if not enclosure:
+            return 0
+        count = data.count(enclosure)
+        if escape:
+            count -= data.count(escape + enclosure)
+        return count
+
+    buf = bytearray()
+    # Bytes of buf already looked at, and the enclosures they contain
+    scanned = 0
+    count = 0
+    eof = False
+    while not eof:
+        block = stream.read(READ_SIZE)
+        eof = not block
+        buf += block
+        while len(buf) >= chunk_size:
+            if scanned < chunk_size:
+                count += enclosures(buf[scanned:chunk_size])
+                scanned = chunk_size
+            cut = None
+            while cut is None:
+                pos = buf.find(terminator, scanned)
+                if pos < 0:
+                    break
+                pos += len(terminator)
+                count += enclosures(buf[scanned:pos])
+                scanned = pos
+                # An even number of enclosures: the line ends outside a field
+                if count % 2 == 0:
+                    cut = pos
+            if cut is None:
+                break
+            yield bytes(buf[:cut])
+            del buf[:cut]
+            scanned = 0
+            count = 0
+    if buf:
+        yield bytes(buf)
+
+
+def _format_value(value):
+    """Formats a value as a field of the converted CSV"""
+    if value is None:
+        return "NULL"
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, float) and not math.isfinite(value):
+        return "NULL"
+    if isinstance(value, (int, float, decimal.Decimal)):
+        return str(value)
+    if isinstance(value, (datetime.datetime, datetime.time)):
+        value = value.replace(tzinfo=None).isoformat(" ")
+    elif isinstance(value, datetime.date):
+        value = value.isoformat()
+    elif isinstance(value, (dict, list)):
+        value = json.dumps(value)
+    elif isinstance(value, bytes):
+        value = value.decode("utf-8", "replace")
+    return '"' + str(value).replace('"', '""') + '"'
+
+
+_INT = re.compile(r"^[+-]?\d{1,18}$")
+_FLOAT = re.compile(r"^[+-]?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?$")
+_DATE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+_DATETIME = re.compile(r"^\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}:\d{2}(?:\.\d+)?$")
+
+# The type holding the values of both types, TEXT if there is none
+_WIDER = {
+    ("BIGINT", "BOOLEAN"): "BIGINT",
+    ("BIGINT", "DOUBLE"): "DOUBLE",
+    ("BOOLEAN", "DOUBLE"): "DOUBLE",
+    ("DATE", "DATETIME"): "DATETIME",
+}
+
+
+def _value_type(value):
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return "BOOLEAN"
+    if isinstance(value, int):
+        return "BIGINT"
+    if isinstance(value, (float, decimal.Decimal)):
+        return "DOUBLE"
+    if isinstance(value, datetime.datetime):
+        return "DATETIME"
+    if isinstance(value, datetime.date):
+        return "DATE"
+    if isinstance(value, (dict, list)):
+        return "JSON"
+    if isinstance(value, bytes):
+        return "BLOB"
+
+    text = str(value).strip()
+    if text in ("", "NULL", "\\N"):
+        return None
+    if _INT.match(text):
+        return "BIGINT"
+    if _FLOAT.match(text):
+        return "DOUBLE"
+    if _DATE.match(text):
+        return "DATE"
+    if _DATETIME.match(text):
+        return "DATETIME"
+    return "TEXT"
+
+
+def infer_column_type(values):
+    """Returns the SQL type of a column holding the sample values"""
+    column_type = None
+    max_length = 0
+    for value in values:
+        value_type = _value_type(value)
+        if value_type is None:
+            continue
+        if isinstance(value, str):
+            max_length = max(max_length, len(value))
+        if column_type is None or column_type == value_type:
+            column_type = value_type
+        else:
+            pair = tuple(sorted((column_type, value_type)))
+            column_type = _WIDER.get(pair, "TEXT")
+
+    if column_type is None or column_type == "TEXT":
+        # Later rows may be longer than the longest in the sample
+        if max_length <= MAX_VARCHAR_SAMPLE:
+            return "VARCHAR(255)"
+        return "TEXT"
+    return column_type
+
+
+def create_table_statement(table_name, columns, rows):
+    """Returns a CREATE TABLE statement for rows having the columns"""
+    from mariadb_kernel.schema_index import quote_identifier
+
+    definitions = []
+    for i, column in enumerate(columns):
+        column_type = infer_column_type(row[i] for row in rows if i < len(row))
+        definitions.append(f"  {quote_identifier(column)} {column_type}")
+    return (
+        f"CREATE TABLE IF NOT EXISTS {table_name} (\n" + ",\n".join(definitions) + "\n)"
+    )
+
+
+class CSVSource:
+    """A delimited text file, loaded as it is"""
+
+    converted = False
+
+    def __init__(self, path, compression, options):
+        self.path = path
+        self.compression = compression
+        self.options = options
+
+    def format(self):
+        return self.options
+
+    def size(self):
+        """The number of bytes LOAD DATA will read, None if unknown"""
+        if self.compression is not None:
+            return None
+        return os.path.getsize(self.path)
+
+    def _escape(self):
+        if self.options["escape"] is None:
+            return "\\"
+        return self.options["escape"]
+
+    def chunks(self, chunk_size):
+        opts = self.options
+        with open_stream(self.path, self.compression) as stream:
+            yield from stream_chunks(
+                stream,
+                chunk_size,
+                opts["lines"].encode(),
+                opts["enclosure"].encode(),
+                self._escape().encode(),
+            )
+
+    def _encoding(self):
+        try:
+            return codecs.lookup(self.options["encoding"] or "utf-8").name
+        except LookupError:
+            # A character set name Python doesn't know, e.g. utf8mb4
+            return "utf-8"
+
+    def sample(self, num_rows):
+        """Returns the names of the columns and the first rows, the names
+        come from the last skipped line, if any"""
+        opts = self.options
+        with open_stream(self.path, self.compression) as stream:
+            head = next(stream_chunks(stream, READ_SIZE, opts["lines"].encode()), b"")
+        text = head.decode(self._encoding(), "replace")
+        # The chunk ends with a line terminator, or with the end of the file
+        lines = text.split(opts["lines"])
+        if lines[-1] == "":
+            lines.pop()
+
+        if len(opts["delimiter"]) == 1:
+            reader = csv.reader(
+                lines,
+                delimiter=opts["delimiter"],
+                quotechar=opts["enclosure"] or None,
+                escapechar=self._escape() or None,
+            )
+        else:
+            reader = (line.split(opts["delimiter"]) for line in lines)
+        rows = list(itertools.islice(reader, opts["skip"] + num_rows))
+
+        skipped = rows[: opts["skip"]]
+        rows = rows[opts["skip"] :]
+        num_columns = max((len(row) for row in rows), default=0)
+        if skipped and len(skipped[-1]) == num_columns:
+            columns = [name.strip() for name in skipped[-1]]
+        else:
+            columns = [f"col{i}" for i in range(1, num_columns + 1)]
+        return columns, rows
+
+
+class RowSource(ABC):
+    """A file whose rows are converted to CSV before they are loaded"""
+
+    converted = True
+
+    def format(self):
+        return CONVERTED_FORMAT
+
+    def size(self):
+        return None
+
+    @abstractmethod
+    def columns(self):
+        """The names of the columns"""
+
+    @abstractmethod
+    def rows(self):
+        """Yields the rows, as lists of Python values"""
+
+    def chunks(self, chunk_size):
+        out = io.StringIO()
+        for row in self.rows():
+            out.write(",".join(_format_value(v) for v in row))
+            out.write("\n")
+            if out.tell() >= chunk_size:
+                yield out.getvalue().encode()
+                out = io.StringIO()
+        if out.tell():
+            yield out.getvalue().encode()
+
+    def sample(self, num_rows):
+        return self.columns(), list(itertools.islice(self.rows(), num_rows))
+
+
+class JSONLinesSource(RowSource):
+    """A file holding a JSON object per line, the columns are the keys of
+    the objects at the start of the file"""
+
+    def __init__(self, path, compression):
+        self.path = path
+        self.compression = compression
+        self._columns = None
+
+    def _objects(self):
+        with open_stream(self.path, self.compression) as stream:
+            for number, line in enumerate(io.TextIOWrapper(stream, "utf-8"), 1):
+                if not line.strip():
+                    continue
+                try:
+                    obj = json.loads(line)
+                except json.JSONDecodeError as e:
+                    raise ValueError(f"Line {number} is not valid JSON: {e}")
+                if not isinstance(obj, dict):
+                    raise ValueError(f"Line {number} is not a JSON object")
+                yield obj
+
+    def columns(self):
+        if self._columns is None:
+            columns = {}
+            for obj in itertools.islice(self._objects(), SAMPLE_ROWS):
+                columns.update(dict.fromkeys(obj))
+            self._columns = list(columns)
+        return self._columns
+
+    def rows(self):
+        columns = self.columns()
+        for obj in self._objects():
+            # Keys missing from the object are NULL, unknown ones ignored
+            yield [obj.get(column) for column in columns]
+
+
+class ParquetSource(RowSource):
+    def __init__(self, path, batch_rows=10000):
+        try:
+            import pyarrow.parquet
+        except ImportError:
+            raise ValueError("Reading Parquet files needs the pyarrow package")
+        self.file = pyarrow.parquet.ParquetFile(path)
+        self.batch_rows = batch_rows
+
+    def columns(self):
+        return list(self.file.schema_arrow.names)
+
+    def rows(self):
+        for batch in self.file.iter_batches(batch_size=self.batch_rows):
+            yield from zip(*(column.to_pylist() for column in batch.columns))
+
+
+def open_source(path, file_format, options):
+    """Returns the source reading a file, file_format is None to tell it
+    from the name of the file. Raises ValueError if it can't be read"""
+    detected, compression = detect(path)
+    file_format = file_format or detected
+    if file_format == "csv":
+        return CSVSource(path, compression, options)
+    if file_format == "jsonl":
+        return JSONLinesSource(path, compression)
+    if file_format == "parquet":
+        if compression is not None:
+            raise ValueError("Parquet files can't be compressed as a whole")
+        return ParquetSource(path)
+    raise ValueError(f"Unknown format {file_format}")
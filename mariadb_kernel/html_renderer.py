@@ -0,0 +1,116 @@
+"""Renders result sets as HTML tables for display in the notebook
+
+The whole table is produced in a single pass over the rows of a ResultSet.
+Cells are styled through a stylesheet class attached to the table instead
+of a style attribute on each cell, so the size of the output only grows
+with the data that is actually shown.
+
+Large result sets are cut down to their first and last rows, the rest
+stays in the kernel and can be browsed page by page with %page. Streamed
+results too large to be kept whole only hold their first and last rows
+(see ResultSet.keep_at_most), the footer tells which ones.
+"""
+
+# Copyright (c) MariaDB Foundation.
+# Distributed under the terms of the Modified BSD License.
+
+from html import escape
+
+TABLE_CLASS = "mariadb-result"
+
+STYLE = (
+    f"<style>table.{TABLE_CLASS} td, table.{TABLE_CLASS} th "
+    "{text-align:left;white-space:pre}</style>"
+)
+
+
+def _cell_text(value):
+    if value is None:
+        return "NULL"
+    return escape(str(value), quote=False)
+
+
+class HTMLRenderer:
+    def render(self, result_set, max_rows=0, elapsed=None, cached=False):
+        """Renders the table, showing only the first and last rows when
+        the result set has more than max_rows rows (0 means no limit).
+        If elapsed is given, the footer tells how long the query took,
+        cached tells the result comes from the result cache"""
+        num_rows = result_set.num_rows()
+        footer = f"{result_set.total_rows()} rows in set"
+        if cached:
+            footer += " (cached)"
+        elif elapsed is not None:
+            footer += f" ({elapsed:.3f} sec)"
+
+        if result_set.skipped_rows:
+            return self._render_skipped(result_set, max_rows, footer)
+
+        if not max_rows or num_rows <= max_rows:
+            if elapsed is None and not cached:
+                footer = None
+            return self._render_table(result_set.columns, [result_set.rows()], footer)
+
+        tail = max_rows // 2
+        head = max_rows - tail
+        chunks = [result_set.rows(0, head), result_set.rows(num_rows - tail)]
+        footer += (
+            f", showing the first {head} and the last {tail}. "
+            "Use %page to see the others"
+        )
+        return self._render_table(result_set.columns, chunks, footer)
+
+    def _render_skipped(self, result_set, max_rows, footer):
+        """Renders a result set which only kept its first and last rows"""
+        num_rows = result_set.num_rows()
+        kept_head = result_set.head_rows()
+        head, tail = kept_head, num_rows - kept_head
+        if max_rows:
+            tail = min(max_rows // 2, tail)
+            head = min(max_rows - tail, head)
+        chunks = [result_set.rows(0, head), result_set.rows(num_rows - tail)]
+        footer += (
+            f", showing the first {head} and the last {tail}. Only the first "
+            f"{kept_head} and the last {num_rows - kept_head} were kept, "
+            "use %df stream=True to export all of them"
+        )
+        return self._render_table(result_set.columns, chunks, footer)
+
+    def render_page(self, result_set, page, page_size):
+        """Renders the rows of a page, pages are numbered from 1"""
+        num_rows = result_set.num_rows()
+        num_pages = max(1, -(-num_rows // page_size))
+        start = (page - 1) * page_size
+        stop = min(start + page_size, num_rows)
+        footer = (
+            f"Page {page} of {num_pages} " f"(rows {start + 1}-{stop} of {num_rows})"
+        )
+        return self._render_table(
+            result_set.columns, [result_set.rows(start, stop)], footer
+        )
+
+    def _render_table(self, columns, chunks, footer=None):
+        out = [STYLE, f'<table class="{TABLE_CLASS}">']
+        self._render_header(out, columns)
+        for i, rows in enumerate(chunks):
+            if i > 0:
+                self._render_ellipsis(out, len(columns))
+            self._render_rows(out, rows)
+        out.append("</table>")
+        if footer:
+            out.append(f"<p>{escape(footer)}</p>")
+        return "".join(out)
+
+    def _render_header(self, out, columns):
+        out.append("<tr><th>")
+        out.append("</th><th>".join(map(_cell_text, columns)))
+        out.append("</th></tr>")
+
+    def _render_ellipsis(self, out, num_columns):
+        out.append("<tr>" + "<td>...</td>" * num_columns + "</tr>")
+
+    def _render_rows(self, out, rows):
+        for row in rows:
+            out.append("<tr><td>")
+            out.append("</td><td>".join(map(_cell_text, row)))
+            out.append("</td></tr>")
@@ -0,0 +1,247 @@
+"""Answers inspect requests (Shift-Tab) on the identifier under the cursor
+
+The metadata of a table (columns, indexes, row estimate and DDL) takes a
+few queries to collect, it is kept in an LRU cache whose entries expire,
+so hovering the same tables again and again doesn't keep querying a busy
+server. DDL statements run by the kernel drop the entries they change.
+"""
+
+# Copyright (c) MariaDB Foundation.
+# Distributed under the terms of the Modified BSD License.
+
+import re
+
+from mariadb_kernel.autocompleter import table_references
+from mariadb_kernel.code_parser import schema_change
+from mariadb_kernel.schema_index import (
+    quote_identifier,
+    quote_string,
+    split_name,
+    split_parts,
+)
+
+_TOKEN = re.compile(r"(`[^`]*(?:`|$)|[\w$.]+)|[^`\w$.]+")
+
+
+def identifier_at(code, cursor_pos):
+    """Returns the (possibly qualified) identifier around cursor_pos"""
+    start = 0
+    for m in _TOKEN.finditer(code):
+        if m.group(1) is not None:
+            # Quoted and unquoted parts of the same identifier
+            continue
+        if m.start() >= cursor_pos:
+            return code[start : m.start()].strip(".")
+        if m.end() > cursor_pos:
+            # The cursor is between two identifiers
+            return ""
+        start = m.end()
+    return code[start:].strip(".")
+
+
+class TableInfo:
+    def __init__(self, database, table, kind, engine, rows, comment):
+        self.database = database
+        self.table = table
+        self.kind = kind
+        self.engine = engine
+        self.rows = rows
+        self.comment = comment
+        # (name, type, nullable, key, default, extra, comment)
+        self.columns = []
+        # index name -> (unique, [column names])
+        self.indexes = {}
+        self.ddl = None
+
+    def column(self, name):
+        for column in self.columns:
+            if column[0].lower() == name.lower():
+                return column
+        return None
+
+    def _format_column(self, column):
+        name, col_type, nullable, key, default, extra, comment = column
+        parts = [col_type, "NULL" if nullable == "YES" else "NOT NULL"]
+        if key:
+            parts.append(key)
+        if default is not None:
+            parts.append(f"DEFAULT {default}")
+        if extra:
+            parts.append(extra)
+        if comment:
+            parts.append(f"-- {comment}")
+        return name, " ".join(parts)
+
+    def describe_column(self, name):
+        column_name, text = self._format_column(self.column(name))
+        return f"Column {self.database}.{self.table}.{column_name}\n{text}"
+
+    def describe(self):
+        header = f"{self.kind.title()} {self.database}.{self.table}"
+        details = [d for d in (self.engine,) if d]
+        if self.rows is not None:
+            details.append(f"~{self.rows} rows")
+        if details:
+            header += f" ({', '.join(details)})"
+        lines = [header]
+        if self.comment:
+            lines.append(self.comment)
+
+        lines.extend(["", "Columns:"])
+        formatted = [self._format_column(c) for c in self.columns]
+        width = max((len(name) for name, _ in formatted), default=0)
+        lines.extend(f"  {name:<{width}}  {text}" for name, text in formatted)
+
+        if self.indexes:
+            lines.extend(["", "Indexes:"])
+            width = max(len(name) for name in self.indexes)
+            for name, (unique, columns) in self.indexes.items():
+                kind = "UNIQUE " if unique else ""
+                lines.append(f"  {name:<{width}}  {kind}({', '.join(columns)})")
+
+        if self.ddl:
+            lines.extend(["", self.ddl])
+        return "\n".join(lines)
+
+
+class Inspector:
+    def __init__(self, schema_index, query, cache):
+        """query(sql) runs a statement and returns its rows, or None if
+        the statement could not be run right now"""
+        self.index = schema_index
+        self.query = query
+        self.cache = cache
+
+    def invalidate(self, statement, database):
+        """Drops the cached tables a statement that ran successfully
+        changed. database is the current database of the session"""
+        change = schema_change(statement)
+        if change is None:
+            return
+
+        kind, name = change
+        if kind in ("DATABASE", "SCHEMA"):
+            self.cache.clear()
+            return
+
+        schema, table = split_name(name)
+        schema = schema or database
+        if kind == "INDEX":
+            # The statement names the index, not its table
+            self.cache.discard_if(lambda key, info: key[0] == schema)
+        else:
+            self.cache.pop((schema, table.lower()))
+
+    def _load(self, database, table):
+        where = (
+            f"WHERE TABLE_SCHEMA = {quote_string(database)} "
+            f"AND TABLE_NAME = {quote_string(table)}"
+        )
+        rows = self.query(
+            "SELECT TABLE_NAME, TABLE_TYPE, ENGINE, TABLE_ROWS, TABLE_COMMENT "
+            f"FROM information_schema.TABLES {where}"
+        )
+        if not rows:
+            return None
+
+        name, kind, engine, num_rows, comment = rows[0]
+        kind = "view" if kind == "VIEW" else "table"
+        info = TableInfo(database, name, kind, engine, num_rows, comment)
+
+        info.columns = (
+            self.query(
+                "SELECT COLUMN_NAME, COLUMN_TYPE, IS_NULLABLE, COLUMN_KEY, "
+                "COLUMN_DEFAULT, EXTRA, COLUMN_COMMENT "
+                f"FROM information_schema.COLUMNS {where} ORDER BY ORDINAL_POSITION"
+            )
+            or []
+        )
+
+        indexes = (
+            self.query(
+                "SELECT INDEX_NAME, NON_UNIQUE, COLUMN_NAME "
+                f"FROM information_schema.STATISTICS {where} "
+                "ORDER BY INDEX_NAME, SEQ_IN_INDEX"
+            )
+            or []
+        )
+        for index_name, non_unique, column in indexes:
+            unique = str(non_unique) == "0"
+            info.indexes.setdefault(index_name, (unique, []))[1].append(column)
+
+        ddl = self.query(
+            f"SHOW CREATE TABLE {quote_identifier(database)}.{quote_identifier(name)}"
+        )
+        if ddl:
+            info.ddl = ddl[0][1]
+        return info
+
+    def table_info(self, database, table):
+        """Returns the TableInfo of a table or view, None if there is none"""
+        if database is None:
+            return None
+        key = (database, table.lower())
+        info = self.cache.get(key)
+        if info is None:
+            info = self._load(database, table)
+            if info is not None:
+                self.cache.put(key, info)
+        return info
+
+    def _resolve(self, code, identifier, database):
+        """Returns the TableInfo the identifier refers to, and the name of
+        the column if it refers to one of its columns"""
+        parts = split_parts(identifier)
+        refs = table_references(code)
+
+        if len(parts) >= 3:
+            # db.table.column
+            return self.table_info(parts[-3], parts[-2]), parts[-1]
+
+        if len(parts) == 2:
+            qualifier, name = parts
+            ref = refs.get(qualifier.lower())
+            if ref is not None:
+                # alias.column
+                return self.table_info(ref[0] or database, ref[1]), name
+            if qualifier in self.index.get_databases():
+                # db.table
+                return self.table_info(qualifier, name), None
+            # table.column
+            return self.table_info(database, qualifier), name
+
+        name = parts[0]
+        ref = refs.get(name.lower())
+        if ref is not None:
+            return self.table_info(ref[0] or database, ref[1]), None
+        if name in self.index.get_tables(database):
+            return self.table_info(database, name), None
+
+        # A column of one of the tables of the statement
+        for ref_schema, table in refs.values():
+            info = self.table_info(ref_schema or database, table)
+            if info is not None and info.column(name) is not None:
+                return info, name
+        return None, None
+
+    def inspect(self, code, cursor_pos, database):
+        """Returns the content of an inspect_reply, database is the current
+        database of the session"""
+        reply = {"status": "ok", "found": False, "data": {}, "metadata": {}}
+        identifier = identifier_at(code, cursor_pos)
+        if not identifier:
+            return reply
+
+        info, column = self._resolve(code, identifier, database)
+        if info is None:
+            return reply
+        if column is None:
+            text = info.describe()
+        elif info.column(column) is not None:
+            text = info.describe_column(column)
+        else:
+            return reply
+
+        reply["found"] = True
+        reply["data"] = {"text/plain": text}
+        return reply
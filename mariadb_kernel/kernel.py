@@ -7,20 +7,41 @@ from ipykernel.kernelbase import Kernel
 from ._version import version as __version__
 from mariadb_kernel.client_config import ClientConfig
 from mariadb_kernel.mariadb_client import (
-    MariaDBClient,
+    create_client,
+    LoginError,
     ServerIsDownError,
 )
-from mariadb_kernel.code_parser import CodeParser
+from mariadb_kernel.code_parser import CodeParser, delimiter_command
+from mariadb_kernel.connection_registry import ConnectionRegistry
+from mariadb_kernel.autocompleter import Autocompleter
+from mariadb_kernel.cache import LRUCache
+from mariadb_kernel.inspector import Inspector
+from mariadb_kernel.metadata_client import MetadataClient
+from mariadb_kernel.schema_index import SchemaIndex, unquote
+from mariadb_kernel.html_renderer import HTMLRenderer
+from mariadb_kernel.result_stream import ResultStream
 from mariadb_kernel.mariadb_server import MariaDBServer
 from mariadb_kernel.maria_magics.maria_magic import MariaMagic
-
+from mariadb_kernel.result_cache import ResultCache
+from mariadb_kernel.result_store import ResultStore
+
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import asyncio
+import concurrent.futures
+import contextvars
+import functools
+import inspect
 import logging
 import pexpect
 import re
-import pandas
-from bs4 import BeautifulSoup
-import os
 import signal
+import threading
+import time
+
+# How many tables do_inspect keeps the metadata of, and for how long (sec)
+INSPECT_CACHE_ENTRIES = 256
+INSPECT_CACHE_TTL = 300
 
 
 class MariaDBKernel(Kernel):
@@ -35,21 +56,92 @@ class MariaDBKernel(Kernel):
 
     def __init__(self, **kwargs):
         Kernel.__init__(self, **kwargs)
-        self.delimiter = ";"
         self.client_config = ClientConfig(self.log)
-        self.mariadb_client = MariaDBClient(self.log, self.client_config)
+        # Sets mariadb_client, delimiter and the caches depending on the
+        # server, they are swapped when another connection is activated.
+        # client_config holds the settings of the kernel, connection_config
+        # those of the server of the active connection
+        client = create_client(self.log, self.client_config)
+        state = self._connection_state(client, self.client_config)
+        for key, value in state.items():
+            setattr(self, key, value)
+        self.connection_registry = ConnectionRegistry(self)
         self.mariadb_server = None
-        self.data = {"last_select": pandas.DataFrame([])}
+        self.renderer = HTMLRenderer()
+        self.data = {
+            # The DataFrame of the last result set, None before the first
+            # one as the kernel doesn't import pandas until it is needed
+            "last_select": None,
+            "last_result": None,
+            "last_query": None,
+        }
+        # Held while a statement runs on the client, the magics and the
+        # statements of the kernel run one at a time
+        self.client_lock = threading.Lock()
+        # Set while a statement runs in the worker thread
+        self.executing = False
+        self.result_cache_enabled = self.client_config.result_cache()
+        self.result_store = ResultStore(
+            self.log,
+            self.client_config.result_store_max_bytes(),
+            self.client_config.result_store_spill(),
+        )
 
         if self.client_config.debug_logging():
             self.log.setLevel(logging.DEBUG)
         else:
             self.log.setLevel(logging.INFO)
 
+        # The kernel answers requests while the client connects, and a
+        # testing server starts if needed. Cells wait for it to be done
+        self.startup = self._start_connecting()
+
+    def _connection_state(self, client, config):
+        """The attributes of the kernel kept per connection, see
+        ConnectionRegistry, for a new connection through client"""
+        metadata_client = MetadataClient(self.log, config)
+        query = functools.partial(self._query_metadata, metadata_client)
+        schema_index = SchemaIndex(self.log, query)
+        return {
+            "mariadb_client": client,
+            "metadata_client": metadata_client,
+            "connection_config": config,
+            "delimiter": ";",
+            "schema_index": schema_index,
+            "autocompleter": Autocompleter(schema_index),
+            "inspector": Inspector(
+                schema_index,
+                query,
+                LRUCache(INSPECT_CACHE_ENTRIES, INSPECT_CACHE_TTL),
+            ),
+            "result_cache": ResultCache(
+                self.client_config.result_cache_max_entries(),
+                self.client_config.result_cache_max_cells(),
+            ),
+        }
+
+    def _start_connecting(self):
+        executor = ThreadPoolExecutor(1, thread_name_prefix="mariadb_kernel_startup")
+        future = executor.submit(self._connect)
+        executor.shutdown(wait=False)
+        return future
+
+    def _connect(self):
+        """Connects the client, starting a testing server first when no
+        server is running. Runs in a background thread"""
+        start_server = self.client_config.start_server()
+        if start_server and self.mariadb_server is None:
+            server = MariaDBServer(self.log, self.client_config)
+            # A testing server started by another kernel may be waiting
+            # to be stopped, keep it running
+            if server.attach():
+                self.mariadb_server = server
+
         try:
             self.mariadb_client.start()
+            return
         except ServerIsDownError:
-            if not self.client_config.start_server():
+            if not start_server:
                 self.log.error(
                     "The options passed through mariadb_kernel.json "
                     "prevent the kernel from starting a testing "
@@ -57,49 +149,206 @@ class MariaDBKernel(Kernel):
                 )
                 raise
 
-            # Start a single MariaDB server for a better experience
-            # if user wants to quickly test the kernel
+        # Start a single MariaDB server for a better experience
+        # if user wants to quickly test the kernel
+        if self.mariadb_server is None:
             self.mariadb_server = MariaDBServer(self.log, self.client_config)
-            self.mariadb_server.start()
+        if not self.mariadb_server.attach(start=True):
+            raise ServerIsDownError()
+
+        # Reconnect the client now that the server is up
+        self.mariadb_client.start()
+
+    def is_connected(self):
+        return self.startup.done() and self.startup.exception() is None
 
-            # Reconnect the client now that the server is up
-            if self.mariadb_server.is_up():
-                self.mariadb_client.start()
+    async def _wait_connected(self):
+        """Waits for the client to be connected, returns False after
+        reporting why it isn't"""
+        if self.is_connected():
+            return True
+
+        timeout = self.client_config.startup_timeout()
+        try:
+            await asyncio.wait_for(
+                asyncio.shield(asyncio.wrap_future(self.startup)), timeout
+            )
+        except asyncio.TimeoutError:
+            self._send_message(
+                "stderr",
+                f"The MariaDB server is not ready after {timeout:.0f} sec, "
+                "please run the cell again in a moment",
+            )
+            return False
+        except (ServerIsDownError, LoginError):
+            self._send_message(
+                "stderr",
+                "Could not connect to the MariaDB server, please check the log "
+                "of the kernel. The kernel tries again with the next cell",
+            )
+            # Try again for the next cell, e.g. once the server is started
+            self.startup = self._start_connecting()
+            return False
+        return True
 
     def get_delimiter(self):
         return self.delimiter
 
     def set_delimiter(self, delimiter):
-        self.mariadb_client.run_statement(f"delimiter {delimiter}")
+        with self.client_busy():
+            self.mariadb_client.run_statement(f"delimiter {delimiter}")
         self.delimiter = delimiter
 
-    def _execute_magics(self, magics):
+    @contextmanager
+    def client_busy(self):
+        """Held while statements run on the client. Magics running
+        statements themselves must hold it too. Completion and inspection
+        don't use the client, see MetadataClient"""
+        with self.client_lock:
+            self.executing = True
+            try:
+                yield
+            finally:
+                self.executing = False
+
+    async def _execute_magics(self, magics):
         for magic in magics:
-            magic.execute(self, self.data)
+            # Magics running cell code are coroutines, like do_execute
+            result = magic.execute(self, self.data)
+            if inspect.isawaitable(result):
+                await result
 
-    def _update_data(self, result_html):
-        if not result_html or not result_html.startswith("<TABLE"):
+    def _update_data(self, results, statement, silent=False):
+        if not results:
             return
 
-        df = pandas.read_html(result_html)
-        self.data["last_select"] = df[0]
-
-    def _styled_result(self, result_html):
-        if not result_html or not result_html.startswith("<TABLE"):
-            return result_html
-
-        soup = BeautifulSoup(result_html)
-        cells = soup.find_all(["td", "th"])
-        for cell in cells:
-            cell["style"] = "text-align:left;white-space:pre"
-
-        return str(soup)
+        # The whole result set stays in the kernel, %page browses it
+        self.data["last_result"] = results[-1]
+        self.data["last_select"] = results[-1].to_dataframe()
+        # %df can run the query again to stream its rows to a file
+        self.data["last_query"] = statement
+        # Silent requests don't get an execution count of their own, and
+        # the results missing rows are not stored for result=
+        if not silent and not results[-1].skipped_rows:
+            self.result_store.add(
+                self.execution_count, self.data["last_select"], statement
+            )
+
+    def _send_result(self, content):
+        display_content = {
+            "data": {"text/html": content},
+            "metadata": {},
+        }
+        self.send_response(self.iopub_socket, "display_data", display_content)
 
     def _send_message(self, stream, message):
         error = {"name": stream, "text": message + "\n"}
         self.send_response(self.iopub_socket, "stream", error)
 
-    def do_execute(
+    def _on_interrupt(self, signum, frame):
+        self.log.info("Interrupt received, killing the running statement")
+        # Raising here would unwind the event loop, not the statement
+        # running in the worker thread, so a failure is only logged
+        if not self.mariadb_client.kill_query():
+            self.log.error("Failed to interrupt the running statement")
+
+    @contextmanager
+    def _interruptible(self):
+        """Turns interrupts into a KILL QUERY for the statement the client
+        is running instead of a KeyboardInterrupt.
+
+        The client then returns the "Query execution was interrupted"
+        error as for any failed statement and the session (current
+        database, variables, temporary tables) is kept.
+        """
+        if threading.current_thread() is not threading.main_thread():
+            yield
+            return
+
+        saved_handler = signal.signal(signal.SIGINT, self._on_interrupt)
+        try:
+            yield
+        finally:
+            signal.signal(signal.SIGINT, saved_handler)
+
+    async def _in_thread(self, func, *args, **kwargs):
+        """Runs func in a worker thread, the event loop keeps serving
+        messages (comms, subshells) and interrupts in the meantime.
+
+        The context is copied so the messages sent from the thread keep
+        the parent of the request being executed.
+        """
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        call = functools.partial(context.run, func, *args, **kwargs)
+        return await loop.run_in_executor(None, call)
+
+    async def _run_statement(self, statement, silent):
+        """Runs a single statement and displays its result as soon as it
+        completes. Returns False if the statement failed"""
+        new_delimiter = delimiter_command(statement)
+        if new_delimiter:
+            await self._in_thread(self.set_delimiter, new_delimiter)
+            return True
+
+        max_rows = self.client_config.display_max_rows()
+        database = self.current_database()
+        cacheable = self.result_cache_enabled and self.result_cache.cacheable(
+            statement, database
+        )
+        if cacheable:
+            results = self.result_cache.get(statement, database, self.delimiter)
+            if results is not None:
+                self._update_data(results, statement, silent)
+                if not silent:
+                    for rs in results:
+                        self._send_result(
+                            self.renderer.render(rs, max_rows, cached=True)
+                        )
+                return True
+
+        stream = None
+        on_rows = None
+        if self.client_config.stream_results() and not silent:
+            stream = ResultStream(
+                self, self.renderer, max_rows, self.client_config.stream_keep_rows()
+            )
+            on_rows = stream.update
+
+        start = time.perf_counter()
+        with self.client_busy(), self._interruptible():
+            result = await self._in_thread(
+                self.mariadb_client.run_statement, statement, on_rows=on_rows
+            )
+        elapsed = time.perf_counter() - start
+        self.log.debug(f"Statement ran in {elapsed:.3f} sec")
+
+        # Even failed statements may have changed some rows
+        self.invalidate_caches(statement)
+        if self.mariadb_client.iserror():
+            self._send_message("stderr", self.mariadb_client.error_message())
+            return False
+
+        results = [r for r in self.mariadb_client.last_results() if r.has_rows()]
+        # Results which didn't keep all their rows can't be shown again
+        complete = not any(r.skipped_rows for r in results)
+        if cacheable and results and complete:
+            self.result_cache.put(statement, database, self.delimiter, results)
+        self._update_data(results, statement, silent)
+        if silent:
+            return True
+
+        if not results:
+            self._send_result(f"{result} ({elapsed:.3f} sec)")
+        for rs in results:
+            if stream is not None:
+                stream.finish(rs, elapsed)
+            else:
+                self._send_result(self.renderer.render(rs, max_rows, elapsed))
+
+        return True
+
+    async def do_execute(
         self, code, silent, store_history=True, user_expressions=None, allow_stdin=False
     ):
         rv = {
@@ -110,83 +359,86 @@ class MariaDBKernel(Kernel):
             "user_expressions": {},
         }
 
+        if not await self._wait_connected():
+            return rv
+
         try:
             parser = CodeParser(self.log, code, self.delimiter)
         except ValueError as e:
             self._send_message("stderr", str(e))
             return rv
 
-        statements = parser.get_sql()
-        for s in statements:
-            result = self.mariadb_client.run_statement(s)
-
-            if self.mariadb_client.iserror():
-                self._send_message("stderr", self.mariadb_client.error_message())
-                continue
-
-            self._update_data(result)
-            result_str = str(result)
-            if not silent:
-                display_content = {
-                    "data": {"text/html": self._styled_result(result_str)},
-                    "metadata": {},
-                }
-                self.send_response(self.iopub_socket, "display_data", display_content)
-
-        self._execute_magics(parser.get_magics())
+        statements = parser.iter_sql()
+        count = 0
+        failed = False
+        while True:
+            # Only the parsing errors are reported as such, the errors
+            # of running a statement are not caught here
+            try:
+                statement = next(statements, None)
+            except ValueError as e:
+                self._send_message("stderr", str(e))
+                return rv
+
+            if failed:
+                # Like the command line client, stop at the first error
+                if statement is not None:
+                    self._send_message(
+                        "stderr",
+                        f"Statement {count} failed, the rest of the cell was skipped",
+                    )
+                break
+            if statement is None:
+                break
+
+            count += 1
+            failed = not await self._run_statement(statement, silent)
+
+        await self._execute_magics(parser.get_magics())
 
         return rv
 
-    def num_connected_clients(self):
-        sql_query = "show status like 'Threads_connected';"
-        # If there is any errors we raise
-        # (not much we can do if there is a error)
-        result_html = self.mariadb_client.run_statement(code=sql_query)
-        if self.mariadb_client.iserror():
-            raise Exception(f"Client returned an error : {result_html}")
-        try:
-            df = pandas.read_html(result_html)
-            num_clients = int(df[0]["Value"][0])
-        except Exception:
-            self.log.error(f"Pandas failed to parse html : {result_html}")
-            raise
-
-        return num_clients
-
-    def kill_server(self):
-        if self.mariadb_server and self.mariadb_server.is_up():
-            self.log.info(f"Stopping (own) MariaDB server")
-            self.mariadb_server.stop()
-        elif not self.mariadb_server:
-            pidfile = self.client_config.get_server_pidfile()
-            try:
-                with open(pidfile, "r") as f:
-                    pid = int(f.read())
-            except Exception as e:
-                self.log.error(f"Failed reading pid file {pidfile}, error: {e}")
-                return
-
-            if pid:
-                self.log.info(
-                    f"Sending stop signal to MariaDB server started by another kernel {pid}"
-                )
-                os.kill(pid, signal.SIGQUIT)
+    def invalidate_caches(self, statement):
+        """Drops what statement may have changed from the caches of the
+        kernel. Magics running statements themselves must call it too"""
+        database = self.current_database()
+        self.schema_index.invalidate(statement, database)
+        self.inspector.invalidate(statement, database)
+        self.result_cache.invalidate(statement, database)
+
+    def current_database(self):
+        database = self.mariadb_client.session.database
+        if database is None:
+            return None
+        return unquote(database)
+
+    def _query_metadata(self, metadata_client, sql):
+        """Runs a query for the schema index, returns its rows or None"""
+        # Still connecting, the server is queried on a later request
+        if not self.is_connected():
+            return None
+        return metadata_client.query(sql)
 
     def do_shutdown(self, restart):
-        num_clients = None
-        if self.client_config.start_server():
-            try:
-                num_clients = self.num_connected_clients()
-            except Exception as e:
-                self.log.error(
-                    f"Failed querying server (of number of clients connected), error: {e}"
-                )
+        # Don't leave a server starting behind
+        concurrent.futures.wait([self.startup], self.client_config.startup_timeout())
 
+        self.connection_registry.close()
         self.mariadb_client.stop()
-
-        if num_clients is not None and num_clients <= 1:
-            self.log.info("No more clients connected to server")
-            self.kill_server()
-
-    def do_complete(self, code, cursor_pos):
-        return {"status": "ok", "matches": ["test"]}
+        self.metadata_client.stop()
+        self.result_store.close()
+
+        if self.mariadb_server is not None:
+            self.mariadb_server.detach(self.client_config.server_idle_timeout())
+
+    async def do_complete(self, code, cursor_pos):
+        # The index may have to query the server, the event loop keeps
+        # serving messages meanwhile
+        return await self._in_thread(
+            self.autocompleter.complete, code, cursor_pos, self.current_database()
+        )
+
+    async def do_inspect(self, code, cursor_pos, detail_level=0, omit_sections=()):
+        return await self._in_thread(
+            self.inspector.inspect, code, cursor_pos, self.current_database()
+        )
@@ -9,12 +9,29 @@ pandas.pydata.org/pandas-docs/stable/reference/api/pandas.DataFrame.plot.bar.htm
 Example:
     > %bar x=column1 y=column2 stacked=True
 
+The result option plots a result kept by the kernel (see %store)
+instead of the result of the last query:
+    > %bar x=column1 y=column2 stacked=True result=sales
+
+Big tables can be aggregated by the server instead, only the bars of the
+plot are then sent to the notebook. Give a table or a query, the x column
+to group by and optionally the y column with an aggregate (sum, avg, min,
+max or count, the default is sum, or count without y). top=N only keeps
+the N groups with the largest values:
+    > %bar table=orders x=country y=amount agg=avg top=10
+
+The format=svg option draws the plot as an SVG image instead of PNG.
+With format=vegalite, the kernel sends a Vega-Lite chart holding the
+data instead of an image, the notebook draws it and it can be zoomed
+and resized without asking the kernel. Only the x, y, title and stacked
+options are used then (and index for %pie).
+
 The whole purpose of this magic command is to allow the user to display
 the result of the last query (e.g. SELECT, SHOW,...) in a nice and simple
 matplotlib plot.
 
 Internally, the Bar class receives the data of the last query from the kernel
-as a Pandas DataFrame, it generates a plot PNG image, wraps the image into
+as a Pandas DataFrame, it generates a plot image, wraps the image into
 a nice display_data Jupyter message and then sends it further.
 """
 
@@ -34,4 +51,4 @@ class Bar(LineMagic):
         return help_text
 
     def execute(self, kernel, data):
-        self.generate_plot(kernel, data, "bar")
+        return self.generate_plot(kernel, data, "bar")
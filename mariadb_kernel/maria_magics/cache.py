@@ -0,0 +1,82 @@
+"""This class implements the %cache magic command"""
+
+help_text = """
+The %cache magic command has the following syntax:
+    > %cache [clear|on|off]
+
+The kernel can keep the results of SELECT statements that only
+depend on the data of the tables they read, and show them again
+when the same statement is run on the same database, instead of
+querying the server. The cache is enabled with the result_cache
+option (disabled by default) or for the current session with
+%cache on.
+
+Results are dropped when the kernel runs a statement writing to
+one of the tables they read. Changes made by other connections
+are not noticed, use %cache clear to drop every result.
+
+Without arguments, %cache lists the cached results.
+"""
+
+# Copyright (c) MariaDB Foundation.
+# Distributed under the terms of the Modified BSD License.
+from mariadb_kernel.maria_magics.line_magic import LineMagic
+from mariadb_kernel.result_set import ResultSet
+
+import time
+
+
+class Cache(LineMagic):
+    def __init__(self, args):
+        self.args = args.split()
+
+    def name(self):
+        return "%cache"
+
+    def help(self):
+        return help_text
+
+    def _list(self, kernel):
+        cache = kernel.result_cache
+        state = "enabled" if kernel.result_cache_enabled else "disabled"
+        summary = (
+            f"The result cache is {state}, it holds {len(cache.entries())} "
+            f"results ({cache.cells()} cells). "
+            f"{cache.hits} hits, {cache.misses} misses"
+        )
+
+        rs = ResultSet(["Statement", "Database", "Rows", "Hits", "Age (sec)"])
+        now = time.time()
+        for (statement, database), entry in cache.entries():
+            num_rows = sum(r.num_rows() for r in entry.results)
+            age = int(now - entry.created)
+            rs.append_row([statement, database, num_rows, entry.hits, age])
+
+        html = f"<p>{summary}</p>"
+        if rs.num_rows():
+            html += kernel.renderer.render(rs)
+        display_content = {"data": {"text/html": html}, "metadata": {}}
+        kernel.send_response(kernel.iopub_socket, "display_data", display_content)
+
+    def execute(self, kernel, data):
+        if not self.args:
+            self._list(kernel)
+            return
+
+        if len(self.args) > 1 or self.args[0] not in ("clear", "on", "off"):
+            kernel._send_message(
+                "stderr",
+                "There was an error while parsing the arguments. "
+                "Please check %lsmagic on how to use the magic command",
+            )
+            return
+
+        command = self.args[0]
+        if command == "clear":
+            kernel.result_cache.clear()
+            kernel._send_message("stdout", "The result cache was cleared")
+        else:
+            kernel.result_cache_enabled = command == "on"
+            if command == "off":
+                kernel.result_cache.clear()
+            kernel._send_message("stdout", f"The result cache is {command}")
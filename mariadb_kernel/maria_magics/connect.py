@@ -0,0 +1,126 @@
+"""This class implements the %connect magic command"""
+
+help_text = """
+The %connect magic command has the following syntax:
+    > %connect name [host=HOST] [port=PORT] [user=USER]
+                    [password=PASSWORD] [socket=SOCKET]
+    > %connect name
+    > %connect -d name
+
+A kernel can be connected to several servers, or to a server as
+several users, e.g. to compare a primary and a replica in a notebook.
+Every connection is named, the kernel starts with the "default"
+connection configured in mariadb_config.json.
+
+%connect name followed by options opens a new connection, the options
+left out are those of the default connection, except that giving a
+host or a port connects through TCP unless a socket is given too
+(localhost then means 127.0.0.1). The cells after it run
+on the new connection. %connect name switches to an existing
+connection, and %connect default goes back to the default one.
+A connection keeps its session (current database, variables,
+temporary tables) across cells.
+
+To run a single cell on another connection, use the %%on cell magic:
+    > %%on replica
+    > select count(*) from orders;
+
+%connect -d name closes a connection. Without arguments, %connect
+lists the connections.
+"""
+
+# Copyright (c) MariaDB Foundation.
+# Distributed under the terms of the Modified BSD License.
+from mariadb_kernel.maria_magics.line_magic import LineMagic
+from mariadb_kernel.mariadb_client import LoginError, ServerIsDownError
+from mariadb_kernel.result_set import ResultSet
+
+import shlex
+
+
+class Connect(LineMagic):
+    def __init__(self, args):
+        self.args = args
+
+    def name(self):
+        return "%connect"
+
+    def help(self):
+        return help_text
+
+    def _list(self, kernel):
+        registry = kernel.connection_registry
+        rs = ResultSet(["Name", "Connection", "Active"])
+        for name in registry.names():
+            connection = registry.get(name)
+            active = "*" if name == registry.active else ""
+            rs.append_row([name, connection.config.describe(), active])
+
+        display_content = {
+            "data": {"text/html": kernel.renderer.render(rs)},
+            "metadata": {},
+        }
+        kernel.send_response(kernel.iopub_socket, "display_data", display_content)
+
+    async def _open(self, kernel, name, options):
+        registry = kernel.connection_registry
+        try:
+            config = kernel.client_config.derive(options)
+            await kernel._in_thread(registry.add, name, config)
+        except ValueError as e:
+            kernel._send_message("stderr", str(e))
+            return
+        except (ServerIsDownError, LoginError):
+            kernel._send_message(
+                "stderr",
+                f"Could not connect to {config.describe()}, "
+                "please check the log of the kernel",
+            )
+            return
+
+        registry.activate(name)
+        kernel._send_message("stdout", f"Connected to {config.describe()} as {name}")
+
+    def execute(self, kernel, data):
+        registry = kernel.connection_registry
+        try:
+            args = shlex.split(self.args)
+        except ValueError:
+            self._send_parse_error(kernel)
+            return
+
+        if not args:
+            self._list(kernel)
+            return
+
+        if args[0] == "-d":
+            if len(args) != 2:
+                self._send_parse_error(kernel)
+                return
+            try:
+                registry.remove(args[1])
+            except ValueError as e:
+                kernel._send_message("stderr", str(e))
+                return
+            kernel._send_message("stdout", f"Closed the connection {args[1]}")
+            return
+
+        name = args[0]
+        if len(args) > 1:
+            try:
+                options = dict(arg.split("=", 1) for arg in args[1:])
+            except ValueError:
+                self._send_parse_error(kernel)
+                return
+            # Awaited by the kernel, connecting runs off the event loop
+            return self._open(kernel, name, options)
+
+        if registry.get(name) is None:
+            kernel._send_message(
+                "stderr",
+                f"There is no connection named {name}, "
+                "give its options to open it, e.g. %connect name host=...",
+            )
+            return
+        registry.activate(name)
+        kernel._send_message("stdout", f"The next cells run on {name}")
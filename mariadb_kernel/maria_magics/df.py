@@ -2,31 +2,108 @@
 
 help_text = """
 The %df magic command has the following syntax:
-    > %df [filename]
+    > %df [filename] [result=name|execution_count] [format=NAME]
+          [stream=True|outfile=True]
 
 It writes the result of the last query executed in the notebook
-into an external CSV formatted file.
+into an external CSV formatted file. With the result option, it
+writes a result kept by the kernel instead (see %store).
 The purpose of this magic command is to allow users to export query
 data from their MariaDB databases and then quickly import it
 into a Python Notebook where more complex analytics can be performed.
 
 If no arguments are specified, the kernel writes the data into a
 CSV file named 'last_query.csv'.
+
+The format is told from the extension of the file, or given with
+the format option: csv, csv.gz (gzip compressed CSV), parquet or
+feather (Parquet and Feather need pyarrow).
+
+For big results, stream=True runs the query again and writes its
+rows while they arrive, a batch at a time, instead of writing the
+result kept by the kernel. The memory it takes doesn't depend on
+the number of rows. It is needed for streamed results larger than
+stream_keep_rows, of which the kernel only keeps the first and last
+rows.
+
+When the MariaDB server runs on the same host, outfile=True has the
+server write the CSV file itself with SELECT ... INTO OUTFILE (the
+file has no header line, and the server must be allowed to write it).
+
+Only read-only queries are run again.
 """
 
 # Copyright (c) MariaDB Foundation.
 # Distributed under the terms of the Modified BSD License.
 from mariadb_kernel.maria_magics.line_magic import LineMagic
-
+from mariadb_kernel.result_set import ResultSet
+from mariadb_kernel.result_writer import detect_format, file_size, open_writer
 
 import os
+import time
+import uuid
+
+# Rows written to the file at once when streaming
+EXPORT_BATCH_ROWS = 10000
+
+# Minimum number of seconds between two progress updates
+UPDATE_INTERVAL = 0.5
+
+
+class ExportProgress:
+    def __init__(self, kernel, path):
+        self.kernel = kernel
+        self.path = path
+        self.rows = 0
+        self.start = time.perf_counter()
+        self.last_update = self.start
+        self.display_id = uuid.uuid4().hex
+        self.msg_type = "display_data"
+
+    def elapsed(self):
+        return time.perf_counter() - self.start
+
+    def _summary(self, verb):
+        megabytes = file_size(self.path) / (1 << 20)
+        rate = self.rows / max(self.elapsed(), 1e-6)
+        return (
+            f"{verb} {self.rows} rows to {self.path}, {megabytes:.1f} MB "
+            f"in {self.elapsed():.3f} sec ({rate:.0f} rows/s)"
+        )
+
+    def add(self, num_rows):
+        self.rows += num_rows
+        now = time.perf_counter()
+        if now - self.last_update >= UPDATE_INTERVAL:
+            self.last_update = now
+            self.show(self._summary("Writing"))
+
+    def finish(self):
+        self.show(self._summary("Wrote"))
+
+    def show(self, text):
+        display_content = {
+            "data": {"text/html": f"<p>{text}</p>"},
+            "metadata": {},
+            "transient": {"display_id": self.display_id},
+        }
+        self.kernel.send_response(
+            self.kernel.iopub_socket, self.msg_type, display_content
+        )
+        self.msg_type = "update_display_data"
 
 
 class DF(LineMagic):
-    def __init__(self, filename):
+    def __init__(self, args):
+        self.result, args = self.pop_result_ref(args)
+        self.format, args = self.pop_option(args, "format")
+        stream, args = self.pop_option(args, "stream")
+        outfile, args = self.pop_option(args, "outfile")
+        self.stream = self._str_to_obj(stream or "False")
+        self.outfile = self._str_to_obj(outfile or "False")
         self.filename = "last_query.csv"
-        if filename:
-            self.filename = filename
+        if args:
+            self.filename = args
 
     def name(self):
         return "%df"
@@ -34,8 +111,176 @@ class DF(LineMagic):
     def help(self):
         return help_text
 
+    def _statement(self, kernel, data):
+        """Returns the read-only query that produced the result to write,
+        or None after reporting why it can't be run again"""
+        from mariadb_kernel.code_parser import is_read_only
+
+        if self.result is None:
+            statement = data.get("last_query")
+            err = "There is no query previously executed. No data to write"
+        else:
+            statement = kernel.result_store.statement(self.result)
+            err = f"There is no stored result {self.result}"
+        if statement is None:
+            kernel._send_message("stderr", err)
+            return None
+        if not is_read_only(statement):
+            kernel._send_message(
+                "stderr", "Only read-only queries can be run again by %df"
+            )
+            return None
+        return statement
+
+    def _write_dataframe(self, df, file_format):
+        if file_format == "csv":
+            df.to_csv(self.filename, index=False)
+        elif file_format == "csv.gz":
+            df.to_csv(self.filename, index=False, compression="gzip")
+        elif file_format == "parquet":
+            df.to_parquet(self.filename, index=False)
+        elif file_format == "feather":
+            df.to_feather(self.filename)
+        else:
+            raise ValueError(f"Unknown format {file_format}")
+
+    def _export(self, kernel, statement, writer, progress):
+        """Runs the query and writes the rows of its first result set as
+        they arrive. Runs in a worker thread"""
+        state = {"current": None, "error": None}
+
+        def write(rs):
+            # The client keeps appending to the new, empty columns
+            batch = ResultSet(rs.columns, rs.types)
+            batch.values, rs.values = rs.values, [[] for _ in rs.columns]
+            if state["error"] is not None or rs is not state["current"]:
+                return
+            if not batch.num_rows() and progress.rows:
+                return
+            try:
+                writer.write(batch)
+            except (ValueError, OSError) as e:
+                state["error"] = str(e)
+                return
+            progress.add(batch.num_rows())
+
+        def on_rows(rs):
+            if state["current"] is None:
+                state["current"] = rs
+            if rs.num_rows() >= EXPORT_BATCH_ROWS or rs is not state["current"]:
+                write(rs)
+
+        client = kernel.mariadb_client
+        client.run_statement(statement, on_rows=on_rows)
+        if client.iserror():
+            raise ValueError(client.error_message())
+        if state["current"] is None:
+            # No rows arrived
+            tables = [r for r in client.last_results() if r.has_rows()]
+            if not tables:
+                raise ValueError("The query returned no result set")
+            state["current"] = tables[0]
+        # The last rows, and the header of empty results
+        write(state["current"])
+        if state["error"] is not None:
+            raise ValueError(state["error"])
+
+    async def _stream(self, kernel, statement, file_format):
+        try:
+            writer = open_writer(self.filename, file_format)
+        except (ValueError, OSError) as e:
+            kernel._send_message("stderr", str(e))
+            return
+
+        progress = ExportProgress(kernel, self.filename)
+        try:
+            with kernel.client_busy(), kernel._interruptible():
+                await kernel._in_thread(
+                    self._export, kernel, statement, writer, progress
+                )
+        except (ValueError, OSError) as e:
+            kernel._send_message("stderr", str(e))
+            return
+        finally:
+            writer.close()
+        progress.finish()
+
+    def _outfile_statement(self, statement, delimiter):
+        from mariadb_kernel.schema_index import quote_string
+
+        code = statement.strip()
+        for end in (delimiter, ";"):
+            if code.endswith(end):
+                code = code[: -len(end)].rstrip()
+        # The server resolves relative paths from its data directory
+        path = os.path.abspath(self.filename)
+        return (
+            f"{code}\nINTO OUTFILE {quote_string(path)}\n"
+            "FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '\"'\n"
+            f"LINES TERMINATED BY '\\n'{delimiter}"
+        )
+
+    def _run_outfile(self, kernel, statement):
+        client = kernel.mariadb_client
+        client.run_statement(self._outfile_statement(statement, kernel.delimiter))
+        if client.iserror():
+            raise ValueError(client.error_message())
+        result = client.run_statement(f"SELECT ROW_COUNT(){kernel.delimiter}")
+        if client.iserror() or not isinstance(result, ResultSet):
+            return 0
+        return max(int(next(iter(result.rows()), (0,))[0]), 0)
+
+    async def _outfile(self, kernel, statement, file_format):
+        if file_format != "csv":
+            kernel._send_message("stderr", "The server only writes CSV files")
+            return
+        if not kernel.connection_config.server_is_local():
+            kernel._send_message(
+                "stderr", "outfile=True needs the MariaDB server on this host"
+            )
+            return
+
+        progress = ExportProgress(kernel, os.path.abspath(self.filename))
+        try:
+            with kernel.client_busy(), kernel._interruptible():
+                rows = await kernel._in_thread(self._run_outfile, kernel, statement)
+        except ValueError as e:
+            kernel._send_message("stderr", str(e))
+            return
+        progress.rows = rows
+        progress.finish()
+
     def execute(self, kernel, data):
-        df = data["last_select"]
+        if not isinstance(self.stream, bool) or not isinstance(self.outfile, bool):
+            kernel._send_message(
+                "stderr",
+                "There was an error while parsing the arguments. "
+                "Please check %lsmagic on how to use the magic command",
+            )
+            return
+
+        file_format = self.format or detect_format(self.filename)
+        if self.stream or self.outfile:
+            statement = self._statement(kernel, data)
+            if statement is None:
+                return
+            # Awaited by the kernel, the query runs off the event loop
+            if self.outfile:
+                return self._outfile(kernel, statement, file_format)
+            return self._stream(kernel, statement, file_format)
+
+        last_result = data.get("last_result")
+        if self.result is None and last_result is not None and last_result.skipped_rows:
+            kernel._send_message(
+                "stderr",
+                "The kernel only kept the first and last rows of the last "
+                "result, use stream=True to write all of them",
+            )
+            return
+
+        df = self.get_dataframe(kernel, data, self.result)
+        if df is None:
+            return
 
         # When opening an existing notebook, the user can execute a cell
         # containing a %df magic, but kernel has no SELECT result stored
@@ -45,7 +290,11 @@ class DF(LineMagic):
             kernel._send_message("stderr", err)
             return
 
-        df.to_csv(self.filename, index=False)
+        try:
+            self._write_dataframe(df, file_format)
+        except (ValueError, ImportError, OSError) as e:
+            kernel._send_message("stderr", str(e))
+            return
 
         message = f"The result set was successfully written into {self.filename}"
         kernel._send_message("stdout", message)
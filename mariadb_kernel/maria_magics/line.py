@@ -9,12 +9,36 @@ pandas.pydata.org/pandas-docs/stable/reference/api/pandas.DataFrame.plot.line.ht
 Example:
     > %line x=column1 y=column2
 
+The result option plots a result kept by the kernel (see %store)
+instead of the result of the last query:
+    > %line x=column1 y=column2 result=sales
+
+Big tables can be aggregated by the server instead, only the points of
+the plot are then sent to the notebook. Give a table or a query, the x
+column to group by and optionally the y column with an aggregate (sum,
+avg, min, max or count, the default is sum, or count without y):
+    > %line table=orders x=created_at y=amount agg=sum bucket=day
+    > %line query="SELECT * FROM orders WHERE shop = 3" x=created_at bucket=hour
+
+bucket groups the x values by second, minute, hour, day, week, month,
+quarter or year, or in numeric buckets of the given width (bucket=10).
+
+The format=svg option draws the plot as an SVG image instead of PNG.
+With format=vegalite, the kernel sends a Vega-Lite chart holding the
+data instead of an image, the notebook draws it and it can be zoomed
+and resized without asking the kernel. Only the x, y, title and stacked
+options are used then (and index for %pie).
+
+Long results are downsampled to about 5000 points before they are
+drawn, keeping the smallest and largest values of every stretch of
+rows. Use max_points=N to change the limit, max_points=0 disables it.
+
 The whole purpose of this magic command is to allow the user to display
 the result of the last query (e.g. SELECT, SHOW,...) in a nice and simple
 matplotlib plot.
 
 Internally, the Line class receives the data of the last query from the kernel
-as a Pandas DataFrame, it generates a plot PNG image, wraps the image into
+as a Pandas DataFrame, it generates a plot image, wraps the image into
 a nice display_data Jupyter message and then sends it further.
 """
 
@@ -34,4 +58,4 @@ class Line(LineMagic):
         return help_text
 
     def execute(self, kernel, data):
-        self.generate_plot(kernel, data, "line")
+        return self.generate_plot(kernel, data, "line")
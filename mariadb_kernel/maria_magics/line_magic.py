@@ -10,18 +10,81 @@ it only sees what is passed as arguments, e.g. '%magic arg1 arg2'
 # Distributed under the terms of the Modified BSD License.
 
 from mariadb_kernel.maria_magics.maria_magic import MariaMagic
+from mariadb_kernel.plot_query import AggregateQuery
+from mariadb_kernel.result_set import ResultSet
 
-import base64
-from distutils import util
-from matplotlib import pyplot
-import os
 import shlex
 
+# The strings distutils.util.strtobool used to accept
+_TRUE = ("y", "yes", "t", "true", "on", "1")
+_FALSE = ("n", "no", "f", "false", "off", "0")
+
+# The options of the plot magics aggregating rows on the server
+AGGREGATE_OPTIONS = ("table", "query", "agg", "bucket", "top")
+
 
 class LineMagic(MariaMagic):
+    args = ""
+
     def type(self):
         return "Line"
 
+    """
+    Removes a name=value option from a string of arguments. Returns the
+    value (None if the option is not there) and the remaining arguments,
+    left as they were written. Only whole arguments are options, not
+    name=value inside a quoted value, e.g. query="select ... result=3".
+    """
+
+    def pop_option(self, args, name):
+        lexer = shlex.shlex(args, posix=True)
+        lexer.whitespace_split = True
+        lexer.commenters = ""
+        start = 0
+        try:
+            for token in lexer:
+                end = lexer.instream.tell()
+                if args[start:end].strip().startswith(f"{name}="):
+                    value = token[len(name) + 1 :]
+                    return value, (args[:start] + args[end:]).strip()
+                start = end
+        except ValueError:
+            # Unbalanced quotes, reported when the arguments are parsed
+            pass
+        return None, args
+
+    """
+    Removes the result=<name or execution count> option from a string
+    of arguments. Returns the reference (None if there is none) and the
+    remaining arguments.
+    """
+
+    def pop_result_ref(self, args):
+        ref, args = self.pop_option(args, "result")
+        if ref is not None and ref.isdigit():
+            ref = int(ref)
+        return ref, args
+
+    """
+    Returns the DataFrame of the last query, or of a result kept by the
+    kernel's result store if ref is given. Returns None and reports an
+    error if there is no such result.
+    """
+
+    def get_dataframe(self, kernel, data, ref):
+        if ref is None:
+            df = data["last_select"]
+            if df is None:
+                # No query was run yet
+                import pandas
+
+                df = pandas.DataFrame([])
+            return df
+        df = kernel.result_store.get(ref)
+        if df is None:
+            kernel._send_message("stderr", f"There is no stored result {ref}")
+        return df
+
     """
     Casts a string to int, float, bool or return the input string
     """
@@ -35,28 +98,71 @@ class LineMagic(MariaMagic):
             except ValueError:
                 pass
 
-        try:
-            return bool(util.strtobool(s))
-        except ValueError:
-            return s
+        if s.lower() in _TRUE:
+            return True
+        if s.lower() in _FALSE:
+            return False
+        return s
 
     """
     Gets a string of "key=value" space-separated arguments
     (e.g. input="kind="hist" bins=8 alpha=0.3")
-    and parses it into a Python dict.
+    and parses it into a Python dict of strings.
+    """
+
+    def parse_raw_args(self, input):
+        return dict(token.split("=", 1) for token in shlex.split(input))
+
+    """
+    Same as parse_raw_args, with the values cast to int, float or bool
+    when possible.
     """
 
     def parse_args(self, input):
-        d = dict(token.split("=") for token in shlex.split(input))
+        d = self.parse_raw_args(input)
         for k, v in d.items():
             d[k] = self._str_to_obj(v)
 
         return d
 
+    def _send_parse_error(self, kernel):
+        kernel._send_message(
+            "stderr",
+            "There was an error while parsing the arguments. "
+            "Please check %lsmagic on how to use the magic command",
+        )
+
     def generate_plot(self, kernel, data, plot_type):
-        image_name = "last_select.png"
-        df = data["last_select"]
+        from mariadb_kernel.plot_renderer import MAX_PLOT_POINTS, create_renderer
+
+        ref, args = self.pop_result_ref(self.args)
+        plot_format, args = self.pop_option(args, "format")
+        max_points, args = self.pop_option(args, "max_points")
+
+        try:
+            raw = self.parse_raw_args(args)
+            aggregate = {k: raw.pop(k) for k in AGGREGATE_OPTIONS if k in raw}
+            d = {k: self._str_to_obj(v) for k, v in raw.items()}
+            max_points = MAX_PLOT_POINTS if max_points is None else int(max_points)
+        except ValueError:
+            self._send_parse_error(kernel)
+            return
+
+        try:
+            renderer = create_renderer(plot_format or "png")
+        except ValueError as e:
+            kernel._send_message("stderr", str(e))
+            return
+
         # Override the plot kind in case the user passes this option
+        d["kind"] = plot_type
+
+        if "table" in aggregate or "query" in aggregate:
+            return self._aggregate(kernel, aggregate, raw, d, renderer, max_points)
+
+        df = self.get_dataframe(kernel, data, ref)
+        if df is None:
+            return
 
         # When opening an existing notebook, the user can execute a cell
         # containing a magic command, but kernel has no SELECT result stored
@@ -66,18 +172,12 @@ class LineMagic(MariaMagic):
             kernel._send_message("stderr", err)
             return
 
-        try:
-            d = self.parse_args(self.args)
-        except ValueError:
-            kernel._send_message(
-                "stderr",
-                "There was an error while parsing the arguments. "
-                "Please check %lsmagic on how to use the magic command",
-            )
-            return
+        self._render(kernel, df, d, renderer, max_points)
 
-        # Override the plot kind in case the user passes this option
-        d["kind"] = plot_type
+    def _render(self, kernel, df, d, renderer, max_points):
+        from mariadb_kernel.plot_renderer import downsample
+
+        plot_type = d["kind"]
 
         # Because the DataFrame.plot.pie function only takes the 'y' axis as
         # option, let's offer users the possibility to specify the index of
@@ -91,19 +191,63 @@ class LineMagic(MariaMagic):
                 return
             d.pop("index", None)
 
+        if plot_type == "line":
+            df = downsample(df, max_points, d)
+
         try:
-            df.plot(**d)
+            plot = renderer.display_data(df, d)
         except (ValueError, AttributeError, TypeError) as e:
             kernel._send_message("stderr", str(e))
             return
 
-        pyplot.savefig(image_name)
+        display_content = {"data": plot, "metadata": {}}
+        kernel.send_response(kernel.iopub_socket, "display_data", display_content)
 
-        with open(image_name, "rb") as f:
-            img = f.read()
-            image = base64.b64encode(img).decode("ascii")
+    """
+    Has the server group the rows of a table or a query by the x column
+    and plots the aggregated values. Returns the coroutine running the
+    query, or None after reporting an error in the options.
+    """
 
-            display_content = {"data": {"image/png": image}, "metadata": {}}
-            kernel.send_response(kernel.iopub_socket, "display_data", display_content)
+    def _aggregate(self, kernel, aggregate, raw, d, renderer, max_points):
+        try:
+            query = AggregateQuery(
+                raw.get("x"),
+                raw.get("y"),
+                aggregate.get("agg"),
+                table=aggregate.get("table"),
+                query=aggregate.get("query"),
+            )
+            top = aggregate.get("top")
+            if top is not None and not top.isdigit():
+                raise ValueError("top must be a positive number of groups")
+            statement = query.statement(
+                aggregate.get("bucket"), None if top is None else int(top)
+            )
+        except ValueError as e:
+            kernel._send_message("stderr", str(e))
+            return None
+
+        # The columns of the aggregated result
+        if d["kind"] == "pie":
+            d.pop("x", None)
+            d["index"] = query.x
+        else:
+            d["x"] = query.x
+        d["y"] = query.y_name()
+        return self._plot_aggregate(kernel, statement, d, renderer, max_points)
+
+    async def _plot_aggregate(self, kernel, statement, d, renderer, max_points):
+        client = kernel.mariadb_client
+        with kernel.client_busy(), kernel._interruptible():
+            result = await kernel._in_thread(
+                client.run_statement, f"{statement}{kernel.delimiter}"
+            )
 
-        os.unlink(image_name)
+        if client.iserror():
+            kernel._send_message("stderr", client.error_message())
+            return
+        if not isinstance(result, ResultSet) or not result.num_rows():
+            kernel._send_message("stderr", "There are no rows to plot")
+            return
+        self._render(kernel, result.to_dataframe(), d, renderer, max_points)
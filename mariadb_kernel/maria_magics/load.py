@@ -2,19 +2,129 @@
 
 help_text = """
 The %load magic command has the following syntax:
-    > %load csv_file_path table_name [skip_row_num]
+    > %load csv_file_path table_name [skip_row_num] [option=value ...]
 The %load magic command can load CSV file for updating specific table data.
 
-This command does not create a table if the one specified as argument doesn't exist,
-the user needs to create the destination table with the proper schema to match the data in the CSV file.
+Unless the create option is given, this command does not create a table if the one specified
+as argument doesn't exist, the user needs to create the destination table with the proper schema
+to match the data in the file.
 
 CSV file first line may be header, can set [skip row num] to 1 for skipping header.
 
 Any argument can be enclosed by ' ' or " ", handling cases that argument contains spaces.
+
+The format of the file is described by the following options:
+    delimiter=','   the string separating the fields
+    enclosure='"'   the character fields may be enclosed in ('' for none)
+    escape='\\\\'     the escape character ('' for none)
+    lines='\\n'      the string terminating the lines
+    encoding=NAME   the character set of the file, e.g. utf8mb4 or latin1
+    skip=N          the number of lines to skip, same as skip_row_num
+
+Besides delimited text, %load reads JSON Lines files (a JSON object per
+line, the keys name the columns) and Parquet files (with pyarrow installed).
+The format is told from the extension of the file (.csv, .jsonl, .ndjson,
+.parquet), or given with:
+    format=NAME     csv, jsonl or parquet
+Files compressed with gzip (.gz), bzip2 (.bz2), xz (.xz) or zstd (.zst, with
+zstandard installed) are decompressed while they are loaded.
+
+    create=True     creates the table if it doesn't exist, the types of the
+                    columns are guessed from the first 1000 rows. The names
+                    of the columns of CSV files come from the last skipped
+                    line (e.g. skip=1 for a header)
+
+Files bigger than chunk_mb megabytes (64 by default) are loaded in chunks,
+which can be loaded in parallel by several connections:
+    workers=N       the number of connections loading chunks (1 by default)
+
+The progress is displayed while the file loads, followed by the number of
+rows loaded and of warnings, e.g. for the rows skipped as duplicates.
+
+Example:
+    > %load /data/sales.csv sales skip=1 delimiter=';' workers=4
+    > %load /data/events.jsonl.gz events create=True
 """
 
+# Copyright (c) MariaDB Foundation.
+# Distributed under the terms of the Modified BSD License.
+
 from mariadb_kernel.maria_magics.line_magic import LineMagic
+
+# The magics are imported while mariadb_client is initialized
+from mariadb_kernel import mariadb_client
+from mariadb_kernel import data_sources
+from mariadb_kernel.result_set import ResultSet
+
+from concurrent.futures import ThreadPoolExecutor
+import html
+import os
+import queue
+import re
 import shlex
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+
+_ESCAPES = {"t": "\t", "n": "\n", "r": "\r", "0": "\0", "Z": "\x1a"}
+
+
+def _unescape(value):
+    """Turns the escape sequences of SQL strings (e.g. '\\t') into the
+    characters they stand for"""
+    return re.sub(r"\\(.)", lambda m: _ESCAPES.get(m.group(1), m.group(1)), value)
+
+
+class LoadProgress:
+    """Keeps the counts of the chunks loaded so far and displays them"""
+
+    def __init__(self, kernel, total_bytes):
+        """total_bytes is None if the size of the data is not known,
+        e.g. for compressed files"""
+        self.kernel = kernel
+        self.total_bytes = total_bytes
+        self.chunks = 0
+        self.bytes = 0
+        self.rows = 0
+        self.warnings = 0
+        self.start = time.perf_counter()
+        self.display_id = uuid.uuid4().hex
+        self.msg_type = "display_data"
+        self.lock = threading.Lock()
+
+    def elapsed(self):
+        return time.perf_counter() - self.start
+
+    def throughput(self):
+        """In MB per second"""
+        return self.bytes / (1 << 20) / max(self.elapsed(), 1e-6)
+
+    def add(self, num_bytes, rows, warnings):
+        with self.lock:
+            self.chunks += 1
+            self.bytes += num_bytes
+            self.rows += rows
+            self.warnings += warnings
+            size = f"{self.bytes / (1 << 20):.1f}"
+            if self.total_bytes:
+                size += f"/{self.total_bytes / (1 << 20):.1f}"
+            self.show(
+                f"Loaded {self.chunks} chunks, {size} MB, {self.rows} rows, "
+                f"{self.warnings} warnings ({self.throughput():.1f} MB/s)"
+            )
+
+    def show(self, text, html_before=""):
+        display_content = {
+            "data": {"text/html": f"{html_before}<p>{text}</p>"},
+            "metadata": {},
+            "transient": {"display_id": self.display_id},
+        }
+        self.kernel.send_response(
+            self.kernel.iopub_socket, self.msg_type, display_content
+        )
+        self.msg_type = "update_display_data"
 
 
 class Load(LineMagic):
@@ -27,37 +137,252 @@ class Load(LineMagic):
     def help(self):
         return help_text
 
-    def execute(self, kernel, data):
-        self.skip_row_num = 0
+    def _parse_args(self):
+        positional = []
+        options = {
+            "delimiter": ",",
+            "enclosure": '"',
+            "escape": None,
+            "lines": "\n",
+            "encoding": None,
+            "skip": 0,
+            "chunk_mb": 64,
+            "workers": 1,
+            "format": None,
+            "create": False,
+        }
+        for arg in self.args_list:
+            name, sep, value = arg.partition("=")
+            if not sep:
+                positional.append(arg)
+            elif name not in options:
+                raise ValueError()
+            elif name in ("skip", "chunk_mb", "workers"):
+                options[name] = int(value)
+            elif name in ("encoding", "format"):
+                options[name] = value
+            elif name == "create":
+                options[name] = self._str_to_obj(value)
+            else:
+                options[name] = _unescape(value)
+
+        if len(positional) not in (2, 3):
+            raise ValueError()
+        if len(positional) == 3:
+            options["skip"] = int(positional[2])
+        if (
+            options["skip"] < 0
+            or options["chunk_mb"] < 1
+            or options["workers"] < 1
+            or not options["delimiter"]
+            or not options["lines"]
+            or len(options["enclosure"]) > 1
+            or (options["escape"] is not None and len(options["escape"]) > 1)
+            or (options["encoding"] and not re.match(r"^\w+$", options["encoding"]))
+            or options["format"] not in (None, "csv", "jsonl", "parquet")
+            or not isinstance(options["create"], bool)
+        ):
+            raise ValueError()
+
+        self.csv_file_path = positional[0]
+        self.table_name = positional[1]
+        self.options = options
+
+    def _statement(self, path, skip, delimiter, fmt=None, columns=None):
+        from mariadb_kernel.schema_index import quote_identifier, quote_string
 
-        if len(self.args_list) < 2:
+        fmt = fmt or self.options
+        sql = [f"LOAD DATA LOCAL INFILE {quote_string(path)}"]
+        sql.append(f"IGNORE INTO TABLE {self.table_name}")
+        if fmt["encoding"]:
+            sql.append(f"CHARACTER SET {fmt['encoding']}")
+        fields = f"FIELDS TERMINATED BY {quote_string(fmt['delimiter'])}"
+        if fmt["enclosure"]:
+            fields += f" OPTIONALLY ENCLOSED BY {quote_string(fmt['enclosure'])}"
+        if fmt["escape"] is not None:
+            fields += f" ESCAPED BY {quote_string(fmt['escape'])}"
+        sql.append(fields)
+        sql.append(f"LINES TERMINATED BY {quote_string(fmt['lines'])}")
+        if skip:
+            sql.append(f"IGNORE {skip} LINES")
+        if columns:
+            sql.append(f"({', '.join(quote_identifier(c) for c in columns)})")
+        return "\n".join(sql) + delimiter
+
+    def _load_chunk(self, client, delimiter, path, skip):
+        """Returns the number of rows loaded and of warnings, or raises
+        RuntimeError with the error of the client"""
+        statement = self._statement(
+            path, skip, delimiter, self.source.format(), self.columns
+        )
+        client.run_statement(statement)
+        if client.iserror():
+            raise RuntimeError(client.error_message())
+
+        # LOAD DATA reports its counts as an info string that only the
+        # native client keeps, ask the server instead
+        result = client.run_statement(f"SELECT ROW_COUNT(), @@warning_count{delimiter}")
+        if client.iserror() or not isinstance(result, ResultSet):
+            return 0, 0
+        rows, warnings = next(iter(result.rows()), (0, 0))
+        return max(int(rows), 0), int(warnings)
+
+    def _create_table(self, kernel):
+        """Creates the target table from the types of the first rows"""
+        columns, rows = self.source.sample(data_sources.SAMPLE_ROWS)
+        if not columns:
+            raise RuntimeError(f"{self.csv_file_path} has no rows to guess the types")
+        statement = data_sources.create_table_statement(self.table_name, columns, rows)
+        kernel.mariadb_client.run_statement(statement + kernel.delimiter)
+        if kernel.mariadb_client.iserror():
+            raise RuntimeError(kernel.mariadb_client.error_message())
+        kernel.invalidate_caches(statement)
+        return statement
+
+    def _start_workers(self, kernel):
+        """Returns the clients loading the chunks besides the kernel's"""
+        clients = []
+        for _ in range(self.options["workers"] - 1):
+            client = mariadb_client.create_client(kernel.log, kernel.connection_config)
+            try:
+                client.start()
+            except (mariadb_client.ServerIsDownError, mariadb_client.LoginError):
+                kernel.log.error("Failed to connect a %load worker")
+                break
+            # Same current database and session variables as the kernel
+            for statement in kernel.mariadb_client.session.replay():
+                client.run_statement(statement)
+            clients.append(client)
+        return clients
+
+    def _load(self, kernel):
+        """Loads the file, returns the LoadProgress and the error of the
+        first chunk that failed, if any"""
+        opts = self.options
+        chunk_size = opts["chunk_mb"] << 20
+        size = self.source.size()
+        skip = 0 if self.source.converted else opts["skip"]
+
+        if self.options["create"]:
+            self.created = self._create_table(kernel)
+
+        if size is not None and size <= chunk_size:
+            # No need for a copy of the file
+            progress = LoadProgress(kernel, size)
+            rows, warnings = self._load_chunk(
+                kernel.mariadb_client, kernel.delimiter, self.csv_file_path, skip
+            )
+            progress.add(size, rows, warnings)
+            return progress, None
+
+        progress = LoadProgress(kernel, size)
+        workers = self._start_workers(kernel)
+        clients = queue.Queue()
+        clients.put((kernel.mariadb_client, kernel.delimiter))
+        for client in workers:
+            clients.put((client, ";"))
+        # Chunks waiting for a client, bounds the disk space they take
+        pending = threading.Semaphore(len(workers) + 1)
+
+        tmpdir = tempfile.mkdtemp(prefix="mariadb_kernel_load_")
+        failed = threading.Event()
+
+        def load(i, chunk_path, num_bytes):
+            client, delimiter = clients.get()
+            try:
+                if failed.is_set():
+                    return None
+                rows, warnings = self._load_chunk(
+                    client, delimiter, chunk_path, skip if i == 0 else 0
+                )
+            except RuntimeError as e:
+                failed.set()
+                return f"Chunk {i + 1} failed: {e}"
+            finally:
+                clients.put((client, delimiter))
+                os.unlink(chunk_path)
+                pending.release()
+            progress.add(num_bytes, rows, warnings)
+            return None
+
+        futures = []
+        try:
+            with ThreadPoolExecutor(max_workers=len(workers) + 1) as executor:
+                for i, chunk in enumerate(self.source.chunks(chunk_size)):
+                    pending.acquire()
+                    if failed.is_set():
+                        pending.release()
+                        break
+                    chunk_path = os.path.join(tmpdir, f"chunk_{i}.csv")
+                    with open(chunk_path, "wb") as f:
+                        f.write(chunk)
+                    futures.append(executor.submit(load, i, chunk_path, len(chunk)))
+                errors = [f.result() for f in futures]
+        finally:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+            for client in workers:
+                client.stop()
+        return progress, next((e for e in errors if e), None)
+
+    async def execute(self, kernel, data):
+        try:
+            self._parse_args()
+        except ValueError:
             kernel._send_message(
                 "stderr",
                 "There was an error while parsing the arguments.\n"
                 + "Please check %lsmagic on how to use the magic command",
             )
             return
-        else:
-            self.csv_file_path = self.args_list[0]
-            self.table_name = self.args_list[1]
-            if len(self.args_list) > 2:
-                self.skip_row_num = int(self.args_list[3])
-
-        use_csv_update_table_cmd = f"""LOAD DATA LOCAL INFILE '{self.csv_file_path}'
-                       IGNORE
-                       INTO TABLE {self.table_name}
-                       FIELDS TERMINATED BY ','
-                       IGNORE {self.skip_row_num} LINES
-                       ;"""
-        kernel.mariadb_client.run_statement(use_csv_update_table_cmd)
-        if kernel.mariadb_client.iserror():
-            kernel._send_message("stderr", kernel.mariadb_client.error_message())
+
+        if not os.path.isfile(self.csv_file_path):
+            kernel._send_message("stderr", f"File {self.csv_file_path} does not exist")
             return
-        result = kernel.mariadb_client.run_statement(
-            f"select * from {self.table_name} limit 5;"
+
+        try:
+            self.source = data_sources.open_source(
+                self.csv_file_path, self.options["format"], self.options
+            )
+            self.columns = None
+            if self.source.converted:
+                self.columns = self.source.columns()
+        except (ValueError, OSError) as e:
+            kernel._send_message("stderr", str(e))
+            return
+
+        self.created = None
+        try:
+            with kernel.client_busy(), kernel._interruptible():
+                progress, error = await kernel._in_thread(self._load, kernel)
+        except (RuntimeError, ValueError, OSError) as e:
+            progress, error = None, str(e)
+        finally:
+            kernel.invalidate_caches(
+                self._statement(self.csv_file_path, 0, kernel.delimiter)
+            )
+
+        if error is not None:
+            if progress is not None and progress.rows:
+                error += f"\n{progress.rows} rows were loaded before the error"
+            kernel._send_message("stderr", error)
+            return
+
+        summary = ""
+        if self.created is not None:
+            summary = f"<pre>{html.escape(self.created)}</pre>"
+        progress.show(
+            f"Loaded {progress.rows} rows ({progress.warnings} warnings) into "
+            f"{self.table_name} in {progress.elapsed():.3f} sec "
+            f"({progress.throughput():.1f} MB/s)",
+            html_before=summary,
         )
+
+        with kernel.client_busy():
+            result = kernel.mariadb_client.run_statement(
+                f"select * from {self.table_name} limit 5{kernel.delimiter}"
+            )
         display_content = {
-            "data": {"text/html": str(result + f"<b>...<b/>")},
+            "data": {"text/html": str(result) + "<b>...<b/>"},
             "metadata": {},
         }
         kernel.send_response(kernel.iopub_socket, "display_data", display_content)
@@ -11,9 +11,6 @@ supported by the kernel. It also prints the help text for each command
 from mariadb_kernel.maria_magics.line_magic import LineMagic
 from mariadb_kernel.maria_magics import supported_magics
 
-import os
-from json2html import *
-
 
 class LSMagic(LineMagic):
     def __init__(self, args):
@@ -26,6 +23,8 @@ class LSMagic(LineMagic):
         return help_text
 
     def execute(self, kernel, data):
+        from json2html import json2html
+
         result = {"Line": [], "Cell": []}
         magics = supported_magics.get()
         for name, magic_type in magics.items():
@@ -12,11 +12,10 @@ class MagicFactory:
         self.log = log
 
     def create_magic(self, magic_cmd, args):
-        magics = supported_magics.get()
-        if not magic_cmd in magics:
+        if not magic_cmd in supported_magics.names():
             return ErrorMagic(magic_cmd)
 
-        magic_type = magics[magic_cmd]
+        magic_type = supported_magics.load(magic_cmd)
         return magic_type(args)
 
 
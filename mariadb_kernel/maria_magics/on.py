@@ -0,0 +1,43 @@
+"""This class implements the %%on magic command"""
+
+help_text = """
+The %%on magic command is a cell magic. This means
+that it operates over the entire cell within it is used.
+
+It runs the cell on a connection opened with %connect, the
+following cells run on the active connection again.
+
+Example:
+--------cell
+%%on replica
+select count(*) from orders;
+--------end-of-cell
+"""
+
+# Copyright (c) MariaDB Foundation.
+# Distributed under the terms of the Modified BSD License.
+from mariadb_kernel.maria_magics.cell_magic import CellMagic
+
+
+class On(CellMagic):
+    def __init__(self, args):
+        self.args = args
+
+    def name(self):
+        return "%%on"
+
+    def help(self):
+        return help_text
+
+    async def execute(self, kernel, data):
+        name = self.args["args"].strip()
+        code = self.args["code"]
+        registry = kernel.connection_registry
+        if registry.get(name) is None:
+            kernel._send_message(
+                "stderr",
+                f"There is no connection named {name}, open it with %connect",
+            )
+            return
+        with registry.using(name):
+            await kernel.do_execute(code, silent=False)
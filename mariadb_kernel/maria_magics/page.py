@@ -0,0 +1,65 @@
+"""This class implements the %page magic command"""
+
+help_text = """
+The %page magic command has the following syntax:
+    > %page [page_number] [rows_per_page]
+
+Results having more rows than the display_max_rows option
+(200 by default) are shown truncated to their first and last rows.
+The whole result set of the last query is kept by the kernel, %page
+displays the rows of one of its pages.
+
+Pages are numbered from 1. If no arguments are specified, the kernel
+displays the first page. The default number of rows per page is
+display_max_rows.
+
+Example:
+    > %page 3 50
+"""
+
+# Copyright (c) MariaDB Foundation.
+# Distributed under the terms of the Modified BSD License.
+from mariadb_kernel.maria_magics.line_magic import LineMagic
+
+
+class Page(LineMagic):
+    def __init__(self, args):
+        self.args = args.split()
+
+    def name(self):
+        return "%page"
+
+    def help(self):
+        return help_text
+
+    def execute(self, kernel, data):
+        rs = data.get("last_result")
+        if rs is None:
+            err = "There is no query previously executed. No data to display"
+            kernel._send_message("stderr", err)
+            return
+
+        try:
+            page = int(self.args[0]) if len(self.args) > 0 else 1
+            page_size = kernel.client_config.display_max_rows() or 100
+            if len(self.args) > 1:
+                page_size = int(self.args[1])
+            if page < 1 or page_size < 1:
+                raise ValueError()
+        except ValueError:
+            kernel._send_message(
+                "stderr",
+                "There was an error while parsing the arguments. "
+                "Please check %lsmagic on how to use the magic command",
+            )
+            return
+
+        if (page - 1) * page_size >= max(rs.num_rows(), 1):
+            kernel._send_message("stderr", f"Page {page} does not exist")
+            return
+
+        display_content = {
+            "data": {"text/html": kernel.renderer.render_page(rs, page, page_size)},
+            "metadata": {},
+        }
+        kernel.send_response(kernel.iopub_socket, "display_data", display_content)
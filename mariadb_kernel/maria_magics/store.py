@@ -0,0 +1,113 @@
+"""This class implements the %store magic command"""
+
+help_text = """
+The %store magic command has the following syntax:
+    > %store [name [execution_count]]
+    > %store -d name
+
+The kernel keeps the result of the last query of every cell, so the
+%df, %bar, %pie and %line magics can use an earlier result without
+running its query again, through their result option:
+    > %bar x=month y=total result=sales
+    > %df sales.csv result=12
+
+A result is referred to by the execution count of its cell, or by a
+name given with %store name, which names the result of the last query
+(or of the cell with the given execution count).
+%store -d name forgets a name.
+
+Results are kept in memory up to result_store_max_bytes (256MB by
+default), the least recently used results are evicted first. Evicted
+results are written to Parquet files if pyarrow is installed,
+otherwise they are dropped.
+
+Without arguments, %store lists the results kept by the kernel.
+"""
+
+# Copyright (c) MariaDB Foundation.
+# Distributed under the terms of the Modified BSD License.
+from mariadb_kernel.maria_magics.line_magic import LineMagic
+from mariadb_kernel.result_set import ResultSet
+
+import re
+
+_NAME = re.compile(r"^[A-Za-z_]\w*$")
+
+
+class Store(LineMagic):
+    def __init__(self, args):
+        self.args = args.split()
+
+    def name(self):
+        return "%store"
+
+    def help(self):
+        return help_text
+
+    def _list(self, kernel):
+        rs = ResultSet(["Cell", "Names", "Rows", "Columns", "Size (KiB)", "Kept in"])
+        for result, names, location in kernel.result_store.entries():
+            rs.append_row(
+                [
+                    result.execution_count,
+                    ", ".join(names),
+                    result.num_rows,
+                    result.num_columns,
+                    round(result.nbytes / 1024, 1),
+                    location,
+                ]
+            )
+
+        if not rs.num_rows():
+            kernel._send_message("stdout", "There are no stored results")
+            return
+
+        display_content = {
+            "data": {"text/html": kernel.renderer.render(rs)},
+            "metadata": {},
+        }
+        kernel.send_response(kernel.iopub_socket, "display_data", display_content)
+
+    def _parse_error(self, kernel):
+        kernel._send_message(
+            "stderr",
+            "There was an error while parsing the arguments. "
+            "Please check %lsmagic on how to use the magic command",
+        )
+
+    def execute(self, kernel, data):
+        store = kernel.result_store
+        if not self.args:
+            self._list(kernel)
+            return
+
+        if self.args[0] == "-d":
+            if len(self.args) != 2:
+                self._parse_error(kernel)
+            elif not store.drop(self.args[1]):
+                kernel._send_message(
+                    "stderr", f"There is no result named {self.args[1]}"
+                )
+            return
+
+        if len(self.args) > 2 or not _NAME.match(self.args[0]):
+            self._parse_error(kernel)
+            return
+
+        name = self.args[0]
+        execution_count = None
+        if len(self.args) == 2:
+            if not self.args[1].isdigit():
+                self._parse_error(kernel)
+                return
+            execution_count = int(self.args[1])
+
+        if not store.name(name, execution_count):
+            if execution_count is None:
+                err = "There is no query previously executed. No result to store"
+            else:
+                err = f"There is no stored result for cell {execution_count}"
+            kernel._send_message("stderr", err)
+            return
+
+        kernel._send_message("stdout", f"The result was stored as {name}")
@@ -3,23 +3,37 @@
 # Copyright (c) MariaDB Foundation.
 # Distributed under the terms of the Modified BSD License.
 
-from mariadb_kernel.maria_magics.line import Line
-from mariadb_kernel.maria_magics.df import DF
-from mariadb_kernel.maria_magics.lsmagic import LSMagic
-from mariadb_kernel.maria_magics.maria_magic import MariaMagic
-from mariadb_kernel.maria_magics.bar import Bar
-from mariadb_kernel.maria_magics.pie import Pie
-from mariadb_kernel.maria_magics.delimiter import Delimiter
-from mariadb_kernel.maria_magics.load import Load
+import importlib
+
+# The module and the class implementing every magic. A module is only
+# imported the first time its magic is used, so the kernel doesn't load
+# pandas or matplotlib when it starts
+_MAGICS = {
+    "line": ("line", "Line"),
+    "bar": ("bar", "Bar"),
+    "pie": ("pie", "Pie"),
+    "df": ("df", "DF"),
+    "lsmagic": ("lsmagic", "LSMagic"),
+    "delimiter": ("delimiter", "Delimiter"),
+    "load": ("load", "Load"),
+    "page": ("page", "Page"),
+    "cache": ("cache", "Cache"),
+    "store": ("store", "Store"),
+    "connect": ("connect", "Connect"),
+    "on": ("on", "On"),
+}
+
+
+def names():
+    return list(_MAGICS)
+
+
+def load(name):
+    """Returns the class implementing a magic, importing its module"""
+    module, class_name = _MAGICS[name]
+    module = importlib.import_module(f"mariadb_kernel.maria_magics.{module}")
+    return getattr(module, class_name)
 
 
 def get():
-    return {
-        "line": Line,
-        "bar": Bar,
-        "pie": Pie,
-        "df": DF,
-        "lsmagic": LSMagic,
-        "delimiter": Delimiter,
-        "load": Load,
-    }
+    return {name: load(name) for name in _MAGICS}
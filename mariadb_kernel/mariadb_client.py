@@ -4,8 +4,78 @@
 # Distributed under the terms of the Modified BSD License.
 
 from pexpect import replwrap, EOF, TIMEOUT, ExceptionPexpect
-from pathlib import Path
+import pexpect
+from contextlib import contextmanager
+import os
 import re
+import shutil
+import tempfile
+import threading
+import time
+
+from mariadb_kernel.code_parser import is_read_only
+from mariadb_kernel.result_set import ClientOutputParser, ResultSet
+from mariadb_kernel.session_journal import SessionJournal
+
+# Longest piece of output we hold back while looking for the prompt,
+# it has to fit the prompt itself including the name of the database
+PROMPT_MAX_LEN = 256
+
+# Number of rows the native client fetches at once when streaming
+STREAM_BATCH_ROWS = 1000
+
+# How long the side connection issuing KILL QUERY may take
+KILL_TIMEOUT = 10
+
+# Seconds to wait before each attempt to reconnect after the connection
+# to the server was lost
+RECONNECT_DELAYS = (0.5, 1, 2, 4, 8)
+
+# CR_SERVER_GONE_ERROR and CR_SERVER_LOST
+LOST_CONNECTION_ERRORS = (2006, 2013)
+
+RECOVERY_FAILED_MSG = (
+    "The connection to the MariaDB server was lost and reconnecting failed, "
+    "please check the server and restart the kernel"
+)
+RECOVERED_MSG = (
+    "The connection to the MariaDB server was lost while running the "
+    "statement. The connection and the session (current database, "
+    "delimiter and session variables) were restored, but the statement "
+    "might have been executed or not, please check before running it again"
+)
+TIMEOUT_KILLED_MSG = "Reading from the client timed out, the statement was killed"
+
+
+class StatementFile:
+    """The file statements are written to before the client sources them
+
+    Every client gets its own file in a private directory, preferably on
+    a memory backed filesystem, so kernels running in the same directory
+    don't clobber each other's statements. The file is opened once and
+    rewritten in place for every statement, then removed with remove().
+    """
+
+    def __init__(self):
+        base = None
+        if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK):
+            base = "/dev/shm"
+        self.dir = tempfile.mkdtemp(prefix="mariadb_kernel_", dir=base)
+        # The name is matched when cleaning up error messages
+        self.path = os.path.join(self.dir, "mariadb_statement")
+        self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o600)
+
+    def write(self, code):
+        data = code.encode("utf-8")
+        os.pwrite(self.fd, data, 0)
+        os.ftruncate(self.fd, len(data))
+
+    def remove(self):
+        if self.fd is None:
+            return
+        os.close(self.fd)
+        self.fd = None
+        shutil.rmtree(self.dir, ignore_errors=True)
 
 
 class MariaREPL(replwrap.REPLWrapper):
@@ -13,31 +83,53 @@ class MariaREPL(replwrap.REPLWrapper):
         replwrap.REPLWrapper.__init__(self, *args, **kwargs)
         self.args = args
         self.kwargs = kwargs
+        self.statement_file = StatementFile()
 
     def _expect_prompt(self, timeout=-1, async_=False):
         patterns = [self.prompt]
         return self.child.expect(patterns, timeout=timeout, async_=async_)
 
-    def run_command(self, code, timeout=-1, async_=False):
+    def run_command(self, code, timeout=-1, async_=False, on_output=None):
+        """Runs code in the client and returns its output
+
+        If on_output is given, the output is passed to it piece by piece
+        as it arrives instead and nothing is returned, so the output of
+        a query is never held in memory as a whole.
+
+        A timeout of -1 means no limit: statements may run for as long
+        as they need, unlike the spawn timeout of pexpect.
+        """
+        if timeout == -1:
+            timeout = None
 
         # Writing the cell code within a file and then sourcing it in the client
         # offers us a lot of advantages.
         # We avoid Pexpect's limitation of PC_MAX_CANON (1024) chars per line
         # and we also avoid more nasty issues like MariaDB client behaviour
         # sending continuation prompt when "\n" is received.
-        stmt_file = ".mariadb_statement"
-        statement_file_path = Path.cwd().joinpath(stmt_file)
-        with statement_file_path.open("w") as f:
-            f.write(code)
-        self.child.sendline(f"source {str(statement_file_path)}")
+        self.statement_file.write(code)
+        self.child.sendline(f"source {self.statement_file.path}")
 
-        try:
-            pattern = self._expect_prompt(timeout, async_)
-        finally:
-            statement_file_path.unlink()
+        if on_output is not None:
+            return self._stream_output(timeout, on_output)
+        pattern = self._expect_prompt(timeout, async_)
 
         return self.child.before
 
+    def _stream_output(self, timeout, on_output):
+        pending = ""
+        while True:
+            pending += self.child.read_nonblocking(65536, timeout)
+            match = self.prompt.search(pending)
+            if match:
+                on_output(pending[: match.start()])
+                return None
+
+            # Keep the end, the prompt might be split across two reads
+            if len(pending) > PROMPT_MAX_LEN:
+                on_output(pending[:-PROMPT_MAX_LEN])
+                pending = pending[-PROMPT_MAX_LEN:]
+
 
 class MariaDBClient:
     def __init__(self, log, config):
@@ -46,11 +138,18 @@ class MariaDBClient:
         kernel_args = "-s -H"
         args = config.get_args()
         self.cmd = f"{self.client_bin} {kernel_args} {args}"
+        # Runs a single statement in a separate client, see kill_query()
+        self.side_cmd = f"{self.client_bin} {args} -e"
 
         self.prompt = re.compile(r"MariaDB \[.*\]>[ \t]")
         self.log = log
         self.error = False
         self.errormsg = ""
+        self.results = []
+        self.connection_id = None
+        self.session = SessionJournal()
+        self.pool_size = config.client_pool_size()
+        self.pool_idle_timeout = config.client_pool_idle_timeout()
 
     def iserror(self):
         return self.error
@@ -58,7 +157,51 @@ class MariaDBClient:
     def error_message(self):
         return self.errormsg
 
-    def _launch_client(self):
+    def last_results(self):
+        return self.results
+
+    def _checkout_client(self):
+        """Returns a client taken from the pool, or None"""
+        from mariadb_kernel import client_pool
+
+        try:
+            child = client_pool.checkout(self.cmd)
+        except OSError:
+            # No pool yet, start one for the next kernels
+            self.log.info("Starting the pool of MariaDB clients")
+            try:
+                client_pool.start_daemon(
+                    self.cmd, self.pool_size, self.pool_idle_timeout
+                )
+            except OSError as e:
+                self.log.error(f"Failed to start the pool of MariaDB clients: {e}")
+            return None
+        if child is None:
+            self.log.info("The pool of MariaDB clients is empty")
+            return None
+        # The client already showed its prompt, have it show a new one
+        child.sendline("")
+        return child
+
+    def _launch_client(self, pooled=False):
+        child = None
+        if pooled and self.pool_size > 0:
+            child = self._checkout_client()
+        if child is not None:
+            try:
+                self.maria_repl = MariaREPL(
+                    child,
+                    orig_prompt=self.prompt,
+                    prompt_change=None,
+                    continuation_prompt=None,
+                )
+                self.log.info("MariaDB client was taken from the pool")
+                return
+            except ExceptionPexpect as e:
+                # e.g. the server closed the idle connection
+                self.log.error(f"The pooled MariaDB client failed: {e}")
+                child.close()
+
         self.maria_repl = MariaREPL(
             self.cmd,
             orig_prompt=self.prompt,
@@ -66,10 +209,84 @@ class MariaDBClient:
             continuation_prompt=None,
         )
 
+    def _fetch_connection_id(self):
+        results = self._query("select connection_id();").results()
+        if not results or not results[0].num_rows():
+            self.log.error("Failed to get the id of the connection")
+            return
+        self.connection_id = int(results[0].values[0][0])
+
+    def _close_client(self):
+        if self.maria_repl is None:
+            return
+        try:
+            self.maria_repl.child.close(force=True)
+        except ExceptionPexpect as e:
+            self.log.error(f"Failed to terminate the MariaDB client: {e}")
+        self.maria_repl.statement_file.remove()
+        self.maria_repl = None
+
+    def _restore_session(self):
+        for statement in self.session.replay():
+            output = self._query(statement).text().strip()
+            if output.startswith("ERROR"):
+                self.log.error(f'Failed to restore "{statement}": {output}')
+        if self.session.delimiter != ";":
+            self._query(f"delimiter {self.session.delimiter}")
+
+    def _recover(self):
+        """Relaunches the client, backing off between attempts, and
+        restores the session. Returns False if all the attempts failed"""
+        self._close_client()
+        for attempt, delay in enumerate(RECONNECT_DELAYS, start=1):
+            time.sleep(delay)
+            try:
+                self._launch_client()
+                self._fetch_connection_id()
+                self._restore_session()
+            except ExceptionPexpect as e:
+                self.log.error(
+                    f"Attempt {attempt} to relaunch the MariaDB client failed: {e}"
+                )
+                self._close_client()
+                continue
+            self.log.info("MariaDB client was relaunched and the session restored")
+            return True
+        return False
+
+    def _fail(self, message):
+        self.error = True
+        self.errormsg = message
+        return message
+
+    def _recover_and_retry(self, code, timeout, on_rows, retry):
+        if not self._recover():
+            return self._fail(RECOVERY_FAILED_MSG)
+        if retry and is_read_only(code):
+            self.log.info("Running the read-only statement again")
+            return self._run_statement(code, timeout, on_rows, retry=False)
+        return self._fail(RECOVERED_MSG)
+
+    def _handle_timeout(self):
+        # The client is still busy running the statement
+        if self.kill_query():
+            try:
+                self.maria_repl._expect_prompt(timeout=KILL_TIMEOUT)
+                return self._fail(TIMEOUT_KILLED_MSG)
+            except (EOF, TIMEOUT):
+                pass
+        if not self._recover():
+            return self._fail(RECOVERY_FAILED_MSG)
+        return self._fail(
+            "Reading from the client timed out, the client was relaunched "
+            "and the session restored"
+        )
+
     def start(self):
         try:
-            self._launch_client()
+            self._launch_client(pooled=True)
             self.log.info("MariaDB client was successfully started")
+            self._fetch_connection_id()
         except EOF as e:
             self.log.error("MariaDB client failed to start")
 
@@ -81,12 +298,22 @@ class MariaDBClient:
 
             # Let the kernel know the server is down
             raise ServerIsDownError()
+        except TIMEOUT:
+            self._close_client()
+            self.log.error(
+                "MariaDB client failed to start, the server didn't answer "
+                "(is the host reachable?)"
+            )
+            raise ServerIsDownError()
         except ExceptionPexpect as e:
             self.log.error(
                 "No mariadb> command line client found at " f"{self.client_bin};"
             )
             self.log.error("Please install MariaDB from mariadb.org/download")
 
+    def is_started(self):
+        return self.maria_repl is not None
+
     def stop(self):
         if self.maria_repl is None:
             return
@@ -95,31 +322,96 @@ class MariaDBClient:
         # better we just expect it
         self.maria_repl.child.sendline("quit")
         self.maria_repl.child.expect(EOF)
+        self.maria_repl.statement_file.remove()
+        self.maria_repl = None
         self.log.info("MariaDB client was successfully stopped")
 
-    def run_statement(self, code, timeout=-1):
+    def kill_query(self):
+        """Kills the statement the client is running, the connection and
+        its session stay intact.
+
+        The client is busy waiting for the statement, so KILL QUERY is sent
+        through a second client. Returns False if that failed.
+        """
+        if self.connection_id is None:
+            self.log.error("Can't kill the query, the connection id is unknown")
+            return False
+
+        cmd = f'{self.side_cmd} "KILL QUERY {self.connection_id}"'
+        try:
+            output, status = pexpect.run(cmd, timeout=KILL_TIMEOUT, withexitstatus=True)
+        except ExceptionPexpect as e:
+            self.log.error(f"Failed to kill the query: {e}")
+            return False
+
+        if status != 0:
+            self.log.error(f"Failed to kill the query: {output.decode().strip()}")
+            return False
+        return True
+
+    def _query(self, code, timeout=-1, on_rows=None):
+        """Runs code in the client and returns the parsed output,
+        raises EOF if the client died and TIMEOUT"""
+        parser = ClientOutputParser()
+
+        def on_output(text):
+            parser.feed(text)
+            rs = parser.current()
+            if rs is not None:
+                on_rows(rs)
+
+        if on_rows is None:
+            parser.feed(self.maria_repl.run_command(code, timeout))
+        else:
+            self.maria_repl.run_command(code, timeout, on_output=on_output)
+        parser.close()
+        return parser
+
+    def run_statement(self, code, timeout=-1, on_rows=None):
+        """Runs code in the client
+
+        Returns the ResultSet of the last table printed by the client,
+        or the text printed by the client if there was no table.
+        Every table is available through last_results().
+        If on_rows is given, it is called with the ResultSet being read
+        every time new rows arrive from the client.
+
+        If the client dies or loses its connection, it is relaunched and
+        the session restored. Read-only statements are then run again,
+        for the others an error is returned.
+        """
+        return self._run_statement(code, timeout, on_rows, retry=True)
+
+    def _run_statement(self, code, timeout, on_rows, retry):
+        self.results = []
         if not code:
             return ""
 
-        result = ""
         try:
-            result = self.maria_repl.run_command(code, timeout)
+            parser = self._query(code, timeout, on_rows)
         except EOF as e:
             self.log.error(
                 f'MariaDB client failed to run command "{code}". '
                 f"Client most probably exited due to a crash: {e}"
             )
-            # TODO: attempt a restart and raise exception if it fails again
+            return self._recover_and_retry(code, timeout, on_rows, retry)
         except TIMEOUT as e:
             self.log.error(
                 f'MariaDB client failed to run command "{code}". '
                 f"Reading from the client timed out: {e}"
             )
-            # TODO: attempt to rerun the cmd and raise exception if failure
+            return self._handle_timeout()
 
-        if result.startswith("ERROR"):
+        result = parser.text()
+        if result.lstrip().startswith("ERROR"):
+            result = result.lstrip()
             self.error = True
 
+            code_match = re.match(r"ERROR (\d+)", result)
+            if code_match and int(code_match.group(1)) in LOST_CONNECTION_ERRORS:
+                self.log.error(f"MariaDB client lost the connection: {result}")
+                return self._recover_and_retry(code, timeout, on_rows, retry)
+
             # Get rid of extra info in the error message that isn't interesting
             # in this case.
             # This matches error messages that look like:
@@ -132,9 +424,324 @@ class MariaDBClient:
             result = "Query OK"
 
         self.error = False
+        self.session.record(code)
+        self.results = parser.results()
+        if self.results:
+            return self.results[-1]
         return result
 
 
+class NativeMariaDBClient:
+    """A client speaking the MariaDB protocol directly from Python
+
+    It exposes the same interface as MariaDBClient, but statements are
+    sent over a PyMySQL connection instead of being typed into a mysql
+    command line client running in a pty.
+    """
+
+    def __init__(self, log, config):
+        self.log = log
+        self.conn_args = config.get_connection_args()
+        self.conn = None
+        # DELIMITER is a command of the command line client, the server
+        # never sees it, so we have to strip it ourselves
+        self.delimiter = ";"
+        self.error = False
+        self.errormsg = ""
+        self.results = []
+        self.type_names = {}
+        self.connection_id = None
+        self.session = SessionJournal()
+        # Set when the statement ran longer than its timeout and was killed
+        self.timed_out = False
+
+    def iserror(self):
+        return self.error
+
+    def error_message(self):
+        return self.errormsg
+
+    def last_results(self):
+        return self.results
+
+    def _connect(self):
+        import pymysql
+        from pymysql.constants import CLIENT
+
+        self.conn = pymysql.connect(
+            **self.conn_args,
+            client_flag=CLIENT.MULTI_STATEMENTS,
+            local_infile=True,
+            autocommit=True,
+        )
+        self.connection_id = self.conn.thread_id()
+
+    def _is_lost_connection(self, error):
+        import pymysql
+
+        # PyMySQL raises InterfaceError when the connection is already closed
+        if isinstance(error, pymysql.err.InterfaceError):
+            return True
+        return (
+            isinstance(error, pymysql.err.OperationalError)
+            and bool(error.args)
+            and error.args[0] in LOST_CONNECTION_ERRORS
+        )
+
+    def _restore_session(self):
+        import pymysql
+
+        with self.conn.cursor() as cursor:
+            for statement in self.session.replay():
+                try:
+                    cursor.execute(statement)
+                except pymysql.err.MySQLError as e:
+                    if self._is_lost_connection(e):
+                        raise
+                    self.log.error(f'Failed to restore "{statement}": {e}')
+
+    def _recover(self):
+        """Reconnects, backing off between attempts, and restores the
+        session. Returns False if all the attempts failed"""
+        import pymysql
+
+        try:
+            self.conn.close()
+        except pymysql.err.Error:
+            pass
+
+        for attempt, delay in enumerate(RECONNECT_DELAYS, start=1):
+            time.sleep(delay)
+            try:
+                self._connect()
+                self._restore_session()
+            except pymysql.err.MySQLError as e:
+                self.log.error(f"Attempt {attempt} to reconnect failed: {e}")
+                continue
+            self.log.info("Reconnected to MariaDB and restored the session")
+            return True
+        return False
+
+    def _fail(self, message):
+        self.error = True
+        self.errormsg = message
+        return message
+
+    def _recover_and_retry(self, code, timeout, on_rows, retry):
+        if not self._recover():
+            return self._fail(RECOVERY_FAILED_MSG)
+        if retry and is_read_only(code):
+            self.log.info("Running the read-only statement again")
+            return self._run_statement(code, timeout, on_rows, retry=False)
+        return self._fail(RECOVERED_MSG)
+
+    def start(self):
+        import pymysql
+        from pymysql.constants import FIELD_TYPE
+
+        # CHAR and INTERVAL are aliases of TINY and ENUM
+        self.type_names = {
+            getattr(FIELD_TYPE, name): name
+            for name in dir(FIELD_TYPE)
+            if name.isupper() and name not in ("CHAR", "INTERVAL")
+        }
+
+        try:
+            self._connect()
+            self.log.info("MariaDB native client was successfully started")
+        except pymysql.err.OperationalError as e:
+            self.log.error("MariaDB client failed to start")
+
+            code = e.args[0] if e.args else 0
+            # ER_ACCESS_DENIED_ERROR
+            if code == 1045:
+                self.log.error("The credentials used for connecting are wrong")
+                raise LoginError()
+
+            self.log.error("Most probably the MariaDB server is not started")
+
+            # Let the kernel know the server is down
+            raise ServerIsDownError()
+
+    def is_started(self):
+        return self.conn is not None
+
+    def stop(self):
+        if self.conn is None:
+            return
+
+        self.conn.close()
+        self.conn = None
+        self.log.info("MariaDB native client was successfully stopped")
+
+    def kill_query(self):
+        """Kills the statement running on the connection, the connection
+        and its session stay intact.
+
+        The connection is busy waiting for the statement, so KILL QUERY is
+        sent through a second connection. Returns False if that failed.
+        """
+        if self.connection_id is None:
+            self.log.error("Can't kill the query, the connection id is unknown")
+            return False
+
+        import pymysql
+
+        try:
+            conn = pymysql.connect(**self.conn_args, connect_timeout=KILL_TIMEOUT)
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute(f"KILL QUERY {self.connection_id}")
+            finally:
+                conn.close()
+        except pymysql.err.MySQLError as e:
+            self.log.error(f"Failed to kill the query: {e}")
+            return False
+        return True
+
+    @contextmanager
+    def _time_limit(self, timeout):
+        """Kills the statement run in the block after timeout sec, like
+        MariaDBClient does. A timeout of -1 or None means no limit"""
+        self.timed_out = False
+        if timeout is None or timeout < 0:
+            yield
+            return
+
+        lock = threading.Lock()
+        running = True
+
+        def expire():
+            # Don't kill the next statement if this one just ended
+            with lock:
+                if running:
+                    self.timed_out = True
+                    self.kill_query()
+
+        timer = threading.Timer(timeout, expire)
+        timer.daemon = True
+        timer.start()
+        try:
+            yield
+        finally:
+            with lock:
+                running = False
+            timer.cancel()
+
+    def _strip_delimiter(self, code):
+        code = code.strip()
+        if self.delimiter != ";" and code.endswith(self.delimiter):
+            code = code[: -len(self.delimiter)]
+        return code
+
+    def _read_result(self, cursor, on_rows):
+        if cursor.description is None:
+            return ResultSet(affected_rows=cursor.rowcount)
+
+        columns = [d[0] for d in cursor.description]
+        column_types = [
+            self.type_names.get(d[1], "UNKNOWN") for d in cursor.description
+        ]
+        if on_rows is None:
+            return ResultSet.from_rows(
+                columns, column_types, cursor.fetchall(), cursor.rowcount
+            )
+
+        rs = ResultSet(columns, column_types)
+        while True:
+            rows = cursor.fetchmany(STREAM_BATCH_ROWS)
+            if not rows:
+                break
+            for row in rows:
+                rs.append_row(row)
+            on_rows(rs)
+        rs.affected_rows = rs.total_rows()
+        return rs
+
+    def run_statement(self, code, timeout=-1, on_rows=None):
+        """Runs code on the connection
+
+        Returns the ResultSet of the last result set sent by the server,
+        or "Query OK" if the statements didn't produce any.
+        Every result, including affected rows and warnings, is available
+        through last_results().
+        If on_rows is given, rows are read from the server in batches and
+        it is called with the ResultSet being read after every batch.
+        A statement running longer than timeout sec is killed, -1 means
+        no limit.
+
+        If the connection is lost, it is reestablished and the session
+        restored. Read-only statements are then run again, for the others
+        an error is returned.
+        """
+        return self._run_statement(code, timeout, on_rows, retry=True)
+
+    def _run_statement(self, code, timeout, on_rows, retry):
+        if not code:
+            return ""
+
+        match = re.match(r"^\s*delimiter\s+(\S+)\s*$", code, re.IGNORECASE)
+        if match:
+            self.delimiter = match.group(1)
+            self.session.record(code)
+            self.error = False
+            return ""
+
+        import pymysql
+
+        self.results = []
+        cursor_class = pymysql.cursors.Cursor
+        if on_rows is not None:
+            cursor_class = pymysql.cursors.SSCursor
+        try:
+            with self._time_limit(timeout), self.conn.cursor(cursor_class) as cursor:
+                cursor.execute(self._strip_delimiter(code))
+                self.results.append(self._read_result(cursor, on_rows))
+                while cursor.nextset():
+                    self.results.append(self._read_result(cursor, on_rows))
+
+                # SHOW WARNINGS can only be sent once every result set was
+                # read and it only reports on the last statement
+                if cursor.warning_count:
+                    self.results[-1].warnings = list(self.conn.show_warnings())
+        except pymysql.err.MySQLError as e:
+            if self._is_lost_connection(e):
+                self.log.error(f"Lost the connection to MariaDB: {e}")
+                return self._recover_and_retry(code, timeout, on_rows, retry)
+            if self.timed_out:
+                self.log.error(f'Running "{code}" timed out: {e}')
+                return self._fail(TIMEOUT_KILLED_MSG)
+            self.error = True
+            self.errormsg = e.args[1] if len(e.args) > 1 else str(e)
+            return self.errormsg
+
+        self.error = False
+        self.session.record(code)
+        tables = [r for r in self.results if r.has_rows()]
+        if not tables:
+            return str(self.results[-1])
+        return tables[-1]
+
+
+def create_client(log, config):
+    """Creates the client for the backend selected in the config"""
+    backend = config.client_backend()
+    if backend == "native":
+        try:
+            import pymysql
+        except ImportError:
+            log.error(
+                "The native client backend needs PyMySQL installed, "
+                "falling back to the mariadb> command line client"
+            )
+        else:
+            return NativeMariaDBClient(log, config)
+    elif backend != "pexpect":
+        log.error(f"Unknown client backend {backend}, using pexpect")
+
+    return MariaDBClient(log, config)
+
+
 class ServerIsDownError(Exception):
     pass
 
@@ -4,14 +4,34 @@ Given an existing installation of MariaDB Server, the kernel tries to detect
 if there is a server already running locally.
 If there isn't one, to simplify users first time experience, the kernel
 tries to spin a new instance for testing purposes and issues a warning.
+
+The data directory is only initialized the first time, later kernels
+start the server on the existing one. The server runs in its own session
+and logs to a file next to its pid file, so it outlives the kernel that
+started it: the kernels using it hold leases (see server_supervisor) and
+the server is stopped once none of them needs it anymore.
 """
 
 # Copyright (c) MariaDB Foundation.
 # Distributed under the terms of the Modified BSD License.
 
+from mariadb_kernel.server_supervisor import (
+    ServerLeases,
+    pid_alive,
+    read_pid,
+    spawn_reaper,
+)
+
 import subprocess
 import signal
 import os
+import time
+
+# How long to wait for the server to start or stop (sec)
+SERVER_TIMEOUT = 60
+
+# How often the log and the pid are checked while waiting (sec)
+POLL_INTERVAL = 0.1
 
 
 class MariaDBServer:
@@ -23,6 +43,9 @@ class MariaDBServer:
         # server_bin can either be an absolute path or just the name of the bin
         self.server_name = server_bin.split("/")[-1]
         self.server = None
+        self.run_dir = os.path.dirname(config.get_server_pidfile())
+        self.log_path = os.path.join(self.run_dir, f"{self.server_name}.log")
+        self.leases = ServerLeases(self.run_dir)
 
     def start(self):
         server_bin = self.config.server_bin()
@@ -34,13 +57,22 @@ class MariaDBServer:
         for path in self.config.get_server_paths():
             os.makedirs(path, exist_ok=True)
         try:
-            self.init_db()
-            self.server = subprocess.Popen(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                universal_newlines=True,
+            if self.is_initialized():
+                self.log.info("Using the existing MariaDB data directory")
+            else:
+                self.init_db()
+            offset = (
+                os.path.getsize(self.log_path) if os.path.exists(self.log_path) else 0
             )
+            with open(self.log_path, "a") as log_file:
+                self.server = subprocess.Popen(
+                    cmd,
+                    stdin=subprocess.DEVNULL,
+                    stdout=log_file,
+                    stderr=log_file,
+                    # Signals sent to the kernel don't reach the server
+                    start_new_session=True,
+                )
         except FileNotFoundError:
             self.log.error(f"No MariaDB Server found at {server_bin};")
             self.log.error("Please install MariaDB from mariadb.org/download")
@@ -50,13 +82,17 @@ class MariaDBServer:
             )
             return
 
-        msg = f"{self.server_name}: ready for connections"
-        self._wait_server(self.server.stderr, msg)
+        self._wait_ready(offset)
         if self.is_up():
             self.log.info("Started MariaDB server successfully")
         else:
             self.log.error("MariaDB server did NOT start successfully")
 
+    def is_initialized(self):
+        """Whether mysql_install_db already created the system tables"""
+        datadir = self.config.get_server_datadir()
+        return os.path.isdir(os.path.join(datadir, "mysql"))
+
     def init_db(self):
         db_init_bin = self.config.db_init_bin()
         args = self.config.get_init_args()
@@ -79,21 +115,90 @@ class MariaDBServer:
 
         return
 
+    def running_pid(self):
+        """Returns the pid of the testing server if it runs, None otherwise"""
+        if self.server is not None:
+            return self.server.pid if self.server.poll() is None else None
+        pid = read_pid(self.config.get_server_pidfile())
+        if pid is None or not pid_alive(pid) or not self._is_server(pid):
+            return None
+        return pid
+
+    def _is_server(self, pid):
+        # The pid file may be left from a server that crashed
+        try:
+            with open(f"/proc/{pid}/cmdline", "rb") as f:
+                return self.server_name.encode() in f.read()
+        except OSError:
+            # No /proc, trust the pid file
+            return True
+
     def stop(self):
-        if not self.is_up():
+        pid = self.running_pid()
+        if pid is None:
             return
 
-        self.server.send_signal(signal.SIGQUIT)
-        msg = f"{self.server_name}: Shutdown complete"
-        self._wait_server(self.server.stderr, msg)
+        os.kill(pid, signal.SIGQUIT)
+        deadline = time.monotonic() + SERVER_TIMEOUT
+        while self.is_up() and time.monotonic() < deadline:
+            time.sleep(POLL_INTERVAL)
+        if self.is_up():
+            self.log.error(f"{self.server_name} did not stop in {SERVER_TIMEOUT} sec")
+            return
         self.log.info("Stopped MariaDB server successfully")
 
-    def _wait_server(self, stream, msg):
-        while self.is_up():
-            line = stream.readline().rstrip()
-            self.log.debug(line)
-            if msg in line:
-                return
+    def _wait_ready(self, offset):
+        """Follows the log of the server from offset until the server is
+        ready, exits, or SERVER_TIMEOUT sec passed"""
+        ready = f"{self.server_name}: ready for connections"
+        deadline = time.monotonic() + SERVER_TIMEOUT
+        pending = ""
+        with open(self.log_path, errors="replace") as f:
+            f.seek(offset)
+            while time.monotonic() < deadline:
+                pending += f.read()
+                *lines, pending = pending.split("\n")
+                for line in lines:
+                    self.log.debug(line)
+                    if ready in line:
+                        return
+                if not self.is_up():
+                    return
+                time.sleep(POLL_INTERVAL)
+        self.log.error(f"No answer from {self.server_name} after {SERVER_TIMEOUT} sec")
 
     def is_up(self):
-        return self.server and self.server.poll() is None
+        if self.server is not None:
+            return self.server.poll() is None
+        return self.running_pid() is not None
+
+    def attach(self, start=False):
+        """Takes a lease on the testing server for this kernel, starting
+        the server first if start is True. Returns False if no server runs"""
+        with self.leases.lock():
+            if self.running_pid() is None:
+                if not start:
+                    return False
+                self.start()
+                if not self.is_up():
+                    return False
+            self.leases.acquire()
+        return True
+
+    def detach(self, idle_timeout):
+        """Releases the lease of this kernel. The last kernel stops the
+        server, after idle_timeout sec if it isn't 0"""
+        with self.leases.lock():
+            self.leases.release()
+            if self.leases.holders() or self.running_pid() is None:
+                return
+            if idle_timeout <= 0:
+                self.stop()
+                return
+            token = self.leases.mark_idle()
+            spawn_reaper(
+                self.run_dir, self.config.get_server_pidfile(), idle_timeout, token
+            )
+            self.log.info(
+                f"No more kernels use the server, stopping it in {idle_timeout:.0f} sec"
+            )
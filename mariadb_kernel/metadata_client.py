@@ -0,0 +1,68 @@
+"""A connection of its own for the queries of completion and inspection
+
+The schema index and the inspector query information_schema. Running
+those queries on the client running the cells would overwrite what the
+user may look at next (SHOW WARNINGS, ROW_COUNT(), the last results),
+and would wait for the statement the client is running. Every
+connection of the kernel has a second client for them instead. It is
+started the first time it is needed, and its queries are killed after
+metadata_timeout sec so a large schema doesn't keep a request waiting.
+"""
+
+# Copyright (c) MariaDB Foundation.
+# Distributed under the terms of the Modified BSD License.
+
+import threading
+
+from mariadb_kernel.mariadb_client import create_client, LoginError, ServerIsDownError
+from mariadb_kernel.result_set import ResultSet
+
+
+class MetadataClient:
+    def __init__(self, log, config):
+        self.log = log
+        self.config = config
+        self.timeout = config.metadata_timeout()
+        self.client = None
+        # Held while a query runs, requests arriving meanwhile get no
+        # answer from the server rather than waiting
+        self.lock = threading.Lock()
+
+    def _start(self):
+        client = create_client(self.log, self.config)
+        try:
+            client.start()
+        except (ServerIsDownError, LoginError):
+            self.log.error("Failed to connect the client of the schema queries")
+            return False
+        if not client.is_started():
+            return False
+        self.client = client
+        return True
+
+    def query(self, sql):
+        """Runs a query for the schema index, returns its rows or None if
+        it could not be run right now"""
+        if not self.lock.acquire(blocking=False):
+            return None
+
+        try:
+            if self.client is None and not self._start():
+                return None
+            result = self.client.run_statement(f"{sql};", timeout=self.timeout)
+            failed = self.client.iserror()
+        finally:
+            self.lock.release()
+        if failed:
+            self.log.error(f"Failed to query the schema: {result}")
+            return None
+        if not isinstance(result, ResultSet):
+            # The command line client prints nothing for an empty result
+            return []
+        return list(result.rows())
+
+    def stop(self):
+        with self.lock:
+            if self.client is not None:
+                self.client.stop()
+                self.client = None
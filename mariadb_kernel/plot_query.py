@@ -0,0 +1,119 @@
+"""Builds the queries aggregating a table on the server for the plots
+
+Instead of plotting the result of the last query, %line, %bar and %pie
+can be given a table or a query together with the columns to plot. The
+rows are then grouped and aggregated by the server, only the points of
+the chart are sent to the kernel.
+
+%line can group the values of its x column in time buckets (an hour, a
+day, ...) or in numeric buckets of a given width, %bar and %pie can keep
+only the groups with the largest values.
+"""
+
+# Copyright (c) MariaDB Foundation.
+# Distributed under the terms of the Modified BSD License.
+
+AGGREGATES = ("count", "sum", "avg", "min", "max")
+
+# The start of the bucket a date or a time belongs to, {} is the column
+TIME_BUCKETS = {
+    "second": "DATE_FORMAT({}, '%Y-%m-%d %H:%i:%s')",
+    "minute": "DATE_FORMAT({}, '%Y-%m-%d %H:%i:00')",
+    "hour": "DATE_FORMAT({}, '%Y-%m-%d %H:00:00')",
+    "day": "DATE({})",
+    "week": "DATE({0}) - INTERVAL WEEKDAY({0}) DAY",
+    "month": "DATE_FORMAT({}, '%Y-%m-01')",
+    "quarter": "MAKEDATE(YEAR({0}), 1) + INTERVAL QUARTER({0}) - 1 QUARTER",
+    "year": "DATE_FORMAT({}, '%Y-01-01')",
+}
+
+# Groups sent to the kernel at most, whatever the query
+MAX_GROUPS = 10000
+
+
+def _quote_name(name):
+    from mariadb_kernel.schema_index import quote_identifier, split_parts
+
+    return ".".join(quote_identifier(part) for part in split_parts(name))
+
+
+def _bucket_expression(column, bucket):
+    if bucket is None:
+        return column
+    if bucket in TIME_BUCKETS:
+        return TIME_BUCKETS[bucket].format(column)
+    try:
+        width = float(bucket)
+    except ValueError:
+        width = 0
+    if width <= 0:
+        raise ValueError(
+            f"Invalid bucket {bucket}, use a positive width or one of "
+            + ", ".join(TIME_BUCKETS)
+        )
+    if width.is_integer():
+        width = int(width)
+    return f"FLOOR({column} / {width}) * {width}"
+
+
+class AggregateQuery:
+    """The aggregation of the rows of a table, or of the rows of a query,
+    grouped by the values of the x column"""
+
+    def __init__(self, x, y=None, agg=None, table=None, query=None):
+        if (table is None) == (query is None):
+            raise ValueError("Give either a table or a query to aggregate")
+        if x is None:
+            raise ValueError("The x option names the column to group by")
+        if agg is None:
+            agg = "count" if y is None else "sum"
+        agg = agg.lower()
+        if agg not in AGGREGATES:
+            raise ValueError(
+                f"Unknown aggregate {agg}, use one of " + ", ".join(AGGREGATES)
+            )
+        if y is None and agg != "count":
+            raise ValueError(f"The y option names the column to {agg}")
+
+        self.x = x
+        self.y = y
+        self.agg = agg
+        self.table = table
+        self.query = query
+
+    def y_name(self):
+        """The name of the column of the aggregated values"""
+        if self.y is None:
+            return "count"
+        return f"{self.agg}({self.y})"
+
+    def _source(self):
+        if self.table is not None:
+            return _quote_name(self.table)
+        return f"(\n{self.query.strip().rstrip(';')}\n) AS source"
+
+    def statement(self, bucket=None, top=None):
+        """Returns the SELECT statement computing the points of the plot,
+        ordered by x, or by decreasing value when keeping the top groups"""
+        from mariadb_kernel.schema_index import quote_identifier
+
+        x = _bucket_expression(quote_identifier(self.x), bucket)
+        if self.y is None:
+            value = "COUNT(*)"
+        else:
+            value = f"{self.agg.upper()}({quote_identifier(self.y)})"
+
+        if top is not None:
+            if top <= 0:
+                raise ValueError("top must be a positive number of groups")
+            order = "ORDER BY 2 DESC"
+            limit = min(top, MAX_GROUPS)
+        else:
+            order = "ORDER BY 1"
+            limit = MAX_GROUPS
+        return (
+            f"SELECT {x} AS {quote_identifier(self.x)}, "
+            f"{value} AS {quote_identifier(self.y_name())}\n"
+            f"FROM {self._source()}\n"
+            f"GROUP BY 1\n{order}\nLIMIT {limit}"
+        )
@@ -0,0 +1,241 @@
+"""Renders the plots of %line, %bar and %pie as images
+
+Every plot is drawn on its own matplotlib Figure with an Agg canvas and
+saved into memory, so rendering doesn't go through the global state of
+pyplot nor a file on disk. The figure is released once the image is
+produced.
+
+Line plots of long results are downsampled before they are drawn: the
+rows are grouped in buckets and only the rows holding the smallest and
+the largest values of each bucket are kept, so the peaks of the series
+still show in the image.
+
+With format=vegalite, no image is drawn at all: the plot is sent as a
+Vega-Lite specification holding its data as CSV text, and the notebook
+renders it, including panning and zooming, on its own.
+"""
+
+# Copyright (c) MariaDB Foundation.
+# Distributed under the terms of the Modified BSD License.
+
+import base64
+import io
+
+import numpy
+import pandas
+from pandas.api.types import is_datetime64_any_dtype, is_numeric_dtype
+
+IMAGE_FORMATS = {"png": "image/png", "svg": "image/svg+xml"}
+
+VEGA_LITE_MIME = "application/vnd.vegalite.v5+json"
+VEGA_LITE_SCHEMA = "https://vega.github.io/schema/vega-lite/v5.json"
+
+FORMATS = tuple(IMAGE_FORMATS) + ("vegalite",)
+
+# Rows drawn at most in a line plot, 0 means no limit
+MAX_PLOT_POINTS = 5000
+
+
+def _numeric_columns(df, plot_args):
+    y = plot_args.get("y")
+    if y is not None:
+        columns = list(y) if isinstance(y, (list, tuple)) else [y]
+    else:
+        columns = [c for c in df.columns if c != plot_args.get("x")]
+    return [c for c in columns if c in df.columns and is_numeric_dtype(df[c].dtype)]
+
+
+def downsample(df, max_points, plot_args):
+    """Returns the rows of df to draw in a line plot of at most about
+    max_points points per column, df itself if it is small enough"""
+    num_rows = len(df)
+    if not max_points or num_rows <= max_points:
+        return df
+
+    columns = _numeric_columns(df, plot_args)
+    num_buckets = max(max_points // 2, 1)
+    buckets = numpy.arange(num_rows) * num_buckets // num_rows
+    if not columns:
+        # Nothing to compare, keep the first row of every bucket
+        keep = numpy.flatnonzero(numpy.diff(buckets, prepend=-1))
+        return df.iloc[keep]
+
+    positions = df[columns].reset_index(drop=True)
+    grouped = positions.groupby(buckets)
+    keep = {0, num_rows - 1}
+    for column in columns:
+        keep.update(grouped[column].idxmin().dropna().astype(int))
+        keep.update(grouped[column].idxmax().dropna().astype(int))
+    return df.iloc[sorted(keep)]
+
+
+class PlotRenderer:
+    def __init__(self, image_format="png"):
+        if image_format not in IMAGE_FORMATS:
+            raise ValueError(
+                f"Unknown image format {image_format}, use "
+                + " or ".join(IMAGE_FORMATS)
+            )
+        self.image_format = image_format
+
+    def mime_type(self):
+        return IMAGE_FORMATS[self.image_format]
+
+    def display_data(self, df, plot_args):
+        """Returns the data of the display_data message showing the plot"""
+        return {self.mime_type(): self.render(df, plot_args)}
+
+    def render(self, df, plot_args):
+        """Plots df with DataFrame.plot(**plot_args) and returns the
+        image, base64 encoded for PNG and as text for SVG"""
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+
+        figure = Figure()
+        FigureCanvasAgg(figure)
+        try:
+            df.plot(ax=figure.subplots(), **plot_args)
+            buf = io.BytesIO()
+            figure.savefig(buf, format=self.image_format)
+        finally:
+            figure.clear()
+
+        if self.image_format == "svg":
+            return buf.getvalue().decode("utf-8")
+        return base64.b64encode(buf.getvalue()).decode("ascii")
+
+
+def _field(name):
+    """Escapes the characters Vega-Lite reads as nested field access"""
+    name = str(name)
+    for c in "\\.[]":
+        name = name.replace(c, "\\" + c)
+    return name
+
+
+def _is_temporal(series):
+    if is_datetime64_any_dtype(series):
+        return True
+    if is_numeric_dtype(series):
+        return False
+    sample = series.dropna().head(100)
+    if sample.empty:
+        return False
+    try:
+        pandas.to_datetime(sample.astype(str), format="ISO8601")
+    except (ValueError, TypeError):
+        return False
+    return True
+
+
+class VegaLiteRenderer:
+    """Turns the arguments of DataFrame.plot into a Vega-Lite chart, only
+    kind, x, y, title, stacked and the index of pie plots are used"""
+
+    def mime_type(self):
+        return VEGA_LITE_MIME
+
+    def display_data(self, df, plot_args):
+        kind = plot_args.get("kind", "line")
+        return {
+            self.mime_type(): self.render(df, plot_args),
+            "text/plain": f"<Vega-Lite {kind} chart of {len(df)} rows>",
+        }
+
+    def _columns(self, df, plot_args):
+        """Returns df with a column for every axis, the x column and the
+        y columns"""
+        if df.index.name is not None:
+            # The index set for a pie plot
+            x = df.index.name
+            df = df.reset_index()
+        elif plot_args.get("x") is not None:
+            x = plot_args["x"]
+        else:
+            x = "index"
+            df = df.reset_index(names=x)
+
+        y = plot_args.get("y")
+        if y is None:
+            ys = [c for c in df.columns if c != x and is_numeric_dtype(df[c])]
+        else:
+            ys = list(y) if isinstance(y, (list, tuple)) else [y]
+        for column in [x] + ys:
+            if column not in df.columns:
+                raise ValueError(f"Unknown column {column}")
+        if not ys:
+            raise ValueError("There are no numeric columns to plot")
+        return df, x, ys
+
+    def render(self, df, plot_args):
+        """Returns the Vega-Lite specification of the plot"""
+        kind = plot_args.get("kind", "line")
+        df, x, ys = self._columns(df, plot_args)
+
+        if kind in ("bar", "pie"):
+            x_type = "nominal"
+        elif _is_temporal(df[x]):
+            x_type = "temporal"
+        elif is_numeric_dtype(df[x]) and kind == "line":
+            x_type = "quantitative"
+        else:
+            x_type = "nominal"
+
+        parse = {
+            x: {"temporal": "date", "quantitative": "number"}.get(x_type, "string")
+        }
+        parse.update({y: "number" for y in ys})
+        columns = [x] + [y for y in ys if y != x]
+        spec = {
+            "$schema": VEGA_LITE_SCHEMA,
+            "data": {
+                "values": df[columns].to_csv(index=False),
+                "format": {"type": "csv", "parse": parse},
+            },
+        }
+        if "title" in plot_args:
+            spec["title"] = str(plot_args["title"])
+
+        if len(ys) == 1:
+            value = {"field": _field(ys[0]), "type": "quantitative"}
+            series = None
+        else:
+            spec["transform"] = [
+                {"fold": [_field(y) for y in ys], "as": ["column", "value"]}
+            ]
+            value = {"field": "value", "type": "quantitative"}
+            series = {"field": "column", "type": "nominal"}
+
+        category = {"field": _field(x), "type": x_type}
+        if x_type == "nominal":
+            # Keep the order of the rows
+            category["sort"] = None
+
+        if kind == "pie":
+            if series is not None:
+                raise ValueError("A pie plot shows a single y column")
+            spec["mark"] = {"type": "arc"}
+            spec["encoding"] = {"theta": value, "color": category}
+            return spec
+
+        spec["mark"] = {"type": "bar" if kind == "bar" else "line"}
+        spec["encoding"] = {"x": category, "y": value}
+        if series is not None:
+            spec["encoding"]["color"] = series
+            if kind == "bar" and not plot_args.get("stacked", False):
+                spec["encoding"]["xOffset"] = {"field": "column"}
+        if kind == "line":
+            # Pan with the mouse, zoom with the wheel
+            spec["params"] = [{"name": "zoom", "select": "interval", "bind": "scales"}]
+        return spec
+
+
+def create_renderer(plot_format):
+    """Raises ValueError for an unknown format"""
+    if plot_format == "vegalite":
+        return VegaLiteRenderer()
+    if plot_format not in IMAGE_FORMATS:
+        raise ValueError(
+            f"Unknown plot format {plot_format}, use " + ", ".join(FORMATS)
+        )
+    return PlotRenderer(plot_format)
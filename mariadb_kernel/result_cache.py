@@ -0,0 +1,122 @@
+"""An opt-in cache of the results of read-only queries
+
+Re-running a cell that only reads data (e.g. while tuning a plot) shows
+the results kept from the previous run instead of querying the server
+again. Only SELECT statements that always return the same rows for the
+same data are cached, keyed on their normalized text and the current
+database. Writes and DDL run by the kernel drop the results of the
+queries reading the tables they change.
+
+The kernel only sees its own statements: changes made by other
+connections, or to the tables behind a view, are not noticed. %cache
+clear empties the cache.
+"""
+
+# Copyright (c) MariaDB Foundation.
+# Distributed under the terms of the Modified BSD License.
+
+import re
+import time
+
+from mariadb_kernel.autocompleter import table_references
+from mariadb_kernel.cache import LRUCache
+from mariadb_kernel.code_parser import is_read_only, written_tables
+from mariadb_kernel.schema_index import split_name
+
+_CACHEABLE = re.compile(r"^\s*(?:SELECT|WITH)\b", re.IGNORECASE)
+# Whatever makes the result depend on more than the data of the tables
+_VOLATILE = re.compile(
+    r"@"
+    r"|\b(?:NOW|RAND|UUID|UUID_SHORT|SYSDATE|CURDATE|CURTIME|CURRENT_DATE"
+    r"|CURRENT_TIME|CURRENT_TIMESTAMP|LOCALTIME|LOCALTIMESTAMP|UNIX_TIMESTAMP"
+    r"|UTC_DATE|UTC_TIME|UTC_TIMESTAMP|CONNECTION_ID|LAST_INSERT_ID|FOUND_ROWS"
+    r"|ROW_COUNT|SLEEP|BENCHMARK|USER|CURRENT_USER|SESSION_USER|SYSTEM_USER"
+    r"|DATABASE|SCHEMA|NEXTVAL|LASTVAL|GET_LOCK|IS_FREE_LOCK|IS_USED_LOCK"
+    r"|RELEASE_LOCK|FOR\s+UPDATE|LOCK\s+IN\s+SHARE\s+MODE"
+    r"|INFORMATION_SCHEMA|PERFORMANCE_SCHEMA|MYSQL|SYS)\b",
+    re.IGNORECASE,
+)
+_SYSTEM_DATABASES = ("information_schema", "performance_schema", "mysql", "sys")
+_SPACES = re.compile(r"""('(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*"|`[^`]*`)|\s+""")
+
+
+def normalize(statement, delimiter):
+    """Collapses the white space outside of quotes and drops the delimiter"""
+    code = statement.strip()
+    if code.endswith(delimiter):
+        code = code[: -len(delimiter)].rstrip()
+    return _SPACES.sub(lambda m: m.group(1) or " ", code)
+
+
+class CachedResult:
+    def __init__(self, statement, results, tables):
+        self.statement = statement
+        self.results = results
+        # (database, lowercase table name) of the tables the query reads
+        self.tables = tables
+        self.created = time.time()
+        self.hits = 0
+
+    def cells(self):
+        return sum(rs.num_rows() * len(rs.columns) for rs in self.results)
+
+
+class ResultCache:
+    def __init__(self, max_entries, max_cells):
+        self.cache = LRUCache(
+            max_entries, 0, max_weight=max_cells, weigh=CachedResult.cells
+        )
+        self.hits = 0
+        self.misses = 0
+
+    def cacheable(self, statement, database):
+        if database in _SYSTEM_DATABASES:
+            return False
+        return (
+            _CACHEABLE.match(statement) is not None
+            and is_read_only(statement)
+            and _VOLATILE.search(statement) is None
+        )
+
+    def get(self, statement, database, delimiter):
+        """Returns the cached result sets of statement, or None"""
+        entry = self.cache.get((normalize(statement, delimiter), database))
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        entry.hits += 1
+        return entry.results
+
+    def put(self, statement, database, delimiter, results):
+        tables = set()
+        for schema, table in table_references(statement).values():
+            tables.add((schema or database, table.lower()))
+        key = (normalize(statement, delimiter), database)
+        self.cache.put(key, CachedResult(key[0], results, tables))
+
+    def invalidate(self, statement, database):
+        """Drops the results a statement that ran successfully might have
+        changed. database is the current database of the session"""
+        names = written_tables(statement)
+        if names is None:
+            self.clear()
+            return
+
+        changed = set()
+        for name in names:
+            schema, table = split_name(name)
+            changed.add((schema or database, table.lower()))
+        if changed:
+            self.cache.discard_if(lambda key, entry: entry.tables & changed)
+
+    def clear(self):
+        self.cache.clear()
+
+    def entries(self):
+        """Returns ((statement, database), CachedResult) pairs, the most
+        recently used first"""
+        return list(reversed(self.cache.items()))
+
+    def cells(self):
+        return self.cache.weight
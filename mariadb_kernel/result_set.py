@@ -0,0 +1,256 @@
+"""A columnar representation of the result of a statement
+
+Both client backends convert what the server sends into ResultSet objects
+exactly once. The kernel then builds the DataFrame of the last query
+directly from the columns and only renders HTML from them for display.
+"""
+
+# Copyright (c) MariaDB Foundation.
+# Distributed under the terms of the Modified BSD License.
+
+from html.parser import HTMLParser
+import html
+
+# Types the DataFrame should hold as floats instead of Decimal objects,
+# otherwise pandas refuses to plot them
+DECIMAL_TYPES = ("DECIMAL", "NEWDECIMAL")
+
+
+class ResultSet:
+    def __init__(self, columns=None, types=None, affected_rows=0, warnings=None):
+        # columns is None for statements that don't produce a result set
+        self.columns = columns
+        self.types = types
+        if columns is not None and types is None:
+            self.types = [None] * len(columns)
+        self.values = [[] for _ in columns or []]
+        self.affected_rows = affected_rows
+        self.warnings = warnings or []
+        # Rows dropped from the middle of a result too large to be kept
+        # whole, see keep_at_most()
+        self.skipped_rows = 0
+        self.max_rows = None
+        self.tail_rows = 0
+
+    @classmethod
+    def from_rows(cls, columns, types, rows, affected_rows=0):
+        rs = cls(list(columns), list(types), affected_rows)
+        rs.values = [list(col) for col in zip(*rows)] or rs.values
+        return rs
+
+    def has_rows(self):
+        return self.columns is not None
+
+    def num_rows(self):
+        if not self.values:
+            return 0
+        return len(self.values[0])
+
+    def total_rows(self):
+        """The number of rows of the result, kept or not"""
+        return self.num_rows() + self.skipped_rows
+
+    def head_rows(self):
+        """The number of rows kept before the skipped ones"""
+        if not self.skipped_rows:
+            return self.num_rows()
+        return self.max_rows - self.tail_rows
+
+    def keep_at_most(self, max_rows, tail_rows):
+        """Keeps about max_rows rows: the first ones, and the last
+        tail_rows appended. The rows in between are only counted, so the
+        memory taken no longer grows with the number of rows"""
+        self.max_rows = max_rows
+        self.tail_rows = min(tail_rows, max_rows)
+        self._trim()
+
+    def _trim(self):
+        extra = self.num_rows() - self.max_rows
+        if extra <= 0:
+            return
+        head = self.max_rows - self.tail_rows
+        for col in self.values:
+            del col[head : head + extra]
+        self.skipped_rows += extra
+
+    def append_row(self, row):
+        for col, value in zip(self.values, row):
+            col.append(value)
+        # Trimmed once tail_rows rows more arrived, not for every row
+        if self.max_rows is not None and self.num_rows() >= self.max_rows + max(
+            self.tail_rows, 1
+        ):
+            self._trim()
+
+    def rows(self, start=0, stop=None):
+        if start == 0 and stop is None:
+            return zip(*self.values)
+        return zip(*(col[start:stop] for col in self.values))
+
+    def _column_series(self, pandas, i):
+        values = self.values[i]
+        if self.types[i] in DECIMAL_TYPES:
+            values = [None if v is None else float(v) for v in values]
+
+        series = pandas.Series(values, dtype=object)
+        if self.types[i] is None:
+            # The values come as text from the command line client, try to
+            # give them a numeric type like pandas.read_html used to
+            try:
+                return pandas.to_numeric(series)
+            except (ValueError, TypeError):
+                return series
+        return series.infer_objects()
+
+    def to_dataframe(self):
+        import pandas
+
+        if not self.has_rows():
+            return pandas.DataFrame([])
+
+        df = pandas.DataFrame(
+            {i: self._column_series(pandas, i) for i in range(len(self.columns))}
+        )
+        df.columns = self.columns
+        return df
+
+    def to_html(self):
+        """Renders the result set the same way the command line client
+        does when started with -H"""
+
+        def cell(tag, value):
+            text = "NULL" if value is None else _escape(str(value))
+            return f"<{tag}>{text}</{tag}>"
+
+        out = ["<TABLE BORDER=1><TR>"]
+        out.extend(cell("TH", c) for c in self.columns)
+        out.append("</TR>")
+        for row in self.rows():
+            out.append("<TR>")
+            out.extend(cell("TD", v) for v in row)
+            out.append("</TR>")
+        out.append("</TABLE>")
+        return "".join(out)
+
+    def __str__(self):
+        if not self.has_rows():
+            if self.affected_rows > 0:
+                return f"Query OK, {self.affected_rows} rows affected"
+            return "Query OK"
+        return self.to_html()
+
+    @classmethod
+    def from_html(cls, text):
+        """Parses the tables printed by the command line client in -H mode"""
+        parser = HTMLResultParser()
+        parser.feed(text)
+        parser.close()
+        return parser.results
+
+
+def _escape(s):
+    # The client escapes double quotes, but not single quotes
+    return html.escape(s, quote=False).replace('"', "&quot;")
+
+
+class HTMLResultParser(HTMLParser):
+    """Single pass parser for the HTML tables of the command line client
+
+    The output can be fed in pieces as it arrives, rows are appended to
+    the last ResultSet in results as soon as they are complete.
+    Text printed outside of the tables (e.g. an error following the
+    tables of a CALL statement) is collected in text.
+    """
+
+    def __init__(self):
+        HTMLParser.__init__(self, convert_charrefs=True)
+        self.results = []
+        self.text = []
+        self.row = None
+        self.cell = None
+
+    def current(self):
+        """Returns the ResultSet being filled, or None"""
+        if not self.results:
+            return None
+        return self.results[-1]
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "table":
+            self.results.append(None)
+        elif tag == "tr":
+            self.row = []
+        elif tag in ("td", "th"):
+            self.cell = []
+
+    def handle_endtag(self, tag):
+        if tag in ("td", "th") and self.cell is not None:
+            value = "".join(self.cell)
+            self.row.append(None if value == "NULL" and tag == "td" else value)
+            self.cell = None
+        elif tag == "tr" and self.row is not None:
+            if self.results[-1] is None:
+                # The first row of every table holds the column names
+                self.results[-1] = ResultSet(self.row)
+            else:
+                self.results[-1].append_row(self.row)
+            self.row = None
+
+    def handle_data(self, data):
+        if self.cell is not None:
+            self.cell.append(data)
+        else:
+            self.text.append(data)
+
+
+class ClientOutputParser:
+    """Incrementally parses what the command line client prints for a
+    statement: either HTML tables or a plain text message.
+
+    Plain text is never run through the HTML parser, error messages can
+    quote SQL code that looks like markup.
+    """
+
+    def __init__(self):
+        self.html = None
+        self.pending = ""
+        self.is_text = False
+
+    def feed(self, text):
+        if self.html is not None:
+            self.html.feed(text)
+            return
+
+        self.pending += text
+        if self.is_text:
+            return
+
+        start = self.pending.lstrip()
+        if len(start) < len("<TABLE"):
+            return
+        if not start.startswith("<TABLE"):
+            self.is_text = True
+            return
+
+        self.html = HTMLResultParser()
+        self.html.feed(self.pending)
+        self.pending = ""
+
+    def close(self):
+        if self.html is not None:
+            self.html.close()
+
+    def current(self):
+        if self.html is None:
+            return None
+        return self.html.current()
+
+    def results(self):
+        if self.html is None:
+            return []
+        return [rs for rs in self.html.results if rs is not None]
+
+    def text(self):
+        if self.html is None:
+            return self.pending
+        return "".join(self.html.text)
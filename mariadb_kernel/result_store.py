@@ -0,0 +1,182 @@
+"""A bounded history of the results of the cells
+
+The kernel keeps the DataFrame of the last result of every cell, so
+magics can plot or export an earlier result without running its query
+again. Results are addressed by the execution count of their cell or by
+a name given with %store.
+
+Results are kept in memory up to a number of bytes, the least recently
+used ones are evicted first. Evicted results are spilled to Parquet
+files when pyarrow is installed, otherwise they are dropped.
+"""
+
+# Copyright (c) MariaDB Foundation.
+# Distributed under the terms of the Modified BSD License.
+
+import importlib.util
+import os
+import shutil
+import tempfile
+
+from mariadb_kernel.cache import LRUCache
+
+# Upper bound on the number of results kept in memory, whatever their size
+MAX_RESULTS = 1000
+
+
+def spill_available():
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+class StoredResult:
+    def __init__(self, execution_count, df, statement=None):
+        self.execution_count = execution_count
+        self.df = df
+        # The statement that produced the result
+        self.statement = statement
+        self.num_rows, self.num_columns = df.shape
+        self.nbytes = int(df.memory_usage(index=True, deep=True).sum())
+        # Set once the result is spilled to disk, df is then None
+        self.path = None
+
+
+class ResultStore:
+    def __init__(self, log, max_bytes, spill=True):
+        self.log = log
+        self.memory = LRUCache(
+            MAX_RESULTS,
+            0,
+            max_weight=max_bytes,
+            weigh=lambda result: result.nbytes,
+            on_evict=self._evict,
+        )
+        self.spill = spill and spill_available()
+        self.spill_dir = None
+        # execution count -> StoredResult, for the results spilled to disk
+        self.on_disk = {}
+        # name -> execution count
+        self.names = {}
+        self.last = None
+
+    def add(self, execution_count, df, statement=None):
+        """Keeps df as the result of a cell, replacing the result the
+        cell stored before"""
+        self._remove_file(execution_count)
+        self.memory.put(execution_count, StoredResult(execution_count, df, statement))
+        self.last = execution_count
+
+    def name(self, name, execution_count=None):
+        """Names the result of a cell, the last stored result by default.
+        Returns False if there is no such result"""
+        if execution_count is None:
+            execution_count = self.last
+        if execution_count not in self:
+            return False
+        self.names[name] = execution_count
+        return True
+
+    def drop(self, name):
+        """Forgets a name, returns False if there is no such name"""
+        return self.names.pop(name, None) is not None
+
+    def __contains__(self, execution_count):
+        return (
+            self.memory.get(execution_count) is not None
+            or execution_count in self.on_disk
+        )
+
+    def _resolve(self, ref):
+        if isinstance(ref, int):
+            return ref
+        return self.names.get(ref)
+
+    def get(self, ref):
+        """Returns the DataFrame of a result, ref is the execution count of
+        its cell or its name. Returns None if there is no such result"""
+        execution_count = self._resolve(ref)
+        if execution_count is None:
+            return None
+
+        result = self.memory.get(execution_count)
+        if result is not None:
+            return result.df
+
+        result = self.on_disk.get(execution_count)
+        if result is None:
+            return None
+        df = self._read(result.path)
+        if df is None:
+            return None
+        # Back in memory, it is the most recently used result now
+        self._remove_file(execution_count)
+        self.memory.put(
+            execution_count, StoredResult(execution_count, df, result.statement)
+        )
+        return df
+
+    def statement(self, ref):
+        """Returns the statement that produced a result, or None"""
+        execution_count = self._resolve(ref)
+        result = self.memory.get(execution_count) or self.on_disk.get(execution_count)
+        if result is None:
+            return None
+        return result.statement
+
+    def entries(self):
+        """Returns (StoredResult, [names], location) for every result,
+        the most recent cell first"""
+        names = {}
+        for name, execution_count in self.names.items():
+            names.setdefault(execution_count, []).append(name)
+
+        rv = [(result, "memory") for _, result in self.memory.items()]
+        rv.extend((result, "disk") for result in self.on_disk.values())
+        rv.sort(key=lambda entry: entry[0].execution_count, reverse=True)
+        return [
+            (result, sorted(names.get(result.execution_count, [])), location)
+            for result, location in rv
+        ]
+
+    def _evict(self, execution_count, result):
+        if not self.spill:
+            self.log.debug(f"Dropping the result of cell {execution_count}")
+            return
+
+        if self.spill_dir is None:
+            self.spill_dir = tempfile.mkdtemp(prefix="mariadb_kernel_results_")
+        path = os.path.join(self.spill_dir, f"{execution_count}.parquet")
+        try:
+            result.df.to_parquet(path, index=False)
+        except (ValueError, TypeError, NotImplementedError, OSError) as e:
+            # e.g. columns mixing values of different types
+            self.log.error(f"Failed to spill the result of cell {execution_count}: {e}")
+            return
+
+        result.df = None
+        result.path = path
+        self.on_disk[execution_count] = result
+
+    def _read(self, path):
+        import pandas
+
+        try:
+            return pandas.read_parquet(path)
+        except (ValueError, OSError) as e:
+            self.log.error(f"Failed to read the spilled result {path}: {e}")
+            return None
+
+    def _remove_file(self, execution_count):
+        result = self.on_disk.pop(execution_count, None)
+        if result is None:
+            return
+        try:
+            os.unlink(result.path)
+        except OSError:
+            pass
+
+    def close(self):
+        """Removes the spilled results"""
+        self.on_disk.clear()
+        if self.spill_dir is not None:
+            shutil.rmtree(self.spill_dir, ignore_errors=True)
+            self.spill_dir = None
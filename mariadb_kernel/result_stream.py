@@ -0,0 +1,71 @@
+"""Streams the rows of a running query to the notebook
+
+Instead of waiting for a query to complete, the kernel can display its
+result set while the rows are still arriving. Every result set gets a
+single display which is updated in place through update_display_data,
+at most every UPDATE_INTERVAL seconds. Only the first and last rows are
+rendered while the query runs, so the size of the updates stays bounded
+no matter how many rows the query returns.
+
+The result sets themselves keep at most keep_rows rows: once a result
+grows larger, only its first rows and its last ones are kept, so the
+memory taken by the kernel doesn't grow with the number of rows either.
+"""
+
+# Copyright (c) MariaDB Foundation.
+# Distributed under the terms of the Modified BSD License.
+
+import time
+import uuid
+
+UPDATE_INTERVAL = 0.5
+
+# Rows rendered in the updates sent while the query runs, when the
+# display of results is not capped
+STREAM_MAX_ROWS = 200
+
+
+class ResultStream:
+    def __init__(self, kernel, renderer, max_rows, keep_rows=0):
+        self.kernel = kernel
+        self.renderer = renderer
+        self.max_rows = max_rows
+        self.running_max_rows = max_rows or STREAM_MAX_ROWS
+        # 0 keeps every row
+        self.keep_rows = keep_rows
+        self.start = time.perf_counter()
+        self.last_update = self.start
+        self.current = None
+        # id() of a ResultSet -> id of the display showing it
+        self.display_ids = {}
+
+    def update(self, result_set):
+        """Called by the client every time new rows arrived"""
+        now = time.perf_counter()
+        if result_set is not self.current:
+            self.current = result_set
+            if self.keep_rows:
+                # Enough last rows for the display
+                result_set.keep_at_most(self.keep_rows, self.running_max_rows // 2)
+            self.display_ids[id(result_set)] = uuid.uuid4().hex
+            self._send("display_data", result_set, self.running_max_rows, now)
+        elif now - self.last_update >= UPDATE_INTERVAL:
+            self._send("update_display_data", result_set, self.running_max_rows, now)
+
+    def finish(self, result_set, elapsed):
+        """Displays the complete result set once the query is done"""
+        msg_type = "update_display_data"
+        if id(result_set) not in self.display_ids:
+            self.display_ids[id(result_set)] = uuid.uuid4().hex
+            msg_type = "display_data"
+        self._send(msg_type, result_set, self.max_rows, self.start + elapsed)
+
+    def _send(self, msg_type, result_set, max_rows, now):
+        self.last_update = now
+        html = self.renderer.render(result_set, max_rows, now - self.start)
+        display_content = {
+            "data": {"text/html": html},
+            "metadata": {},
+            "transient": {"display_id": self.display_ids[id(result_set)]},
+        }
+        self.kernel.send_response(self.kernel.iopub_socket, msg_type, display_content)
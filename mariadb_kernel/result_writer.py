@@ -0,0 +1,144 @@
+"""Writes result sets to files, one batch of rows at a time
+
+%df can run a query again and write its rows while they arrive from the
+client instead of exporting the DataFrame of the last result, so the
+memory it takes doesn't depend on the size of the result.
+
+CSV (optionally gzip compressed) is written with the csv module, Parquet
+and Feather need pyarrow. The schema of a Parquet or Feather file is
+fixed by the first batch. As the command line client gives no types,
+the columns of its results are written as strings: types guessed from
+the first batch may not fit the next ones.
+"""
+
+# Copyright (c) MariaDB Foundation.
+# Distributed under the terms of the Modified BSD License.
+
+import csv
+import gzip
+import os
+
+FORMATS = ("csv", "csv.gz", "parquet", "feather")
+
+
+def detect_format(path):
+    """Returns the format of a file from its name, csv by default"""
+    name = path.lower()
+    if name.endswith(".gz"):
+        return "csv.gz"
+    if name.endswith((".parquet", ".pq")):
+        return "parquet"
+    if name.endswith((".feather", ".arrow")):
+        return "feather"
+    return "csv"
+
+
+class CSVWriter:
+    def __init__(self, path, compress=False):
+        if compress:
+            self.file = gzip.open(path, "wt", newline="")
+        else:
+            self.file = open(path, "w", newline="")
+        self.writer = csv.writer(self.file)
+        self.header = False
+
+    def write(self, result_set):
+        if not self.header:
+            self.writer.writerow(result_set.columns)
+            self.header = True
+        self.writer.writerows(
+            ["" if v is None else v for v in row] for row in result_set.rows()
+        )
+
+    def close(self):
+        self.file.close()
+
+
+class ArrowWriter:
+    """Writes Parquet or Feather files, every batch is cast to the
+    schema of the first one"""
+
+    def __init__(self, path, file_format):
+        try:
+            import pyarrow
+        except ImportError:
+            raise ValueError(f"Writing {file_format} files needs the pyarrow package")
+        self.pyarrow = pyarrow
+        self.path = path
+        self.file_format = file_format
+        self.writer = None
+        self.schema = None
+
+    def _open(self, schema):
+        if self.file_format == "parquet":
+            import pyarrow.parquet
+
+            return pyarrow.parquet.ParquetWriter(self.path, schema)
+        import pyarrow.ipc
+
+        return pyarrow.ipc.new_file(self.path, schema)
+
+    def _table(self, result_set):
+        pyarrow = self.pyarrow
+        if any(t is not None for t in result_set.types):
+            return pyarrow.Table.from_pandas(
+                result_set.to_dataframe(), preserve_index=False
+            )
+        # Text from the command line client, written as it is
+        columns = [
+            pyarrow.array(
+                [None if v is None else str(v) for v in values],
+                type=pyarrow.string(),
+            )
+            for values in result_set.values
+        ]
+        return pyarrow.Table.from_arrays(columns, names=list(result_set.columns))
+
+    def _schema(self, schema):
+        """The schema of the file, columns whose values were all NULL in
+        the first batch are strings, the other types can be cast to it"""
+        pyarrow = self.pyarrow
+        fields = [
+            (
+                field.with_type(pyarrow.string())
+                if pyarrow.types.is_null(field.type)
+                else field
+            )
+            for field in schema
+        ]
+        return pyarrow.schema(fields, metadata=schema.metadata)
+
+    def write(self, result_set):
+        table = self._table(result_set)
+        if self.writer is None:
+            self.schema = self._schema(table.schema)
+            self.writer = self._open(self.schema)
+        if table.schema != self.schema:
+            try:
+                table = table.cast(self.schema)
+            except (self.pyarrow.ArrowInvalid, self.pyarrow.ArrowNotImplementedError):
+                raise ValueError(
+                    "The types of the columns changed while writing the rows, "
+                    "please export as CSV"
+                )
+        self.writer.write_table(table)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+def open_writer(path, file_format):
+    """Raises ValueError if the format can't be written"""
+    if file_format not in FORMATS:
+        raise ValueError(f"Unknown format {file_format}")
+    if file_format in ("csv", "csv.gz"):
+        return CSVWriter(path, compress=file_format == "csv.gz")
+    return ArrowWriter(path, file_format)
+
+
+def file_size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
@@ -0,0 +1,166 @@
+"""An in-kernel index of the objects on the server
+
+The index answers completion requests without querying the server for
+every keystroke. The names of the databases and stored routines are
+loaded from information_schema the first time they are needed, tables and
+columns are loaded one database at a time. DDL statements run by the
+kernel only mark the parts of the index they change as stale, those are
+loaded again when next needed.
+"""
+
+# Copyright (c) MariaDB Foundation.
+# Distributed under the terms of the Modified BSD License.
+
+from bisect import bisect_left
+
+from mariadb_kernel.code_parser import schema_change
+
+
+def unquote(identifier):
+    """Strips the backticks around an identifier"""
+    if len(identifier) > 1 and identifier[0] == identifier[-1] == "`":
+        return identifier[1:-1].replace("``", "`")
+    return identifier
+
+
+def split_parts(name):
+    """Splits a qualified name like db.`my table` into its unquoted parts"""
+    parts = []
+    current = ""
+    quoted = False
+    for c in name:
+        if c == "`":
+            quoted = not quoted
+        if c == "." and not quoted:
+            parts.append(current)
+            current = ""
+        else:
+            current += c
+    parts.append(current)
+    return [unquote(part) for part in parts]
+
+
+def split_name(name):
+    """Splits a possibly qualified name into (database, object),
+    database is None when the name isn't qualified"""
+    parts = split_parts(name)
+    if len(parts) == 1:
+        return None, parts[0]
+    return parts[-2], parts[-1]
+
+
+def quote_string(value):
+    value = value.replace("\\", "\\\\").replace("'", "\\'")
+    return f"'{value}'"
+
+
+def quote_identifier(name):
+    return "`" + name.replace("`", "``") + "`"
+
+
+class PrefixList:
+    """A sorted list of names that finds the names starting with a prefix,
+    case insensitively, in logarithmic time"""
+
+    def __init__(self, names=()):
+        self.entries = sorted({(name.lower(), name) for name in names})
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, name):
+        i = bisect_left(self.entries, (name.lower(),))
+        return i < len(self.entries) and self.entries[i][0] == name.lower()
+
+    def matches(self, prefix):
+        prefix = prefix.lower()
+        i = bisect_left(self.entries, (prefix,))
+        rv = []
+        while i < len(self.entries) and self.entries[i][0].startswith(prefix):
+            rv.append(self.entries[i][1])
+            i += 1
+        return rv
+
+
+class SchemaIndex:
+    def __init__(self, log, query):
+        """query(sql) runs a statement and returns its rows, or None if
+        the statement could not be run right now"""
+        self.log = log
+        self.query = query
+        self.invalidate_all()
+
+    def invalidate_all(self):
+        self.databases = None
+        # database name -> PrefixList of its tables and views
+        self.tables = {}
+        # database name -> {lowercase table name -> PrefixList of its columns}
+        self.columns = {}
+        self.routines = None
+
+    def invalidate(self, statement, database):
+        """Marks what a statement that ran successfully changed as stale.
+        database is the current database of the session"""
+        change = schema_change(statement)
+        if change is None:
+            return
+
+        kind, name = change
+        if kind in ("DATABASE", "SCHEMA"):
+            self.invalidate_all()
+            return
+        if kind in ("PROCEDURE", "FUNCTION", "PACKAGE"):
+            self.routines = None
+            return
+
+        schema, _ = split_name(name)
+        schema = schema or database
+        self.tables.pop(schema, None)
+        self.columns.pop(schema, None)
+
+    def get_databases(self):
+        if self.databases is None:
+            rows = self.query("SELECT SCHEMA_NAME FROM information_schema.SCHEMATA")
+            if rows is None:
+                return PrefixList()
+            self.databases = PrefixList(row[0] for row in rows)
+        return self.databases
+
+    def get_tables(self, database):
+        if database is None:
+            return PrefixList()
+        if database not in self.tables:
+            rows = self.query(
+                "SELECT TABLE_NAME FROM information_schema.TABLES "
+                f"WHERE TABLE_SCHEMA = {quote_string(database)}"
+            )
+            if rows is None:
+                return PrefixList()
+            self.tables[database] = PrefixList(row[0] for row in rows)
+        return self.tables[database]
+
+    def get_columns(self, database, table):
+        if database is None:
+            return PrefixList()
+        if database not in self.columns:
+            rows = self.query(
+                "SELECT TABLE_NAME, COLUMN_NAME FROM information_schema.COLUMNS "
+                f"WHERE TABLE_SCHEMA = {quote_string(database)}"
+            )
+            if rows is None:
+                return PrefixList()
+            names = {}
+            for table_name, column in rows:
+                names.setdefault(table_name.lower(), []).append(column)
+            self.columns[database] = {t: PrefixList(c) for t, c in names.items()}
+        return self.columns[database].get(table.lower(), PrefixList())
+
+    def get_routines(self):
+        if self.routines is None:
+            rows = self.query(
+                "SELECT DISTINCT ROUTINE_NAME FROM information_schema.ROUTINES"
+            )
+            if rows is None:
+                return PrefixList()
+            self.routines = PrefixList(row[0] for row in rows)
+        return self.routines
@@ -0,0 +1,162 @@
+"""Keeps track of the kernels using the testing MariaDB server
+
+Every kernel using the server started by the kernels holds a lease, an
+empty file named after its pid in a directory next to the pid file of
+the server. Leases are taken and released under an exclusive lock, so
+two kernels never start the server together, nor stop it while another
+one is connecting. The leases of kernels that died without releasing
+them are dropped when they are found.
+
+When the last lease is released, the server is kept running for an idle
+period, so restarting a notebook doesn't pay for starting the server
+again. A small reaper process is left behind for that, it stops the
+server at the end of the period unless a kernel took a lease meanwhile.
+
+This file is also the reaper, it is run as a script so it doesn't import
+the kernel:
+    python server_supervisor.py <directory> <pid file> <idle sec> <token>
+"""
+
+# Copyright (c) MariaDB Foundation.
+# Distributed under the terms of the Modified BSD License.
+
+from contextlib import contextmanager
+import fcntl
+import os
+import signal
+import subprocess
+import sys
+import time
+import uuid
+
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Running as another user
+        return True
+    return True
+
+
+def read_pid(path):
+    try:
+        with open(path) as f:
+            return int(f.read().strip())
+    except (OSError, ValueError):
+        return None
+
+
+def _remove(path):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+class ServerLeases:
+    def __init__(self, directory):
+        self.directory = directory
+        self.lease_dir = os.path.join(directory, "kernels")
+        self.lock_path = os.path.join(directory, "server.lock")
+        # Holds the token of the reaper allowed to stop the idle server
+        self.idle_path = os.path.join(directory, "server.idle")
+        self.lease = None
+
+    @contextmanager
+    def lock(self):
+        os.makedirs(self.lease_dir, exist_ok=True)
+        with open(self.lock_path, "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def acquire(self):
+        """Takes a lease for this kernel, the lock must be held"""
+        if self.lease is None:
+            name = f"{os.getpid()}.{uuid.uuid4().hex}"
+            self.lease = os.path.join(self.lease_dir, name)
+            open(self.lease, "w").close()
+        # A reaper waiting for the end of the idle period must leave the
+        # server running
+        _remove(self.idle_path)
+
+    def release(self):
+        """Releases the lease of this kernel, the lock must be held"""
+        if self.lease is not None:
+            _remove(self.lease)
+            self.lease = None
+
+    def holders(self):
+        """Returns the leases of the running kernels, the lock must be held"""
+        rv = []
+        for name in sorted(os.listdir(self.lease_dir)):
+            path = os.path.join(self.lease_dir, name)
+            pid = name.split(".")[0]
+            if pid.isdigit() and pid_alive(int(pid)):
+                rv.append(path)
+            else:
+                _remove(path)
+        return rv
+
+    def mark_idle(self):
+        """Returns the token of the reaper allowed to stop the server, the
+        lock must be held"""
+        token = uuid.uuid4().hex
+        with open(self.idle_path, "w") as f:
+            f.write(token)
+        return token
+
+    def idle_token(self):
+        try:
+            with open(self.idle_path) as f:
+                return f.read()
+        except OSError:
+            return None
+
+
+def spawn_reaper(directory, pidfile, idle_timeout, token):
+    """Starts the process stopping the server after idle_timeout sec"""
+    subprocess.Popen(
+        [
+            sys.executable,
+            os.path.abspath(__file__),
+            directory,
+            pidfile,
+            str(idle_timeout),
+            token,
+        ],
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+
+
+def reap(directory, pidfile, idle_timeout, token):
+    """Stops the server after idle_timeout sec if no kernel took a lease
+    and no later reaper took over. Returns True if it was stopped"""
+    time.sleep(idle_timeout)
+    leases = ServerLeases(directory)
+    with leases.lock():
+        if leases.holders() or leases.idle_token() != token:
+            return False
+        _remove(leases.idle_path)
+        pid = read_pid(pidfile)
+        if pid is None or not pid_alive(pid):
+            return False
+        os.kill(pid, signal.SIGQUIT)
+        return True
+
+
+def main(argv):
+    directory, pidfile, idle_timeout, token = argv[1:5]
+    reap(directory, pidfile, float(idle_timeout), token)
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,65 @@
+"""Keeps track of the state of a client session
+
+When the connection to the server is lost, the client is relaunched or
+reconnected and starts with a fresh session. The journal remembers the
+statements that shaped the old session (the current database, the
+delimiter and the session variables) so they can be replayed on the new
+connection.
+"""
+
+# Copyright (c) MariaDB Foundation.
+# Distributed under the terms of the Modified BSD License.
+
+from mariadb_kernel.code_parser import delimiter_command
+
+import re
+
+# Oldest SET statements are forgotten past this many
+MAX_SET_STATEMENTS = 100
+
+_USE = re.compile(r"^\s*use\s+(`(?:[^`]|``)+`|[^\s;`]+)", re.IGNORECASE)
+_SET = re.compile(r"^\s*set\s", re.IGNORECASE)
+# SET statements that don't change the state of the session
+_NOT_SESSION = re.compile(
+    r"^\s*set\s+(?:global\s|password\b|statement\s|default\s+role\s|@@global\.)",
+    re.IGNORECASE,
+)
+
+
+class SessionJournal:
+    def __init__(self):
+        self.database = None
+        self.delimiter = ";"
+        self.set_statements = []
+
+    def record(self, statement):
+        """Records statement if it changed the session, call it only for
+        statements that ran successfully"""
+        new_delimiter = delimiter_command(statement)
+        if new_delimiter:
+            self.delimiter = new_delimiter
+            return
+
+        code = statement.strip()
+        if code.endswith(self.delimiter):
+            code = code[: -len(self.delimiter)].rstrip()
+
+        match = _USE.match(code)
+        if match:
+            self.database = match.group(1)
+        elif _SET.match(code) and not _NOT_SESSION.match(code):
+            # Statements are replayed in order, later ones override
+            # earlier ones, only exact duplicates can go
+            if code in self.set_statements:
+                self.set_statements.remove(code)
+            self.set_statements.append(code)
+            del self.set_statements[:-MAX_SET_STATEMENTS]
+
+    def replay(self):
+        """Returns the statements that restore the session on a new
+        connection, each ending with ";" """
+        statements = []
+        if self.database:
+            statements.append(f"USE {self.database};")
+        statements.extend(f"{code};" for code in self.set_statements)
+        return statements
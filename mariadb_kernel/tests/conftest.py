@@ -21,6 +21,19 @@ def mariadb_server():
     server.stop()
 
 
-@pytest.fixture(params=["line", "bar", "pie", "df", "lsmagic", "load"])
+@pytest.fixture(
+    params=[
+        "line",
+        "bar",
+        "pie",
+        "df",
+        "lsmagic",
+        "load",
+        "page",
+        "cache",
+        "store",
+        "connect",
+    ]
+)
 def magic_cmd(request):
     return request.param
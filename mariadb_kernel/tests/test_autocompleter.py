@@ -0,0 +1,72 @@
+from unittest.mock import Mock
+
+from ..autocompleter import Autocompleter, table_references
+from ..schema_index import SchemaIndex
+
+
+def _autocompleter():
+    def query(sql):
+        if "SCHEMATA" in sql:
+            return [("shop",), ("my db",)]
+        if "ROUTINES" in sql:
+            return [("refresh_stats",)]
+        if "TABLES" in sql and "'shop'" in sql:
+            return [("orders",), ("order items",), ("customers",)]
+        if "COLUMNS" in sql and "'shop'" in sql:
+            return [
+                ("orders", "id"),
+                ("orders", "customer_id"),
+                ("customers", "id"),
+                ("customers", "name"),
+            ]
+        return []
+
+    return Autocompleter(SchemaIndex(Mock(), query))
+
+
+def _complete(code, database="shop"):
+    return _autocompleter().complete(code, len(code), database)
+
+
+def test_completes_keywords_in_the_case_they_are_typed():
+    assert _complete("sel")["matches"] == ["select"]
+    reply = _complete("SELECT * FROM orders WHER")
+    assert reply["matches"] == ["WHERE"]
+    assert reply["cursor_start"] == len("SELECT * FROM orders ")
+    assert reply["cursor_end"] == len("SELECT * FROM orders WHER")
+
+
+def test_completes_tables_databases_and_routines():
+    assert _complete("select * from or")["matches"][:2] == ["`order items`", "orders"]
+    assert _complete("use m")["matches"][0] == "`my db`"
+    assert _complete("call refr")["matches"] == ["refresh_stats"]
+    # No current database
+    assert _complete("select * from or", database=None)["matches"] == ["or", "order"]
+
+
+def test_completes_qualified_names():
+    assert _complete("select * from shop.o")["matches"] == ["`order items`", "orders"]
+    reply = _complete("select shop.customers.n")
+    assert reply["matches"] == ["name"]
+    assert reply["cursor_start"] == len("select shop.customers.")
+    assert _complete("select orders.c")["matches"] == ["customer_id"]
+
+
+def test_completes_columns_of_the_tables_in_the_statement():
+    code = "select o.cu from orders o join customers c on o.id = c.n"
+    completer = _autocompleter()
+    assert completer.complete(code, len(code), "shop")["matches"] == ["name"]
+    cursor = len("select o.cu")
+    assert completer.complete(code, cursor, "shop")["matches"] == ["customer_id"]
+
+    assert _complete("select na from customers;\nselect ")["matches"] == ["id", "name"]
+
+
+def test_completes_magics():
+    assert _complete("%p")["matches"] == ["%page", "%pie"]
+    assert _complete("select 1;\n%%del")["matches"] == ["%%delimiter"]
+
+
+def test_table_references():
+    refs = table_references("select * from a, db.b x join c as y where 1")
+    assert refs == {"a": (None, "a"), "x": ("db", "b"), "y": (None, "c")}
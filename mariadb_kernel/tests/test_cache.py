@@ -0,0 +1,81 @@
+from ..cache import LRUCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+def test_cache_evicts_the_least_recently_used_entry():
+    cache = LRUCache(2, 0)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert len(cache) == 2
+
+
+def test_cache_entries_expire():
+    clock = Clock()
+    cache = LRUCache(10, 60, clock=clock)
+    cache.put("a", 1)
+    clock.now = 59
+    assert cache.get("a") == 1
+    clock.now = 60
+    assert cache.get("a", "gone") == "gone"
+    assert len(cache) == 0
+
+
+def test_cache_discards_matching_keys():
+    cache = LRUCache(10, 0)
+    cache.put(("db1", "a"), 1)
+    cache.put(("db1", "b"), 2)
+    cache.put(("db2", "a"), 3)
+
+    cache.discard_if(lambda key, value: key[0] == "db1")
+    cache.pop(("missing", "key"))
+
+    assert list(cache.entries) == [("db2", "a")]
+
+
+def test_cache_evicts_entries_until_they_fit_the_weight():
+    cache = LRUCache(10, 0, max_weight=10, weigh=len)
+    cache.put("a", "x" * 4)
+    cache.put("b", "x" * 4)
+    cache.put("c", "x" * 4)
+    assert [key for key, _ in cache.items()] == ["b", "c"]
+    assert cache.weight == 8
+
+    # Too heavy to be cached at all
+    cache.put("d", "x" * 11)
+    assert cache.get("d") is None
+    assert cache.weight == 8
+
+    cache.pop("b")
+    cache.put("c", "x")
+    assert cache.weight == 1
+
+
+def test_cache_reports_evicted_entries():
+    evicted = []
+    cache = LRUCache(
+        2,
+        0,
+        max_weight=10,
+        weigh=len,
+        on_evict=lambda key, value: evicted.append(key),
+    )
+    cache.put("a", "xxx")
+    cache.put("b", "xxx")
+    cache.put("c", "xxx")
+    cache.put("d", "x" * 11)
+    cache.pop("b")
+
+    assert evicted == ["a", "d"]
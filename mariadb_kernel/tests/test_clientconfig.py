@@ -123,3 +123,43 @@ def test_client_config_path():
 
     with patch.dict("os.environ", {"JUPYTER_CONFIG_DIR": "/test/"}):
         assert cfg._config_path() == "/test/mariadb_config.json"
+
+
+def test_client_config_derives_other_connections():
+    cfg = ClientConfig(Mock(), name="nonexistentcfg.json")
+    replica = cfg.derive({"host": "replica", "port": "3307"})
+
+    assert "--host=replica" in replica.get_args()
+    assert "--port=3307" in replica.get_args()
+    assert replica.describe() == "root@replica:3307"
+    # The original config is left unchanged
+    assert cfg.default_config["host"] == "localhost"
+    assert cfg.describe() == f"root@{cfg.default_config['socket']}"
+
+    with pytest.raises(ValueError):
+        cfg.derive({"server_datadir": "/tmp"})
+
+
+def test_client_config_derived_port_connects_through_tcp():
+    cfg = ClientConfig(Mock(), name="nonexistentcfg.json")
+    replica = cfg.derive({"port": "3307"})
+
+    # Not through the socket of the default server
+    args = replica.get_args()
+    assert "--socket" not in args
+    assert "--host=127.0.0.1" in args and "--port=3307" in args
+    assert replica.get_connection_args() == {
+        "user": "root",
+        "password": "",
+        "host": "127.0.0.1",
+        "port": 3307,
+    }
+    assert replica.describe() == "root@127.0.0.1:3307"
+
+    # Another user of the default server keeps its socket
+    other = cfg.derive({"user": "app"})
+    assert other.get_connection_args()["unix_socket"] == cfg.default_config["socket"]
+
+    local = cfg.derive({"port": "3307", "socket": "/tmp/replica.sock"})
+    assert "--socket=/tmp/replica.sock" in local.get_args()
+    assert local.get_connection_args()["unix_socket"] == "/tmp/replica.sock"
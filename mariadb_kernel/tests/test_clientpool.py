@@ -0,0 +1,143 @@
+import os
+import sys
+import threading
+import time
+import pytest
+from unittest.mock import patch, Mock
+
+from .. import client_pool
+from ..client_config import ClientConfig
+from ..mariadb_client import MariaDBClient, MariaREPL
+
+# Answers "source <file>" with the content of the file, like a client
+# running the statements of the file would
+FAKE_CLIENT = """
+import sys
+while True:
+    sys.stdout.write("MariaDB [(none)]> ")
+    sys.stdout.flush()
+    line = sys.stdin.readline()
+    if not line:
+        break
+    if line.startswith("source "):
+        with open(line.split(" ", 1)[1].strip()) as f:
+            print("ran " + f.read())
+"""
+
+
+def _fake_client(tmp_path):
+    script = tmp_path / "fake_client.py"
+    script.write_text(FAKE_CLIENT)
+    return f"{sys.executable} {script}"
+
+
+def _checkout(cmd, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            child = client_pool.checkout(cmd)
+        except OSError:
+            child = None
+        if child is not None:
+            return child
+        time.sleep(0.1)
+    raise AssertionError("No client was taken from the pool")
+
+
+def test_launch_waits_for_the_prompt(tmp_path):
+    pid, fd = client_pool.launch(_fake_client(tmp_path))
+    try:
+        os.write(fd, b"\n")
+        # No echo of the input, only a new prompt
+        time.sleep(0.2)
+        assert os.read(fd, 1024) == b"MariaDB [(none)]> "
+    finally:
+        os.close(fd)
+        os.waitpid(pid, 0)
+
+
+def test_launch_raises_when_the_client_exits(tmp_path):
+    with pytest.raises(OSError):
+        client_pool.launch("false", timeout=5)
+
+
+def test_checkout_raises_without_a_pool(tmp_path):
+    with pytest.raises(OSError):
+        client_pool.checkout(_fake_client(tmp_path))
+
+
+def test_pooled_clients_are_handed_to_kernels(tmp_path):
+    cmd = _fake_client(tmp_path)
+    client_pool.start_daemon(cmd, 2, 5)
+
+    children = [_checkout(cmd), _checkout(cmd)]
+    try:
+        for i, child in enumerate(children):
+            child.sendline("")
+            repl = MariaREPL(
+                child,
+                orig_prompt=r"MariaDB \[.*\]>[ \t]",
+                prompt_change=None,
+                continuation_prompt=None,
+            )
+            try:
+                output = repl.run_command(f"select {i};", timeout=5)
+            finally:
+                repl.statement_file.remove()
+            assert output.strip() == f"ran select {i};"
+    finally:
+        for child in children:
+            child.close()
+
+
+def test_pool_keeps_the_clients_handed_out_while_reaping():
+    pool = client_pool.Pool("client", 1)
+    pool.track(1)
+    kernels = []
+
+    def exited(pid):
+        # A kernel takes another client meanwhile
+        kernel = threading.Thread(target=pool.track, args=(2,))
+        kernel.start()
+        kernel.join(0.1)
+        kernels.append(kernel)
+        return True
+
+    with patch.object(client_pool, "_exited", side_effect=exited):
+        pool.reap()
+    kernels[0].join()
+
+    assert pool.handed_out == [2]
+
+
+def test_client_starts_the_pool_when_none_runs():
+    cfg = ClientConfig(Mock())
+    cfg.default_config["client_pool_size"] = "2"
+    client = MariaDBClient(Mock(), cfg)
+
+    with patch.object(client_pool, "checkout", side_effect=OSError), patch.object(
+        client_pool, "start_daemon"
+    ) as start_daemon, patch("mariadb_kernel.mariadb_client.MariaREPL") as repl:
+        client._launch_client(pooled=True)
+
+    start_daemon.assert_called_once_with(client.cmd, 2, 3600.0)
+    # The kernel launched its own client meanwhile
+    assert repl.call_args[0][0] == client.cmd
+
+
+def test_client_takes_a_pooled_client():
+    cfg = ClientConfig(Mock())
+    cfg.default_config["client_pool_size"] = "1"
+    client = MariaDBClient(Mock(), cfg)
+    child = Mock()
+
+    with patch.object(client_pool, "checkout", return_value=child), patch(
+        "mariadb_kernel.mariadb_client.MariaREPL"
+    ) as repl:
+        client._launch_client(pooled=True)
+        # Relaunching after a crash doesn't use the pool
+        client._launch_client()
+
+    child.sendline.assert_called_once_with("")
+    assert repl.call_args_list[0][0][0] is child
+    assert repl.call_args_list[1][0][0] == client.cmd
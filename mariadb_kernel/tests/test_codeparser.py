@@ -2,7 +2,14 @@ import os
 import pytest
 from unittest.mock import patch, Mock
 
-from ..code_parser import CodeParser
+from ..code_parser import (
+    CodeParser,
+    delimiter_command,
+    is_read_only,
+    schema_change,
+    split_statements,
+    written_tables,
+)
 
 import pdb
 
@@ -66,3 +73,157 @@ def test_parser_get_sql():
     statements = parser.get_sql()
     assert len(statements) == 1
     assert statements[0] == sql
+
+
+def test_parser_splits_statements():
+    cell = """select ';' as a, "x;", `c;d` from t; -- a comment;
+    insert into t values ('it''s;', 'a\\';b');
+    /* ; */ select 3;"""
+    parser = CodeParser(Mock(), cell, ";")
+    statements = parser.get_sql()
+    assert statements == [
+        """select ';' as a, "x;", `c;d` from t;""",
+        """-- a comment;
+    insert into t values ('it''s;', 'a\\';b');""",
+        "/* ; */ select 3;",
+    ]
+
+    # Empty statements are skipped, trailing comments are fine
+    statements = list(split_statements("select 1;; ;select 2; -- end", ";"))
+    assert statements == ["select 1;", "select 2;"]
+
+
+def test_parser_splits_lazily():
+    statements = split_statements("select 1; select 2; select 3", ";")
+
+    assert next(statements) == "select 1;"
+    assert next(statements) == "select 2;"
+    # The error only shows up once the parser reaches the broken statement
+    with pytest.raises(ValueError):
+        next(statements)
+
+
+def test_parser_handles_delimiter_commands():
+    cell = """DELIMITER //
+CREATE PROCEDURE p() BEGIN select 1; END//
+DELIMITER ;
+call p();"""
+    parser = CodeParser(Mock(), cell, ";")
+    statements = parser.get_sql()
+    assert statements == [
+        "DELIMITER //",
+        "CREATE PROCEDURE p() BEGIN select 1; END//",
+        "DELIMITER ;",
+        "call p();",
+    ]
+    assert delimiter_command(statements[0]) == "//"
+    assert delimiter_command(statements[1]) is None
+
+    # The cell doesn't end with the last delimiter
+    parser = CodeParser(Mock(), "DELIMITER //\nselect 1;", ";")
+    with pytest.raises(ValueError) as e:
+        parser.get_sql()
+    assert "Your SQL code doesn't end with delimiter `//`" in str(e.value)
+
+
+def test_parser_keeps_compound_statements_together():
+    procedure = """CREATE PROCEDURE p()
+BEGIN
+  DECLARE x INT;
+  IF x THEN select 1; END IF;
+  CASE x WHEN 1 THEN select 2; END CASE;
+  SET x = CASE WHEN 1 THEN 2 END;
+  BEGIN select 3; END;
+END;"""
+    statements = list(split_statements(procedure + "\nselect 4;", ";"))
+    assert statements == [procedure, "select 4;"]
+
+    trigger = (
+        "CREATE DEFINER=`root`@`localhost` TRIGGER tr BEFORE INSERT ON t "
+        "FOR EACH ROW BEGIN SET NEW.a = 1; END;"
+    )
+    statements = list(split_statements(trigger + "select 5;", ";"))
+    assert statements == [trigger, "select 5;"]
+
+    function = (
+        "create or replace definer=CURRENT_USER aggregate function f(x int) "
+        "returns int begin declare s int; return s; end;"
+    )
+    statements = list(split_statements(function + "select 6;", ";"))
+    assert statements == [function, "select 6;"]
+
+    # Only the type of the created object makes a compound statement
+    cell = "CREATE TABLE t (event INT, begin INT); select 1; select 2;"
+    statements = list(split_statements(cell, ";"))
+    assert statements == [
+        "CREATE TABLE t (event INT, begin INT);",
+        "select 1;",
+        "select 2;",
+    ]
+
+    # BEGIN alone starts a transaction, it isn't a block
+    cell = "BEGIN NOT ATOMIC select 1; select 2; END;\nbegin;\nselect 5;"
+    statements = list(split_statements(cell, ";"))
+    assert statements == [
+        "BEGIN NOT ATOMIC select 1; select 2; END;",
+        "begin;",
+        "select 5;",
+    ]
+
+
+def test_is_read_only():
+    assert is_read_only("select * from t;")
+    assert is_read_only("/* comment */ SHOW TABLES;")
+    assert is_read_only("with x as (select 1) select * from x;")
+    assert is_read_only("describe t;")
+    assert not is_read_only("select 1 into @a;")
+    assert not is_read_only("select * from t into outfile '/tmp/t';")
+    assert not is_read_only("insert into t values (1);")
+    assert not is_read_only("-- select\ndelete from t;")
+    assert not is_read_only("")
+    assert is_read_only("with recursive x (n) as (select 1) select n from x;")
+    assert is_read_only("with x as (select ')update') select * from x;")
+    assert not is_read_only("with x as (select 1) update t set a = 1;")
+    assert not is_read_only(
+        "WITH x AS (SELECT a FROM u), y AS (SELECT 2) DELETE FROM t;"
+    )
+
+
+def test_schema_change():
+    assert schema_change("create table t (a int);") == ("TABLE", "t")
+    assert schema_change("CREATE OR REPLACE TABLE `my db`.t (a int);") == (
+        "TABLE",
+        "`my db`.t",
+    )
+    assert schema_change("drop table if exists db.t;") == ("TABLE", "db.t")
+    assert schema_change("create database if not exists d;") == ("DATABASE", "d")
+    assert schema_change(
+        "CREATE DEFINER=`root`@`localhost` PROCEDURE p() select 1;"
+    ) == ("PROCEDURE", "p")
+    assert schema_change("/* x */ alter online table t add c int;") == ("TABLE", "t")
+    assert schema_change("select * from t;") is None
+
+
+def test_written_tables():
+    assert written_tables("insert into t values (1);") == ["t"]
+    assert written_tables("INSERT IGNORE db.t (a) select 1;") == ["db.t"]
+    assert written_tables("update `my t` set a = 1;") == ["`my t`"]
+    assert written_tables("delete from t where a = 1;") == ["t"]
+    assert written_tables("truncate table t;") == ["t"]
+    assert written_tables("load data local infile 'f' into table t;") == ["t"]
+    assert written_tables("alter table t add b int;") == ["t"]
+    assert written_tables("select * from t;") == []
+    assert written_tables("set @a = 1;") == []
+    # Can't be told
+    assert written_tables("update t, u set t.a = u.a;") is None
+    assert written_tables("delete t from t join u;") is None
+    assert written_tables("call p();") is None
+    assert written_tables("rollback;") is None
+    assert written_tables("drop database d;") is None
+    assert written_tables("begin;") == []
+    assert written_tables("begin not atomic insert into t values (1); end") is None
+    assert written_tables("drop table a, b;") is None
+    assert written_tables("rename table a to b;") is None
+    assert written_tables("alter table a rename to b;") is None
+    assert written_tables("alter table a exchange partition p with table b;") is None
+    assert written_tables("with x as (select 1) update t set a = 1;") is None
@@ -0,0 +1,140 @@
+import datetime
+import gzip
+import io
+
+import pytest
+
+from ..data_sources import (
+    CSVSource,
+    JSONLinesSource,
+    RowSource,
+    create_table_statement,
+    detect,
+    infer_column_type,
+    open_source,
+    stream_chunks,
+)
+
+CSV_OPTIONS = {
+    "delimiter": ",",
+    "enclosure": '"',
+    "escape": None,
+    "lines": "\n",
+    "encoding": None,
+    "skip": 1,
+}
+
+
+def test_detect_tells_the_format_and_compression_from_the_name():
+    assert detect("/data/a.csv") == ("csv", None)
+    assert detect("/data/a.tsv.gz") == ("csv", "gzip")
+    assert detect("/data/a.JSONL.zst") == ("jsonl", "zstd")
+    assert detect("/data/a.ndjson") == ("jsonl", None)
+    assert detect("/data/a.parquet") == ("parquet", None)
+
+
+def test_stream_chunks_end_at_line_ends_outside_enclosures():
+    data = b'1,"a\nb"\n2,"c\\"\nd"\n3,e\n'
+
+    assert list(stream_chunks(io.BytesIO(data), 100, b"\n")) == [data]
+    # The first line ending is inside the enclosed field
+    assert list(stream_chunks(io.BytesIO(data), 4, b"\n", b'"', b"\\")) == [
+        data[:8],
+        data[8:18],
+        data[18:],
+    ]
+    assert list(stream_chunks(io.BytesIO(data), 4, b"\n")) == [
+        data[:5],
+        data[5:15],
+        data[15:],
+    ]
+
+
+def test_compressed_csv_is_decompressed_in_chunks(tmp_path):
+    path = tmp_path / "a.csv.gz"
+    with gzip.open(path, "wb") as f:
+        f.write(b"x,y\n" + b"1,2\n" * 1000)
+
+    source = open_source(str(path), None, CSV_OPTIONS)
+
+    assert source.size() is None
+    chunks = list(source.chunks(1000))
+    assert [len(chunk) for chunk in chunks] == [1004, 1004, 1004, 992]
+    assert b"".join(chunks) == b"x,y\n" + b"1,2\n" * 1000
+
+
+def test_infer_column_type():
+    assert infer_column_type(["1", "-2", None, ""]) == "BIGINT"
+    assert infer_column_type(["1", "2.5", "1e3"]) == "DOUBLE"
+    assert infer_column_type([True, 3]) == "BIGINT"
+    assert infer_column_type(["2024-01-02", "2024-01-02 10:00:00"]) == "DATETIME"
+    assert infer_column_type([datetime.date(2024, 1, 2)]) == "DATE"
+    assert infer_column_type(["1", "2024-01-02"]) == "VARCHAR(255)"
+    assert infer_column_type(["x" * 101]) == "TEXT"
+    assert infer_column_type([{"a": 1}]) == "JSON"
+    assert infer_column_type([None]) == "VARCHAR(255)"
+
+
+def test_csv_sample_names_the_columns_after_the_header(tmp_path):
+    path = tmp_path / "a.csv"
+    path.write_text('id,"full name",born\n1,"Doe, John",1990-01-01\n2,Ann,\n')
+    source = CSVSource(str(path), None, CSV_OPTIONS)
+
+    columns, rows = source.sample(10)
+
+    assert columns == ["id", "full name", "born"]
+    assert rows == [["1", "Doe, John", "1990-01-01"], ["2", "Ann", ""]]
+    assert create_table_statement("t", columns, rows) == (
+        "CREATE TABLE IF NOT EXISTS t (\n"
+        "  `id` BIGINT,\n"
+        "  `full name` VARCHAR(255),\n"
+        "  `born` DATE\n"
+        ")"
+    )
+
+    source = CSVSource(str(path), None, dict(CSV_OPTIONS, skip=0))
+    assert source.sample(1) == (["col1", "col2", "col3"], [["id", "full name", "born"]])
+
+
+def test_json_lines_are_converted_to_csv(tmp_path):
+    path = tmp_path / "a.jsonl"
+    path.write_text(
+        '{"a": 1, "b": "say \\"hi\\"\\\\"}\n'
+        "\n"
+        '{"b": null, "c": [1, 2], "a": true}\n'
+    )
+    source = JSONLinesSource(str(path), None)
+
+    assert source.columns() == ["a", "b", "c"]
+    assert b"".join(source.chunks(1 << 20)) == (
+        b'1,"say ""hi""\\",NULL\n' b'1,NULL,"[1, 2]"\n'
+    )
+
+
+def test_invalid_json_lines_are_reported(tmp_path):
+    path = tmp_path / "a.jsonl"
+    path.write_text('{"a": 1}\n[1]\n')
+
+    with pytest.raises(ValueError, match="Line 2 is not a JSON object"):
+        JSONLinesSource(str(path), None).columns()
+
+
+def test_row_sources_must_read_columns_and_rows():
+    class NoRows(RowSource):
+        def columns(self):
+            return ["a"]
+
+    with pytest.raises(TypeError):
+        NoRows()
+
+
+def test_parquet_files_are_converted_to_csv(tmp_path):
+    pytest.importorskip("pyarrow")
+    from pandas import DataFrame
+
+    path = tmp_path / "a.parquet"
+    DataFrame({"a": [1, 2], "b": ["x", None]}).to_parquet(path)
+    source = open_source(str(path), None, CSV_OPTIONS)
+
+    assert source.columns() == ["a", "b"]
+    assert b"".join(source.chunks(1 << 20)) == b'1,"x"\n2,NULL\n'
@@ -0,0 +1,64 @@
+from ..html_renderer import HTMLRenderer, STYLE, TABLE_CLASS
+from ..result_set import ResultSet
+
+
+def test_renderer_styles_through_a_class():
+    rs = ResultSet(["a", "b"])
+    rs.append_row(["1", None])
+
+    html = HTMLRenderer().render(rs)
+
+    assert html == (
+        STYLE + f'<table class="{TABLE_CLASS}">'
+        "<tr><th>a</th><th>b</th></tr>"
+        "<tr><td>1</td><td>NULL</td></tr>"
+        "</table>"
+    )
+    # No per-cell styling
+    assert "style=" not in html
+
+
+def test_renderer_escapes_values():
+    rs = ResultSet.from_rows(["<a>"], ["VAR_STRING"], [("x & <y>",)])
+
+    html = HTMLRenderer().render(rs)
+
+    assert "<th>&lt;a&gt;</th>" in html
+    assert "<td>x &amp; &lt;y&gt;</td>" in html
+
+
+def test_renderer_shows_head_and_tail_of_large_results():
+    rs = ResultSet(["n"])
+    for i in range(100):
+        rs.append_row([str(i)])
+
+    html = HTMLRenderer().render(rs, max_rows=5)
+
+    # The first 3 and last 2 rows, with an ellipsis row in between
+    for i in (0, 1, 2, 98, 99):
+        assert f"<td>{i}</td>" in html
+    assert "<td>3</td>" not in html and "<td>97</td>" not in html
+    assert html.count("<tr>") == 3 + 1 + 2 + 1
+    assert "100 rows in set" in html
+
+    # No limit
+    assert HTMLRenderer().render(rs, max_rows=0).count("<td>") == 100
+
+
+def test_renderer_tells_which_rows_were_kept():
+    rs = ResultSet(["n"])
+    rs.keep_at_most(20, 5)
+    for i in range(100):
+        rs.append_row([str(i)])
+
+    html = HTMLRenderer().render(rs, max_rows=6, elapsed=1)
+    for i in (0, 1, 2, 97, 98, 99):
+        assert f"<td>{i}</td>" in html
+    assert "<td>3</td>" not in html and "<td>96</td>" not in html
+    assert "100 rows in set (1.000 sec), showing the first 3 and the last 3" in html
+    assert "Only the first 15 and the last" in html
+
+    # Every kept row, with an ellipsis row where rows were skipped
+    html = HTMLRenderer().render(rs, max_rows=0)
+    assert html.count("<td>...</td>") == 1
+    assert "<td>14</td>" in html and "<td>15</td>" not in html
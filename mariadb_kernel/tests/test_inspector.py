@@ -0,0 +1,97 @@
+from unittest.mock import Mock
+
+from ..cache import LRUCache
+from ..inspector import Inspector, identifier_at
+from ..schema_index import SchemaIndex
+
+
+def _query(sql):
+    if "information_schema.SCHEMATA" in sql:
+        return [("shop",)]
+    if "information_schema.TABLES" in sql and "TABLE_TYPE" not in sql:
+        return [("orders",), ("customers",)]
+    if "information_schema.TABLES" in sql:
+        if "'orders'" not in sql:
+            return []
+        return [("orders", "BASE TABLE", "InnoDB", "1200", "Customer orders")]
+    if "information_schema.COLUMNS" in sql:
+        return [
+            ("id", "int(11)", "NO", "PRI", None, "auto_increment", ""),
+            ("customer_id", "int(11)", "YES", "MUL", None, "", "Who ordered"),
+            ("status", "varchar(10)", "NO", "", "'new'", "", ""),
+        ]
+    if "information_schema.STATISTICS" in sql:
+        return [("PRIMARY", "0", "id"), ("customer", "1", "customer_id")]
+    if sql.startswith("SHOW CREATE TABLE"):
+        return [("orders", "CREATE TABLE `orders` (...)")]
+    return None
+
+
+def _inspector():
+    query = Mock(side_effect=_query)
+    index = SchemaIndex(Mock(), query)
+    return Inspector(index, query, LRUCache(10, 300)), query
+
+
+def _inspect(inspector, code, marker, database="shop"):
+    return inspector.inspect(code, code.index(marker) + 1, database)
+
+
+def test_identifier_at():
+    code = "select o.id from `my db`.orders o"
+    assert identifier_at(code, code.index("id") + 1) == "o.id"
+    assert identifier_at(code, code.index("orders")) == "`my db`.orders"
+    assert identifier_at(code, code.index("my") + 1) == "`my db`.orders"
+    assert identifier_at(code, len(code)) == "o"
+    assert identifier_at("select 1", 6) == "select"
+    assert identifier_at("a + b", 2) == ""
+
+
+def test_inspect_table():
+    inspector, _ = _inspector()
+    reply = _inspect(inspector, "select * from orders;", "orders")
+
+    assert reply["found"]
+    text = reply["data"]["text/plain"]
+    assert text.startswith("Table shop.orders (InnoDB, ~1200 rows)\nCustomer orders")
+    assert "  customer_id  int(11) NULL MUL -- Who ordered" in text
+    assert "  status       varchar(10) NOT NULL DEFAULT 'new'" in text
+    assert "  PRIMARY   UNIQUE (id)" in text
+    assert "  customer  (customer_id)" in text
+    assert text.endswith("CREATE TABLE `orders` (...)")
+
+
+def test_inspect_columns():
+    inspector, _ = _inspector()
+    code = "select o.customer_id, status from orders o where shop.orders.id = 1"
+
+    reply = _inspect(inspector, code, "customer_id")
+    assert reply["data"]["text/plain"] == (
+        "Column shop.orders.customer_id\nint(11) NULL MUL -- Who ordered"
+    )
+    reply = _inspect(inspector, code, "status")
+    assert reply["data"]["text/plain"].startswith("Column shop.orders.status")
+    reply = _inspect(inspector, code, ".id")
+    assert reply["data"]["text/plain"].startswith("Column shop.orders.id")
+
+
+def test_inspect_unknown_identifiers():
+    inspector, _ = _inspector()
+    assert not _inspect(inspector, "select * from nothing;", "nothing")["found"]
+    assert not _inspect(inspector, "select nope from orders;", "nope")["found"]
+    assert not inspector.inspect("select 1 + 2", 9, "shop")["found"]
+
+
+def test_inspect_caches_metadata_until_ddl():
+    inspector, query = _inspector()
+    _inspect(inspector, "select * from orders;", "orders")
+    _inspect(inspector, "select id from orders;", "id")
+    calls = query.call_count
+
+    _inspect(inspector, "select * from orders;", "orders")
+    _inspect(inspector, "select id from orders;", "id")
+    assert query.call_count == calls
+
+    inspector.invalidate("alter table orders add c int;", "shop")
+    _inspect(inspector, "select * from orders;", "orders")
+    assert query.call_count > calls
@@ -64,3 +64,94 @@ def test_line_magic_generate_plot_sends_display_data():
     lm.generate_plot(mockkernel, data, "line")
 
     mockkernel.send_response.assert_called_once_with(ANY, "display_data", ANY)
+
+
+def test_line_magic_generate_plot_uses_a_stored_result():
+    mockkernel = Mock()
+    mockkernel.result_store.get.return_value = DataFrame([1, 1])
+    lm = LineMagic()
+    lm.args = "result=12"
+
+    data = {"last_select": DataFrame()}
+    lm.generate_plot(mockkernel, data, "line")
+
+    mockkernel.result_store.get.assert_called_once_with(12)
+    mockkernel.send_response.assert_called_once_with(ANY, "display_data", ANY)
+
+
+def test_line_magic_pops_only_whole_options():
+    lm = LineMagic()
+
+    args = 'query="select * from t where result=3" x=a result=2'
+    assert lm.pop_option(args, "result") == (
+        "2",
+        'query="select * from t where result=3" x=a',
+    )
+    assert lm.pop_option('query="select result=3" x=a', "result") == (
+        None,
+        'query="select result=3" x=a',
+    )
+    assert lm.pop_option("a.csv format='tab separated'", "format") == (
+        "tab separated",
+        "a.csv",
+    )
+    assert lm.pop_option("color=#f00", "color") == ("#f00", "")
+    # Left for the parsing of the arguments to report
+    assert lm.pop_option('query="select result=1', "result") == (
+        None,
+        'query="select result=1',
+    )
+
+
+def test_line_magic_generate_plot_sends_svg():
+    mockkernel = Mock()
+    lm = LineMagic()
+    lm.args = "format=svg"
+
+    data = {"last_select": DataFrame([1, 1])}
+    lm.generate_plot(mockkernel, data, "bar")
+
+    content = mockkernel.send_response.call_args[0][2]
+    assert list(content["data"]) == ["image/svg+xml"]
+    assert content["data"]["image/svg+xml"].lstrip().startswith("<?xml")
+
+
+def test_line_magic_generate_plot_rejects_unknown_image_formats():
+    mockkernel = Mock()
+    lm = LineMagic()
+    lm.args = "format=jpg"
+
+    data = {"last_select": DataFrame([1, 1])}
+    lm.generate_plot(mockkernel, data, "line")
+
+    mockkernel._send_message.assert_called_once_with(
+        "stderr", "Unknown plot format jpg, use png, svg, vegalite"
+    )
+    mockkernel.send_response.assert_not_called()
+
+
+def test_line_magic_generate_plot_leaves_no_global_figures():
+    from matplotlib import pyplot
+
+    mockkernel = Mock()
+    lm = LineMagic()
+
+    data = {"last_select": DataFrame([1, 1])}
+    lm.generate_plot(mockkernel, data, "line")
+
+    assert pyplot.get_fignums() == []
+
+
+def test_line_magic_generate_plot_sends_a_vega_lite_spec():
+    mockkernel = Mock()
+    lm = LineMagic()
+    lm.args = "x=day y=total format=vegalite"
+
+    data = {"last_select": DataFrame({"day": ["2024-01-01"], "total": [3]})}
+    lm.generate_plot(mockkernel, data, "line")
+
+    content = mockkernel.send_response.call_args[0][2]
+    spec = content["data"]["application/vnd.vegalite.v5+json"]
+    assert spec["data"]["values"] == "day,total\n2024-01-01,3\n"
+    assert spec["encoding"]["x"] == {"field": "day", "type": "temporal"}
+    assert "image/png" not in content["data"]
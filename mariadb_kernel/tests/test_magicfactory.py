@@ -1,3 +1,5 @@
+import subprocess
+import sys
 from unittest.mock import Mock
 
 from ..maria_magics import *
@@ -23,3 +25,19 @@ def test_error_magic_sends_error_to_kernel():
     mockkernel._send_message.assert_called_once_with(
         "stderr", f"The %{name} magic command does not exist"
     )
+
+
+def test_magics_are_imported_when_they_are_used():
+    code = (
+        "import sys\n"
+        "from mariadb_kernel.maria_magics.magic_factory import MagicFactory\n"
+        "import mariadb_kernel.kernel\n"
+        "heavy = ('pandas', 'matplotlib', 'json2html', 'mariadb_kernel.maria_magics.bar')\n"
+        "print(*[m for m in heavy if m in sys.modules])\n"
+        "MagicFactory(None).create_magic('bar', '')\n"
+        "print('mariadb_kernel.maria_magics.bar' in sys.modules)\n"
+    )
+    out = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    )
+    assert out.stdout.splitlines() == ["", "True"]
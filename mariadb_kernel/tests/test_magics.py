@@ -0,0 +1,187 @@
+import asyncio
+import gzip
+from unittest.mock import Mock, ANY
+from pandas import DataFrame
+
+from ..html_renderer import HTMLRenderer
+from ..result_set import ResultSet
+from ..maria_magics.page import Page
+from ..maria_magics.cache import Cache
+from ..maria_magics.store import Store
+from ..maria_magics.df import DF
+from ..maria_magics.load import Load
+from ..result_store import ResultStore
+from ..result_cache import ResultCache
+
+
+def _kernel_with_result(num_rows, display_max_rows=10):
+    mockkernel = Mock()
+    mockkernel.renderer = HTMLRenderer()
+    mockkernel.client_config.display_max_rows.return_value = display_max_rows
+    rs = ResultSet(["n"])
+    for i in range(num_rows):
+        rs.append_row([str(i)])
+    return mockkernel, {"last_result": rs}
+
+
+def test_page_magic_displays_the_requested_page():
+    mockkernel, data = _kernel_with_result(25)
+
+    Page("3").execute(mockkernel, data)
+
+    mockkernel.send_response.assert_called_once_with(ANY, "display_data", ANY)
+    html = mockkernel.send_response.call_args[0][2]["data"]["text/html"]
+    assert "<td>20</td>" in html and "<td>24</td>" in html
+    assert "<td>19</td>" not in html
+    assert "Page 3 of 3 (rows 21-25 of 25)" in html
+
+
+def test_page_magic_custom_page_size():
+    mockkernel, data = _kernel_with_result(25)
+
+    Page("2 5").execute(mockkernel, data)
+
+    html = mockkernel.send_response.call_args[0][2]["data"]["text/html"]
+    assert "Page 2 of 5 (rows 6-10 of 25)" in html
+
+
+def test_page_magic_reports_errors():
+    mockkernel, data = _kernel_with_result(25)
+
+    Page("4").execute(mockkernel, data)
+    mockkernel._send_message.assert_called_once_with("stderr", "Page 4 does not exist")
+
+    mockkernel, data = _kernel_with_result(25)
+    Page("first").execute(mockkernel, data)
+    mockkernel._send_message.assert_called_once_with("stderr", ANY)
+
+    mockkernel = Mock()
+    Page("").execute(mockkernel, {"last_result": None})
+    mockkernel._send_message.assert_called_once_with("stderr", ANY)
+
+
+def _kernel_with_cache():
+    mockkernel = Mock()
+    mockkernel.renderer = HTMLRenderer()
+    mockkernel.result_cache = ResultCache(10, 1000)
+    mockkernel.result_cache_enabled = True
+    rs = ResultSet(["n"])
+    rs.append_row([1])
+    mockkernel.result_cache.put("select n from t;", "db", ";", [rs])
+    return mockkernel
+
+
+def test_cache_magic_lists_the_cached_results():
+    mockkernel = _kernel_with_cache()
+
+    Cache("").execute(mockkernel, {})
+
+    html = mockkernel.send_response.call_args[0][2]["data"]["text/html"]
+    assert "The result cache is enabled, it holds 1 results (1 cells)" in html
+    assert "<td>select n from t</td><td>db</td><td>1</td>" in html
+
+
+def test_cache_magic_clears_and_toggles_the_cache():
+    mockkernel = _kernel_with_cache()
+    Cache("clear").execute(mockkernel, {})
+    assert mockkernel.result_cache.entries() == []
+
+    Cache("off").execute(mockkernel, {})
+    assert mockkernel.result_cache_enabled is False
+    Cache("on").execute(mockkernel, {})
+    assert mockkernel.result_cache_enabled is True
+
+    Cache("flush").execute(mockkernel, {})
+    mockkernel._send_message.assert_called_with("stderr", ANY)
+
+
+def _kernel_with_store():
+    mockkernel = Mock()
+    mockkernel.renderer = HTMLRenderer()
+    mockkernel.result_store = ResultStore(Mock(), 1 << 20, False)
+    mockkernel.result_store.add(3, DataFrame({"n": [1, 2]}))
+    mockkernel.result_store.add(5, DataFrame({"n": [3]}))
+    return mockkernel
+
+
+def test_store_magic_names_results():
+    mockkernel = _kernel_with_store()
+
+    Store("latest").execute(mockkernel, {})
+    Store("older 3").execute(mockkernel, {})
+    Store("lost 4").execute(mockkernel, {})
+
+    assert list(mockkernel.result_store.get("latest")["n"]) == [3]
+    assert list(mockkernel.result_store.get("older")["n"]) == [1, 2]
+    mockkernel._send_message.assert_called_with(
+        "stderr", "There is no stored result for cell 4"
+    )
+
+    Store("-d older").execute(mockkernel, {})
+    assert mockkernel.result_store.get("older") is None
+
+
+def test_store_magic_rejects_invalid_names():
+    mockkernel = _kernel_with_store()
+    for args in ("12", "a-b", "a 3 4", "-d"):
+        mockkernel.reset_mock()
+        Store(args).execute(mockkernel, {})
+        mockkernel._send_message.assert_called_once_with("stderr", ANY)
+
+
+def test_store_magic_lists_the_results():
+    mockkernel = _kernel_with_store()
+    mockkernel.result_store.name("older", 3)
+
+    Store("").execute(mockkernel, {})
+
+    html = mockkernel.send_response.call_args[0][2]["data"]["text/html"]
+    assert "<td>5</td><td></td><td>1</td><td>1</td>" in html
+    assert "<td>3</td><td>older</td><td>2</td><td>1</td>" in html
+
+
+def test_df_magic_writes_a_stored_result(tmp_path):
+    mockkernel = _kernel_with_store()
+    mockkernel.result_store.name("older", 3)
+    path = tmp_path / "older.csv"
+
+    DF(f"{path} result=older").execute(mockkernel, {"last_select": DataFrame()})
+
+    assert path.read_text() == "n\n1\n2\n"
+
+    mockkernel.reset_mock()
+    DF("result=7").execute(mockkernel, {"last_select": DataFrame()})
+    mockkernel._send_message.assert_called_once_with(
+        "stderr", "There is no stored result 7"
+    )
+
+
+def test_load_magic_rejects_invalid_arguments():
+    for args in (
+        "",
+        "f.csv",
+        "f.csv t x",
+        "f.csv t colour=red",
+        "f.csv t workers=0",
+        "f.csv t format=xml",
+        "f.csv t create=maybe",
+    ):
+        mockkernel = Mock()
+        asyncio.run(Load(args).execute(mockkernel, {}))
+        mockkernel._send_message.assert_called_once_with("stderr", ANY)
+
+
+def test_df_magic_writes_compressed_csv(tmp_path):
+    mockkernel = Mock()
+    path = tmp_path / "out.csv.gz"
+
+    DF(str(path)).execute(mockkernel, {"last_select": DataFrame({"n": [1, 2]})})
+
+    with gzip.open(path, "rt") as f:
+        assert f.read() == "n\n1\n2\n"
+
+
+def test_df_magic_rejects_invalid_options():
+    mockkernel = Mock()
+    DF("out.csv stream=maybe").execute(mockkernel, {})
+    mockkernel._send_message.assert_called_once_with("stderr", ANY)
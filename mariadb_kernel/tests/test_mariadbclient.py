@@ -1,11 +1,21 @@
+import os
 import pytest
+import re
+import threading
 from subprocess import check_output
-from unittest.mock import patch, Mock
+from unittest.mock import patch, Mock, MagicMock
+from pexpect import EOF, TIMEOUT
 
 from ..mariadb_client import (
+    MariaREPL,
+    StatementFile,
     MariaDBClient,
+    NativeMariaDBClient,
+    RECONNECT_DELAYS,
+    TIMEOUT_KILLED_MSG,
     ServerIsDownError,
     LoginError,
+    create_client,
 )
 from ..client_config import ClientConfig
 
@@ -15,6 +25,7 @@ def test_mariadb_client_logs_error_when_clienbin_invalid():
     mockconfig = Mock()
     client_bin = "invalid_mysql"
     mockconfig.client_bin.return_value = client_bin
+    mockconfig.client_pool_size.return_value = 0
 
     client = MariaDBClient(mocklog, mockconfig)
     client.start()
@@ -31,6 +42,7 @@ def test_mariadb_client_raises_when_server_is_down():
     # Give the client a wrong port, simulate that MariaDB Server is down
     mockconfig.client_bin.return_value = "mysql"
     mockconfig.get_args.return_value = "--port=0000"
+    mockconfig.client_pool_size.return_value = 0
 
     client = MariaDBClient(mocklog, mockconfig)
 
@@ -41,6 +53,18 @@ def test_mariadb_client_raises_when_server_is_down():
     mocklog.error.assert_any_call("Most probably the MariaDB server is not started")
 
 
+def test_mariadb_client_raises_when_the_server_does_not_answer():
+    client = MariaDBClient(Mock(), ClientConfig(Mock()))
+
+    # e.g. the host is unreachable, the client hangs while connecting
+    with patch.object(
+        client, "_launch_client", side_effect=TIMEOUT("no prompt")
+    ), pytest.raises(ServerIsDownError):
+        client.start()
+
+    assert not client.is_started()
+
+
 def test_mariadb_client_raises_when_credentials_are_wrong(mariadb_server):
     mocklog = Mock()
 
@@ -72,7 +96,11 @@ def test_mariadb_client_run_statement(mariadb_server):
 
     result = client.run_statement("select 1;")
 
-    assert result == "<TABLE BORDER=1><TR><TH>1</TH></TR><TR><TD>1</TD></TR></TABLE>"
+    assert (
+        str(result) == "<TABLE BORDER=1><TR><TH>1</TH></TR><TR><TD>1</TD></TR></TABLE>"
+    )
+    assert result.columns == ["1"]
+    assert result.values == [["1"]]
 
     result = client.run_statement("select a from not_a_table;")
 
@@ -102,12 +130,12 @@ def test_multi_line_output(mariadb_server):
     )
 
     # Debug info in case something changes in the output and test starts failing
-    print(repr(result))
+    print(repr(str(result)))
 
     # The expected output should contain a cell with the prettyfied JSON output
     expected = """<TABLE BORDER=1><TR><TH>json_detailed('[&quot;an array&quot;, &quot;of&quot;, &quot;json&quot;, {&quot;objects&quot;: [&quot;embedded&quot;, 1, 2, 3]}]')</TH></TR><TR><TD>[\r\n    &quot;an array&quot;,\r\n    &quot;of&quot;,\r\n    &quot;json&quot;,\r\n    \r\n    {\r\n        &quot;objects&quot;: \r\n        [\r\n            &quot;embedded&quot;,\r\n            1,\r\n            2,\r\n            3\r\n        ]\r\n    }\r\n]</TD></TR></TABLE>"""
 
-    assert result == expected
+    assert str(result) == expected
 
 
 def test_input_lines_longer_than_max_cannon(mariadb_server):
@@ -129,3 +157,335 @@ def test_input_lines_longer_than_max_cannon(mariadb_server):
 
     # Should not throw a TIMEOUT exception
     client.maria_repl.run_command(large_stmt, timeout=3)
+
+
+def test_create_client_picks_backend_from_config():
+    mocklog = Mock()
+    mockconfig = Mock()
+    mockconfig.client_bin.return_value = "mysql"
+    mockconfig.get_args.return_value = ""
+
+    mockconfig.client_backend.return_value = "pexpect"
+    assert type(create_client(mocklog, mockconfig)) == MariaDBClient
+
+    mockconfig.client_backend.return_value = "native"
+    assert type(create_client(mocklog, mockconfig)) == NativeMariaDBClient
+
+    # PyMySQL is not installed, the kernel should still get a working client
+    with patch.dict("sys.modules", {"pymysql": None}):
+        assert type(create_client(mocklog, mockconfig)) == MariaDBClient
+
+
+def test_native_client_raises_when_server_is_down():
+    mocklog = Mock()
+    mockconfig = Mock()
+    mockconfig.get_connection_args.return_value = {
+        "user": "root",
+        "password": "",
+        "host": "127.0.0.1",
+        "port": 1,
+    }
+
+    client = NativeMariaDBClient(mocklog, mockconfig)
+
+    with pytest.raises(ServerIsDownError):
+        client.start()
+
+    mocklog.error.assert_any_call("MariaDB client failed to start")
+    mocklog.error.assert_any_call("Most probably the MariaDB server is not started")
+
+
+def test_native_client_run_statement(mariadb_server):
+    mocklog = Mock()
+    cfg = ClientConfig(mocklog, name="nonexistentcfg.json")  # default config
+    mariadb_server(mocklog, cfg)
+
+    client = NativeMariaDBClient(mocklog, cfg)
+
+    client.start()
+
+    result = client.run_statement("select 1;")
+
+    assert (
+        str(result) == "<TABLE BORDER=1><TR><TH>1</TH></TR><TR><TD>1</TD></TR></TABLE>"
+    )
+    assert result.types == ["LONGLONG"]
+    assert result.values == [[1]]
+
+    result = client.run_statement("select a from not_a_table;")
+
+    assert result.startswith("No database")
+    assert client.iserror()
+
+    client.run_statement("create database if not exists test;")
+    result = client.run_statement("use test;")
+    assert result == "Query OK"
+
+
+def test_repl_streams_output_until_the_prompt():
+    # The prompt arrives split across two reads
+    chunks = [
+        "<TABLE BORDER=1><TR><TH>a</TH></TR>",
+        "x" * 300,
+        "</TABLE>Mari",
+        "aDB [(none)]> ",
+    ]
+    repl = MariaREPL.__new__(MariaREPL)
+    repl.prompt = re.compile(r"MariaDB \[.*\]>[ \t]")
+    repl.child = Mock()
+    repl.child.timeout = 30
+    repl.child.read_nonblocking.side_effect = chunks
+
+    output = []
+    assert repl._stream_output(-1, output.append) is None
+
+    assert "".join(output) == "".join(chunks)[: -len("MariaDB [(none)]> ")]
+    # Output was handed over before the prompt showed up
+    assert len(output) > 1
+
+
+def test_statement_file_is_rewritten_in_place():
+    first = StatementFile()
+    second = StatementFile()
+    try:
+        # Two clients never share a statement file
+        assert first.path != second.path
+        assert first.path.endswith("mariadb_statement")
+
+        first.write("select 'a longer statement';")
+        first.write("select 1;")
+        second.write("select 2;")
+        with open(first.path) as f:
+            assert f.read() == "select 1;"
+        with open(second.path) as f:
+            assert f.read() == "select 2;"
+    finally:
+        first.remove()
+        second.remove()
+
+    assert not os.path.exists(first.dir)
+    # Removing twice is harmless
+    first.remove()
+
+
+def test_mariadb_client_kills_query_through_a_side_client():
+    cfg = ClientConfig(Mock())
+    client = MariaDBClient(Mock(), cfg)
+    assert client.kill_query() is False
+
+    client.connection_id = 42
+    with patch("mariadb_kernel.mariadb_client.pexpect.run") as run:
+        run.return_value = (b"", 0)
+        assert client.kill_query() is True
+        cmd = run.call_args[0][0]
+        assert cmd.startswith(cfg.client_bin())
+        assert cmd.endswith('-e "KILL QUERY 42"')
+
+        run.return_value = (b"ERROR 2002 (HY000): Can't connect", 1)
+        assert client.kill_query() is False
+
+
+def test_native_client_kills_query_through_a_side_connection():
+    pymysql = pytest.importorskip("pymysql")
+    client = NativeMariaDBClient(Mock(), ClientConfig(Mock()))
+    client.connection_id = 42
+    with patch.object(pymysql, "connect") as connect:
+        assert client.kill_query() is True
+        cursor = connect.return_value.cursor.return_value.__enter__.return_value
+        cursor.execute.assert_called_once_with("KILL QUERY 42")
+        connect.return_value.close.assert_called_once_with()
+
+        connect.side_effect = pymysql.err.OperationalError(2003, "Can't connect")
+        assert client.kill_query() is False
+
+
+def test_native_client_kills_statements_running_past_the_timeout():
+    pymysql = pytest.importorskip("pymysql")
+    client = NativeMariaDBClient(Mock(), ClientConfig(Mock()))
+    client.conn = MagicMock()
+    cursor = client.conn.cursor.return_value.__enter__.return_value
+    cursor.description = None
+    cursor.nextset.return_value = None
+    cursor.warning_count = 0
+    cursor.rowcount = 0
+    killed = threading.Event()
+
+    def execute(statement):
+        if statement.startswith("select sleep") and not killed.wait(5):
+            raise AssertionError("The statement was not killed")
+        if killed.is_set():
+            raise pymysql.err.OperationalError(1317, "Query execution was interrupted")
+
+    cursor.execute.side_effect = execute
+    with patch.object(client, "kill_query", side_effect=killed.set) as kill_query:
+        assert client.run_statement("select 1;", timeout=5) == "Query OK"
+        assert not client.iserror()
+
+        assert client.run_statement("select sleep(10);", timeout=0.1) == (
+            TIMEOUT_KILLED_MSG
+        )
+        assert client.iserror()
+        kill_query.assert_called_once_with()
+
+        # No limit
+        killed.clear()
+        cursor.execute.side_effect = None
+        client.run_statement("select 2;")
+        assert not client.iserror()
+    kill_query.assert_called_once_with()
+
+
+def _repl(outputs):
+    repl = Mock()
+    repl.run_command.side_effect = outputs
+    return repl
+
+
+def test_mariadb_client_relaunches_and_restores_the_session():
+    client = MariaDBClient(Mock(), ClientConfig(Mock()))
+    client.session.record("use test;")
+    client.session.record("set @a = 1;")
+    client.session.record("delimiter $$")
+    crashed = _repl([EOF("client died")])
+    client.maria_repl = crashed
+
+    table = "<TABLE BORDER=1><TR><TH>a</TH></TR><TR><TD>1</TD></TR></TABLE>"
+    id_table = "<TABLE BORDER=1><TR><TH>id</TH></TR><TR><TD>7</TD></TR></TABLE>"
+    relaunched = _repl([id_table, "", "", "", table])
+    launches = [EOF("server still down"), relaunched]
+
+    def launch():
+        result = launches.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        client.maria_repl = result
+
+    with patch.object(client, "_launch_client", side_effect=launch), patch(
+        "mariadb_kernel.mariadb_client.time.sleep"
+    ) as sleep:
+        result = client.run_statement("select a from t$$")
+
+    assert not client.iserror()
+    assert result.values == [["1"]]
+    assert client.connection_id == 7
+    crashed.child.close.assert_called_once_with(force=True)
+    assert [c[0][0] for c in relaunched.run_command.call_args_list] == [
+        "select connection_id();",
+        "USE test;",
+        "set @a = 1;",
+        "delimiter $$",
+        "select a from t$$",
+    ]
+    # Backed off before each attempt
+    assert sleep.call_count == 2
+
+
+def test_mariadb_client_does_not_rerun_writes_after_recovery():
+    client = MariaDBClient(Mock(), ClientConfig(Mock()))
+    client.maria_repl = _repl(
+        ["ERROR 2006 (HY000) at line 1 in file: 'x': MySQL server has gone away"]
+    )
+
+    def launch():
+        client.maria_repl = _repl(["", ""])
+
+    with patch.object(client, "_launch_client", side_effect=launch), patch(
+        "mariadb_kernel.mariadb_client.time.sleep"
+    ):
+        client.run_statement("insert into t values (1);")
+
+    assert client.iserror()
+    assert "might have been executed" in client.error_message()
+    assert client.maria_repl.run_command.call_count == 1
+
+
+def test_mariadb_client_reports_failed_recovery():
+    client = MariaDBClient(Mock(), ClientConfig(Mock()))
+    client.maria_repl = _repl([EOF("client died")])
+
+    with patch.object(
+        client, "_launch_client", side_effect=EOF("server is down")
+    ) as launch, patch("mariadb_kernel.mariadb_client.time.sleep"):
+        client.run_statement("select 1;")
+
+    assert launch.call_count == len(RECONNECT_DELAYS)
+    assert client.iserror()
+    assert "reconnecting failed" in client.error_message()
+    assert client.maria_repl is None
+
+
+def test_native_client_reconnects_and_restores_the_session():
+    pymysql = pytest.importorskip("pymysql")
+    client = NativeMariaDBClient(Mock(), ClientConfig(Mock()))
+    client.session.record("use test;")
+    client.conn = MagicMock()
+    lost = client.conn.cursor.return_value.__enter__.return_value
+    lost.execute.side_effect = pymysql.err.OperationalError(2013, "Lost connection")
+
+    with patch.object(pymysql, "connect") as connect, patch(
+        "mariadb_kernel.mariadb_client.time.sleep"
+    ):
+        cursor = connect.return_value.cursor.return_value.__enter__.return_value
+        cursor.description = None
+        cursor.rowcount = 0
+        cursor.nextset.return_value = None
+        cursor.warning_count = 0
+        result = client.run_statement("select sleep(1);")
+
+    assert not client.iserror()
+    assert result == "Query OK"
+    assert [c[0][0] for c in cursor.execute.call_args_list] == [
+        "USE test;",
+        "select sleep(1);",
+    ]
+
+
+# Takes longer to run statements than the spawn timeout of the tests
+SLOW_CLIENT = """
+import sys, time
+while True:
+    sys.stdout.write("MariaDB [(none)]> ")
+    sys.stdout.flush()
+    line = sys.stdin.readline()
+    if not line:
+        break
+    if line.startswith("source "):
+        time.sleep(1.5)
+        print("done")
+"""
+
+
+def _slow_repl(tmp_path):
+    import pexpect
+    import sys
+
+    script = tmp_path / "slow_client.py"
+    script.write_text(SLOW_CLIENT)
+    child = pexpect.spawn(
+        f"{sys.executable} {script}", timeout=0.5, echo=False, encoding="utf-8"
+    )
+    return MariaREPL(
+        child,
+        orig_prompt=re.compile(r"MariaDB \[.*\]>[ \t]"),
+        prompt_change=None,
+        continuation_prompt=None,
+    )
+
+
+def test_mariadb_repl_waits_for_slow_statements(tmp_path):
+    from pexpect import TIMEOUT
+
+    repl = _slow_repl(tmp_path)
+    try:
+        # No limit by default, whatever the spawn timeout
+        assert repl.run_command("select sleep(1.5);").strip() == "done"
+
+        streamed = []
+        repl.run_command("select sleep(1.5);", on_output=streamed.append)
+        assert "".join(streamed).strip() == "done"
+
+        with pytest.raises(TIMEOUT):
+            repl.run_command("select sleep(1.5);", timeout=0.5)
+    finally:
+        repl.statement_file.remove()
+        repl.child.close(force=True)
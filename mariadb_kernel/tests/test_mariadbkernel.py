@@ -0,0 +1,800 @@
+import asyncio
+import gzip
+import logging
+import os
+import signal
+import threading
+import pytest
+from unittest.mock import call, patch, Mock, ANY
+
+from ..kernel import MariaDBKernel
+from ..result_set import ResultSet
+
+
+@pytest.fixture
+def kernel():
+    with patch("mariadb_kernel.kernel.create_client") as mock_create_client, patch(
+        "mariadb_kernel.kernel.ClientConfig"
+    ) as mock_config:
+        mock_config.return_value.display_max_rows.return_value = 200
+        mock_config.return_value.debug_logging.return_value = False
+        mock_config.return_value.stream_results.return_value = False
+        mock_config.return_value.stream_keep_rows.return_value = 0
+        mock_config.return_value.result_cache.return_value = False
+        mock_config.return_value.result_cache_max_entries.return_value = 64
+        mock_config.return_value.result_cache_max_cells.return_value = 1000
+        mock_config.return_value.result_store_max_bytes.return_value = 1 << 20
+        mock_config.return_value.result_store_spill.return_value = False
+        mock_config.return_value.startup_timeout.return_value = 5
+        mock_config.return_value.metadata_timeout.return_value = 5
+        mock_config.return_value.start_server.return_value = False
+        k = MariaDBKernel(log=logging.getLogger("test_kernel"))
+        k.startup.result(5)
+
+    k.send_response = Mock()
+    client = mock_create_client.return_value
+    client.iserror.return_value = False
+    client.run_statement.return_value = "Query OK"
+    client.last_results.return_value = []
+    client.session.database = None
+    # The client of the schema queries, see MetadataClient
+    metadata = Mock()
+    metadata.iserror.return_value = False
+    metadata.run_statement.return_value = "Query OK"
+    k.metadata_client.client = metadata
+    yield k
+
+
+def _execute(kernel, code, silent=False):
+    return asyncio.run(kernel.do_execute(code, silent))
+
+
+def _displayed(kernel):
+    return [
+        c[0][2]["data"]["text/html"]
+        for c in kernel.send_response.call_args_list
+        if c[0][1] == "display_data"
+    ]
+
+
+def _stderr(kernel):
+    return [
+        c[0][2]["text"]
+        for c in kernel.send_response.call_args_list
+        if c[0][1] == "stream" and c[0][2]["name"] == "stderr"
+    ]
+
+
+def test_kernel_runs_statements_one_by_one(kernel):
+    client = kernel.mariadb_client
+    rs = ResultSet(["a"])
+    rs.append_row(["1"])
+    client.run_statement.side_effect = ["Query OK", rs]
+    client.last_results.side_effect = [[], [rs]]
+
+    _execute(kernel, "create table t (a int);\nselect a from t;")
+
+    assert [c[0][0] for c in client.run_statement.call_args_list] == [
+        "create table t (a int);",
+        "select a from t;",
+    ]
+    displayed = _displayed(kernel)
+    assert len(displayed) == 2
+    assert displayed[0].startswith("Query OK (")
+    assert "1 rows in set" in displayed[1]
+    assert list(kernel.data["last_select"]["a"]) == [1]
+
+
+def test_kernel_stops_at_the_first_error(kernel):
+    client = kernel.mariadb_client
+    client.iserror.side_effect = [False, True]
+    client.error_message.return_value = "Table 'test.t' doesn't exist"
+
+    _execute(kernel, "select 1; select a from t; select 3;")
+
+    assert client.run_statement.call_count == 2
+    assert _stderr(kernel) == [
+        "Table 'test.t' doesn't exist\n",
+        "Statement 2 failed, the rest of the cell was skipped\n",
+    ]
+
+
+def test_kernel_does_not_report_skipped_statements_after_the_last_one(kernel):
+    client = kernel.mariadb_client
+    client.iserror.side_effect = [False, True]
+    client.error_message.return_value = "Table 'test.t' doesn't exist"
+
+    _execute(kernel, "select 1; select a from t;")
+
+    assert _stderr(kernel) == ["Table 'test.t' doesn't exist\n"]
+
+
+def test_kernel_reports_malformed_cells(kernel):
+    client = kernel.mariadb_client
+
+    _execute(kernel, "select 1;\nDELIMITER\nselect 2;")
+
+    # The statements before the malformed one run
+    assert client.run_statement.call_count == 1
+    assert _stderr(kernel) == ["DELIMITER must be followed by a delimiter\n"]
+
+
+def test_kernel_does_not_report_statement_errors_as_parsing_errors(kernel):
+    with patch.object(
+        kernel, "_run_statement", side_effect=ValueError("could not render")
+    ), patch.object(kernel, "_execute_magics") as execute_magics:
+        with pytest.raises(ValueError, match="could not render"):
+            _execute(kernel, "select 1;")
+
+    assert _stderr(kernel) == []
+    execute_magics.assert_not_called()
+
+
+def test_kernel_applies_delimiter_commands(kernel):
+    client = kernel.mariadb_client
+
+    _execute(kernel, "DELIMITER //\nselect 1//")
+
+    client.run_statement.assert_any_call("delimiter //")
+    client.run_statement.assert_called_with("select 1//", on_rows=None)
+    assert kernel.get_delimiter() == "//"
+
+
+def test_kernel_streams_rows_into_a_single_display(kernel):
+    kernel.client_config.stream_results.return_value = True
+    client = kernel.mariadb_client
+    rs = ResultSet(["a"])
+
+    def run_statement(code, on_rows):
+        for i in range(3):
+            rs.append_row([str(i)])
+            on_rows(rs)
+        return rs
+
+    client.run_statement.side_effect = run_statement
+    client.last_results.return_value = [rs]
+
+    _execute(kernel, "select a from t;")
+
+    calls = kernel.send_response.call_args_list
+    msg_types = [c[0][1] for c in calls]
+    # One display for the first rows, the final update once the query is done
+    assert msg_types[0] == "display_data"
+    assert msg_types[-1] == "update_display_data"
+    display_ids = {c[0][2]["transient"]["display_id"] for c in calls}
+    assert len(display_ids) == 1
+    assert "3 rows in set" in calls[-1][0][2]["data"]["text/html"]
+
+
+def test_kernel_keeps_the_first_and_last_rows_of_large_streams(kernel, tmp_path):
+    kernel.client_config.stream_results.return_value = True
+    kernel.client_config.stream_keep_rows.return_value = 10
+    kernel.client_config.display_max_rows.return_value = 6
+    client = kernel.mariadb_client
+    rs = ResultSet(["a"])
+
+    def run_statement(code, on_rows):
+        for i in range(1000):
+            rs.append_row([str(i)])
+            on_rows(rs)
+        return rs
+
+    client.run_statement.side_effect = run_statement
+    client.last_results.return_value = [rs]
+
+    _execute(kernel, "select a from t;")
+
+    # The first 7 and the last 3 rows, the display needs 3 of them
+    assert rs.num_rows() <= 13
+    assert rs.total_rows() == 1000
+    assert list(rs.rows(0, 7)) == [(str(i),) for i in range(7)]
+    assert list(rs.rows(rs.num_rows() - 3)) == [("997",), ("998",), ("999",)]
+    html = kernel.send_response.call_args_list[-1][0][2]["data"]["text/html"]
+    assert "1000 rows in set" in html
+    assert "<td>999</td>" in html
+    # Not stored for result=, and %df refuses to write part of it
+    assert not kernel.result_store.entries()
+    _execute(kernel, f"%df {tmp_path / 'out.csv'}")
+    assert "use stream=True" in _stderr(kernel)[-1]
+    assert not os.path.exists(tmp_path / "out.csv")
+
+
+def test_kernel_interrupt_kills_the_running_query(kernel):
+    client = kernel.mariadb_client
+
+    def run_statement(statement, on_rows=None):
+        os.kill(os.getpid(), signal.SIGINT)
+        client.iserror.return_value = True
+        client.error_message.return_value = "Query execution was interrupted"
+        return client.error_message.return_value
+
+    client.run_statement.side_effect = run_statement
+    client.kill_query.return_value = True
+    saved_handler = signal.getsignal(signal.SIGINT)
+
+    _execute(kernel, "select sleep(100);\nselect 1;")
+
+    client.kill_query.assert_called_once_with()
+    assert client.run_statement.call_count == 1
+    assert _stderr(kernel)[0] == "Query execution was interrupted\n"
+    assert signal.getsignal(signal.SIGINT) is saved_handler
+
+
+def test_kernel_interrupt_failure_lets_the_statement_finish(kernel):
+    client = kernel.mariadb_client
+
+    def run_statement(statement, on_rows=None):
+        os.kill(os.getpid(), signal.SIGINT)
+        return "Query OK"
+
+    client.run_statement.side_effect = run_statement
+    client.kill_query.return_value = False
+
+    rv = _execute(kernel, "select sleep(100);")
+
+    assert rv["status"] == "ok"
+    client.kill_query.assert_called_once_with()
+    assert _stderr(kernel) == []
+
+
+def test_kernel_serves_the_event_loop_while_a_statement_runs(kernel):
+    client = kernel.mariadb_client
+    served = threading.Event()
+
+    def run_statement(statement, on_rows=None):
+        # Only returns if the event loop keeps running meanwhile
+        assert served.wait(timeout=5)
+        return "Query OK"
+
+    client.run_statement.side_effect = run_statement
+
+    async def main():
+        execution = asyncio.ensure_future(kernel.do_execute("select 1;", False))
+        await asyncio.sleep(0.01)
+        assert not execution.done()
+        served.set()
+        return await execution
+
+    rv = asyncio.run(main())
+
+    assert rv["status"] == "ok"
+    assert _displayed(kernel)[0].startswith("Query OK (")
+
+
+def test_kernel_awaits_cell_magics(kernel):
+    client = kernel.mariadb_client
+
+    _execute(kernel, "%%delimiter //\nselect 1//")
+
+    assert [c[0][0] for c in client.run_statement.call_args_list] == [
+        "delimiter //",
+        "select 1//",
+        "delimiter ;",
+    ]
+    assert kernel.get_delimiter() == ";"
+
+
+def _complete(kernel, code):
+    return asyncio.run(kernel.do_complete(code, len(code)))
+
+
+def _inspect(kernel, code, cursor_pos):
+    return asyncio.run(kernel.do_inspect(code, cursor_pos))
+
+
+def test_kernel_completes_from_the_schema_index(kernel):
+    kernel.mariadb_client.session.database = "`shop`"
+    metadata = kernel.metadata_client.client
+    tables = ResultSet.from_rows(["TABLE_NAME"], [None], [["orders"], ["owners"]])
+    metadata.run_statement.side_effect = lambda sql, timeout: (
+        tables if "information_schema.TABLES" in sql else "Query OK"
+    )
+
+    reply = _complete(kernel, "select * from ord")
+
+    assert reply["matches"][0] == "orders"
+    assert (
+        call(
+            "SELECT TABLE_NAME FROM information_schema.TABLES "
+            "WHERE TABLE_SCHEMA = 'shop';",
+            timeout=5.0,
+        )
+        in metadata.run_statement.call_args_list
+    )
+    # Answered from the index from now on
+    calls = metadata.run_statement.call_count
+    _complete(kernel, "select * from ow")
+    assert metadata.run_statement.call_count == calls
+    # The session of the user is left alone
+    kernel.mariadb_client.run_statement.assert_not_called()
+
+
+def test_kernel_invalidates_the_schema_index_on_ddl(kernel):
+    kernel.schema_index.tables["shop"] = Mock()
+    kernel.mariadb_client.session.database = "shop"
+
+    _execute(kernel, "create table t (a int);")
+
+    assert "shop" not in kernel.schema_index.tables
+
+
+def test_kernel_inspects_tables_through_the_cache(kernel):
+    kernel.mariadb_client.session.database = "shop"
+    metadata = kernel.metadata_client.client
+    tables = ResultSet.from_rows(
+        ["TABLE_NAME", "TABLE_TYPE", "ENGINE", "TABLE_ROWS", "TABLE_COMMENT"],
+        [None] * 5,
+        [["t", "BASE TABLE", "Aria", "3", ""]],
+    )
+    metadata.run_statement.side_effect = lambda sql, timeout: (
+        tables if "TABLE_TYPE" in sql else "Query OK"
+    )
+
+    reply = _inspect(kernel, "select * from t;", len("select * from t"))
+
+    assert reply["found"]
+    assert reply["data"]["text/plain"].startswith("Table shop.t (Aria, ~3 rows)")
+    calls = metadata.run_statement.call_count
+    _inspect(kernel, "select * from t;", len("select * from t"))
+    assert metadata.run_statement.call_count == calls
+
+
+def test_kernel_serves_repeated_selects_from_the_result_cache(kernel):
+    client = kernel.mariadb_client
+    kernel.result_cache_enabled = True
+    client.session.database = "db"
+    rs = ResultSet(["a"])
+    rs.append_row(["1"])
+    client.run_statement.return_value = rs
+    client.last_results.return_value = [rs]
+
+    _execute(kernel, "select a from t;")
+    _execute(kernel, "select a\nfrom t;")
+
+    assert client.run_statement.call_count == 1
+    displayed = _displayed(kernel)
+    assert "1 rows in set (" in displayed[0]
+    assert "1 rows in set (cached)" in displayed[1]
+
+    client.run_statement.return_value = "Query OK"
+    client.last_results.return_value = []
+    _execute(kernel, "insert into t values (2);")
+    client.run_statement.return_value = rs
+    client.last_results.return_value = [rs]
+    _execute(kernel, "select a from t;")
+    assert client.run_statement.call_count == 3
+
+
+def test_kernel_result_cache_is_opt_in(kernel):
+    client = kernel.mariadb_client
+    rs = ResultSet(["a"])
+    client.run_statement.return_value = rs
+    client.last_results.return_value = [rs]
+
+    _execute(kernel, "select a from t;")
+    _execute(kernel, "select a from t;")
+
+    assert client.run_statement.call_count == 2
+
+
+def test_kernel_stores_the_last_result_of_every_cell(kernel):
+    client = kernel.mariadb_client
+    rs = ResultSet(["a"])
+    rs.append_row(["1"])
+    client.run_statement.return_value = rs
+    client.last_results.return_value = [rs]
+
+    kernel.execution_count = 4
+    _execute(kernel, "select a from t;")
+    kernel.execution_count = 5
+    _execute(kernel, "select a from t;", silent=True)
+
+    assert list(kernel.result_store.get(4)["a"]) == [1]
+    assert 5 not in kernel.result_store
+
+
+def _load_progress(kernel):
+    return [
+        c[0][2]["data"]["text/html"]
+        for c in kernel.send_response.call_args_list
+        if c[0][1] in ("display_data", "update_display_data") and "transient" in c[0][2]
+    ]
+
+
+def _load_client(client, statements):
+    counts = ResultSet(["ROW_COUNT()", "@@warning_count"])
+    counts.append_row(["2", "1"])
+
+    def run_statement(code, **kwargs):
+        statements.append(code)
+        return counts if code.startswith("SELECT ROW_COUNT()") else "Query OK"
+
+    client.run_statement.side_effect = run_statement
+
+
+def test_load_magic_loads_small_files_at_once(kernel, tmp_path):
+    path = tmp_path / "data.csv"
+    path.write_text("a;b\n1;2\n3;4\n")
+    statements = []
+    _load_client(kernel.mariadb_client, statements)
+
+    _execute(kernel, f"%load {path} t 1 delimiter=';' encoding=latin1")
+
+    assert statements[0] == (
+        f"LOAD DATA LOCAL INFILE '{path}'\n"
+        "IGNORE INTO TABLE t\n"
+        "CHARACTER SET latin1\n"
+        "FIELDS TERMINATED BY ';' OPTIONALLY ENCLOSED BY '\"'\n"
+        "LINES TERMINATED BY '\n'\n"
+        "IGNORE 1 LINES;"
+    )
+    assert statements[-1] == "select * from t limit 5;"
+    assert "Loaded 2 rows (1 warnings) into t in" in _load_progress(kernel)[-1]
+
+
+def test_load_magic_loads_chunks_with_workers(kernel, tmp_path):
+    path = tmp_path / "data.csv"
+    line = "x" * 1023 + "\n"
+    path.write_text("header\n" + line * 3000)
+    statements = []
+    _load_client(kernel.mariadb_client, statements)
+
+    with patch("mariadb_kernel.mariadb_client.create_client") as mock_create_client:
+        worker_statements = []
+        worker = mock_create_client.return_value
+        worker.iserror.return_value = False
+        _load_client(worker, worker_statements)
+        kernel.mariadb_client.session.replay.return_value = ["USE db;"]
+
+        _execute(kernel, f"%load {path} t skip=1 chunk_mb=1 workers=2")
+
+    loads = [s for s in statements + worker_statements if s.startswith("LOAD")]
+    assert len(loads) == 3
+    assert sum("IGNORE 1 LINES" in s for s in loads) == 1
+    assert worker_statements[0] == "USE db;"
+    worker.stop.assert_called_once()
+    progress = _load_progress(kernel)
+    assert "Loaded 2 chunks" in progress[1]
+    assert "Loaded 6 rows (3 warnings) into t in" in progress[-1]
+    assert not list(tmp_path.glob("mariadb_kernel_load_*"))
+
+
+def test_load_magic_reports_failed_chunks(kernel, tmp_path):
+    path = tmp_path / "data.csv"
+    path.write_text("1,2\n")
+    kernel.mariadb_client.iserror.return_value = True
+    kernel.mariadb_client.error_message.return_value = "ERROR 1146: no table"
+
+    _execute(kernel, f"%load {path} t")
+
+    assert _stderr(kernel) == ["ERROR 1146: no table\n"]
+
+
+def test_load_magic_converts_json_lines_and_creates_the_table(kernel, tmp_path):
+    path = tmp_path / "events.jsonl.gz"
+    with gzip.open(path, "wt") as f:
+        f.write('{"id": 1, "name": "a \\"b\\"", "tags": [1]}\n')
+        f.write('{"id": 2, "score": 1.5}\n')
+    statements = []
+    _load_client(kernel.mariadb_client, statements)
+
+    _execute(kernel, f"%load {path} events create=True")
+
+    assert statements[0] == (
+        "CREATE TABLE IF NOT EXISTS events (\n"
+        "  `id` BIGINT,\n"
+        "  `name` VARCHAR(255),\n"
+        "  `tags` JSON,\n"
+        "  `score` DOUBLE\n"
+        ");"
+    )
+    assert statements[1].startswith("LOAD DATA LOCAL INFILE '")
+    assert statements[1].endswith(
+        "IGNORE INTO TABLE events\n"
+        "CHARACTER SET utf8mb4\n"
+        "FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '\"' ESCAPED BY ''\n"
+        "LINES TERMINATED BY '\n'\n"
+        "(`id`, `name`, `tags`, `score`);"
+    )
+    assert "CREATE TABLE IF NOT EXISTS events" in _load_progress(kernel)[-1]
+    assert not list(tmp_path.glob("mariadb_kernel_load_*"))
+
+
+def _streaming_client(client, rows, batch):
+    def run_statement(code, on_rows=None, **kwargs):
+        rs = ResultSet(["id", "name"])
+        for i, row in enumerate(rows, start=1):
+            rs.append_row(row)
+            if on_rows is not None and i % batch == 0:
+                on_rows(rs)
+        client.last_results.return_value = [rs]
+        return rs
+
+    client.run_statement.side_effect = run_statement
+
+
+def test_df_magic_streams_the_last_query_to_a_file(kernel, tmp_path):
+    client = kernel.mariadb_client
+    rows = [[str(i), f"n{i}"] for i in range(25)]
+    _streaming_client(client, rows, batch=5)
+    _execute(kernel, "select id, name from t;")
+    assert kernel.data["last_query"] == "select id, name from t;"
+
+    path = tmp_path / "out.csv.gz"
+    with patch("mariadb_kernel.maria_magics.df.EXPORT_BATCH_ROWS", 10):
+        _execute(kernel, f"%df {path} stream=True")
+
+    assert client.run_statement.call_args[0][0] == "select id, name from t;"
+    with gzip.open(path, "rt") as f:
+        assert f.read() == "id,name\n" + "".join(f"{i},n{i}\n" for i in range(25))
+    # Only the rows of the last batch were still held by the client
+    assert client.last_results.return_value[0].num_rows() == 0
+    assert f"Wrote 25 rows to {path}" in _load_progress(kernel)[-1]
+
+
+def test_df_magic_only_runs_read_only_queries_again(kernel, tmp_path):
+    _streaming_client(kernel.mariadb_client, [["1", "a"]], batch=1)
+    _execute(kernel, "call proc();")
+
+    _execute(kernel, f"%df {tmp_path / 'out.csv'} stream=True")
+
+    assert _stderr(kernel) == ["Only read-only queries can be run again by %df\n"]
+
+
+def test_df_magic_has_the_server_write_the_file(kernel, tmp_path):
+    client = kernel.mariadb_client
+    kernel.client_config.server_is_local.return_value = True
+    _streaming_client(client, [["1", "a"]], batch=1)
+    _execute(kernel, "select id, name from t;")
+
+    count = ResultSet(["ROW_COUNT()"])
+    count.append_row(["1"])
+    client.run_statement.side_effect = ["", count]
+    _execute(kernel, f"%df {tmp_path / 'out.csv'} outfile=True")
+
+    assert client.run_statement.call_args_list[-2][0][0] == (
+        f"select id, name from t\nINTO OUTFILE '{tmp_path / 'out.csv'}'\n"
+        "FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '\"'\n"
+        "LINES TERMINATED BY '\\n';"
+    )
+    assert f"Wrote 1 rows to {tmp_path / 'out.csv'}" in _load_progress(kernel)[-1]
+
+    kernel.client_config.server_is_local.return_value = False
+    _execute(kernel, f"%df {tmp_path / 'out.csv'} outfile=True")
+    assert _stderr(kernel) == ["outfile=True needs the MariaDB server on this host\n"]
+
+
+def test_plot_magics_aggregate_on_the_server(kernel):
+    client = kernel.mariadb_client
+    rs = ResultSet(["country", "sum(amount)"], ["VAR_STRING", "NEWDECIMAL"])
+    rs.append_row(["FR", "12.5"])
+    rs.append_row(["DE", "7"])
+    client.run_statement.side_effect = None
+    client.run_statement.return_value = rs
+
+    _execute(kernel, "%bar table=shop.orders x=country y=amount top=2")
+
+    assert client.run_statement.call_args[0][0] == (
+        "SELECT `country` AS `country`, SUM(`amount`) AS `sum(amount)`\n"
+        "FROM `shop`.`orders`\n"
+        "GROUP BY 1\nORDER BY 2 DESC\nLIMIT 2;"
+    )
+    images = [
+        c[0][2]["data"]
+        for c in kernel.send_response.call_args_list
+        if c[0][1] == "display_data"
+    ]
+    assert list(images[-1]) == ["image/png"]
+    assert not kernel.executing
+
+
+def test_plot_magics_report_aggregation_errors(kernel):
+    client = kernel.mariadb_client
+    _execute(kernel, "%line table=orders y=amount")
+    assert _stderr(kernel) == ["The x option names the column to group by\n"]
+    client.run_statement.assert_not_called()
+
+    client.run_statement.return_value = ResultSet(["day", "count"])
+    _execute(kernel, '%line query="select * from orders" x=day bucket=day')
+    assert _stderr(kernel)[-1] == "There are no rows to plot\n"
+
+
+def test_kernel_connects_in_the_background(kernel):
+    connected = threading.Event()
+    client = kernel.mariadb_client
+    client.start.side_effect = lambda: connected.wait(5)
+    kernel.client_config.startup_timeout.return_value = 0.05
+
+    kernel.startup = kernel._start_connecting()
+    assert not kernel.is_connected()
+    # Completion requests don't wait for the connection
+    assert kernel._query_metadata(kernel.metadata_client, "SHOW DATABASES") is None
+    kernel.metadata_client.client.run_statement.assert_not_called()
+
+    _execute(kernel, "select 1;")
+    assert _stderr(kernel) == [
+        "The MariaDB server is not ready after 0 sec, "
+        "please run the cell again in a moment\n"
+    ]
+    client.run_statement.assert_not_called()
+
+    connected.set()
+    kernel.client_config.startup_timeout.return_value = 5
+    _execute(kernel, "select 1;")
+    assert client.run_statement.call_args[0][0] == "select 1;"
+    assert kernel.is_connected()
+
+
+def test_kernel_starts_a_server_when_none_is_running(kernel):
+    from ..mariadb_client import ServerIsDownError
+
+    client = kernel.mariadb_client
+    client.start.reset_mock()
+    client.start.side_effect = [ServerIsDownError(), None]
+    kernel.client_config.start_server.return_value = True
+    kernel.client_config.server_idle_timeout.return_value = 600
+
+    with patch("mariadb_kernel.kernel.MariaDBServer") as mock_server:
+        # No testing server runs yet
+        mock_server.return_value.attach.side_effect = [False, True]
+        kernel.startup = kernel._start_connecting()
+        kernel.startup.result(5)
+
+    server = mock_server.return_value
+    assert server.attach.call_args_list == [call(), call(start=True)]
+    assert client.start.call_count == 2
+    assert kernel.mariadb_server is server
+
+    kernel.do_shutdown(False)
+    server.detach.assert_called_once_with(600)
+
+
+def test_kernel_uses_a_running_testing_server(kernel):
+    kernel.client_config.start_server.return_value = True
+
+    with patch("mariadb_kernel.kernel.MariaDBServer") as mock_server:
+        mock_server.return_value.attach.return_value = True
+        kernel.startup = kernel._start_connecting()
+        kernel.startup.result(5)
+
+    mock_server.return_value.attach.assert_called_once_with()
+    assert kernel.mariadb_server is mock_server.return_value
+
+
+def test_kernel_retries_a_failed_connection(kernel):
+    from ..mariadb_client import ServerIsDownError
+
+    client = kernel.mariadb_client
+    client.start.reset_mock()
+    client.start.side_effect = [ServerIsDownError(), None]
+    kernel.client_config.start_server.return_value = False
+    kernel.startup = kernel._start_connecting()
+
+    _execute(kernel, "select 1;")
+    assert _stderr(kernel) == [
+        "Could not connect to the MariaDB server, please check the log "
+        "of the kernel. The kernel tries again with the next cell\n"
+    ]
+
+    _execute(kernel, "select 1;")
+    assert client.start.call_count == 2
+    assert client.run_statement.call_args[0][0] == "select 1;"
+
+
+def _stdout(kernel):
+    return [
+        c[0][2]["text"]
+        for c in kernel.send_response.call_args_list
+        if c[0][1] == "stream" and c[0][2]["name"] == "stdout"
+    ]
+
+
+def _connect_replica(kernel):
+    with patch("mariadb_kernel.connection_registry.create_client") as create:
+        replica = create.return_value
+        replica.iserror.return_value = False
+        replica.run_statement.return_value = "Query OK"
+        replica.last_results.return_value = []
+        replica.session.database = None
+        _execute(kernel, "%connect replica host=replica port=3307")
+    kernel.client_config.derive.assert_called_once_with(
+        {"host": "replica", "port": "3307"}
+    )
+    replica.start.assert_called_once_with()
+    return replica
+
+
+def test_kernel_runs_cells_on_named_connections(kernel):
+    default = kernel.mariadb_client
+    default_index = kernel.schema_index
+    replica = _connect_replica(kernel)
+
+    assert kernel.mariadb_client is replica
+    assert kernel.schema_index is not default_index
+    # The magics connecting to the server use the config of the connection
+    assert kernel.connection_config is kernel.client_config.derive.return_value
+    _execute(kernel, "select 1;")
+    replica.run_statement.assert_called_with("select 1;", on_rows=None)
+
+    # A single cell on another connection
+    _execute(kernel, "%%on default\nselect 2;")
+    default.run_statement.assert_called_with("select 2;", on_rows=None)
+    assert kernel.mariadb_client is replica
+
+    _execute(kernel, "%connect default")
+    assert kernel.mariadb_client is default
+    assert kernel.schema_index is default_index
+    assert kernel.connection_config is kernel.client_config
+    _execute(kernel, "%%on replica\nselect 3;")
+    replica.run_statement.assert_called_with("select 3;", on_rows=None)
+    assert kernel.mariadb_client is default
+
+    _execute(kernel, "%connect -d replica")
+    replica.stop.assert_called_once_with()
+    assert kernel.connection_registry.names() == ["default"]
+    assert not _stderr(kernel)
+
+
+def test_kernel_keeps_the_delimiter_of_every_connection(kernel):
+    replica = _connect_replica(kernel)
+    _execute(kernel, "delimiter //")
+    replica.run_statement.assert_called_with("delimiter //")
+
+    _execute(kernel, "%connect default")
+    assert kernel.get_delimiter() == ";"
+    _execute(kernel, "%connect replica")
+    assert kernel.get_delimiter() == "//"
+
+    # The other connections are closed with the kernel
+    kernel.do_shutdown(False)
+    replica.stop.assert_called_once_with()
+    assert kernel.connection_registry.active == "default"
+
+
+def test_kernel_reports_connection_errors(kernel):
+    from ..mariadb_client import ServerIsDownError
+
+    default = kernel.mariadb_client
+    with patch("mariadb_kernel.connection_registry.create_client") as create:
+        create.return_value.start.side_effect = ServerIsDownError()
+        _execute(kernel, "%connect replica host=replica")
+    # The client only logged why it couldn't start
+    with patch("mariadb_kernel.connection_registry.create_client") as create:
+        create.return_value.is_started.return_value = False
+        _execute(kernel, "%connect replica host=replica")
+    kernel.client_config.derive.side_effect = ValueError("Unknown options")
+    _execute(kernel, "%connect other datadir=/tmp")
+    _execute(kernel, "%connect other")
+    _execute(kernel, "%%on other\nselect 1;")
+    _execute(kernel, "%connect -d default")
+
+    assert len(_stderr(kernel)) == 6
+    assert _stderr(kernel)[1].startswith("Could not connect to")
+    assert _stderr(kernel)[2] == "Unknown options\n"
+    assert kernel.connection_registry.names() == ["default"]
+    assert kernel.mariadb_client is default
+    default.run_statement.assert_not_called()
+    assert not _stdout(kernel)
+
+
+def test_kernel_completes_while_a_statement_runs(kernel):
+    client = kernel.mariadb_client
+    client.session.database = "shop"
+    completions = []
+
+    def run_statement(statement, on_rows=None):
+        # A completion request arriving from another thread meanwhile
+        completer = threading.Thread(
+            target=lambda: completions.append(_complete(kernel, "select * from o"))
+        )
+        completer.start()
+        completer.join()
+        return "Query OK"
+
+    client.run_statement.side_effect = run_statement
+    _execute(kernel, "select sleep(1);")
+
+    assert client.run_statement.call_count == 1
+    assert completions[0]["status"] == "ok"
+    # Queried through the metadata client without waiting for the statement
+    kernel.metadata_client.client.run_statement.assert_called()
@@ -1,4 +1,6 @@
 import pytest
+import subprocess
+import time
 from subprocess import check_output
 from unittest.mock import Mock
 
@@ -42,3 +44,95 @@ def test_mariadb_server_starts_stops_mysqld_correctly(mariadb_server):
     server.server.wait(timeout=3)
 
     assert server.is_up() == False
+
+
+def test_mariadb_server_keeps_an_initialized_datadir(tmp_path):
+    from unittest.mock import patch
+    from ..mariadb_server import MariaDBServer
+
+    mocklog = Mock()
+    cfg = ClientConfig(mocklog, name="nonexistentcfg.json")  # default config
+    datadir = tmp_path / "datadir"
+    (datadir / "mysql").mkdir(parents=True)
+    cfg.default_config.update(
+        {
+            "server_datadir": str(datadir),
+            "socket": str(tmp_path / "mysqld.sock"),
+            "server_pid": str(tmp_path / "mysqld.pid"),
+        }
+    )
+
+    def popen(cmd, stderr, **kwargs):
+        stderr.write("starting\nmysqld: ready for connections.\n")
+        stderr.flush()
+        return process
+
+    with patch("mariadb_kernel.mariadb_server.subprocess") as mock_subprocess:
+        process = Mock()
+        process.poll.return_value = None
+        mock_subprocess.Popen.side_effect = popen
+
+        server = MariaDBServer(mocklog, cfg)
+        server.start()
+
+    mock_subprocess.run.assert_not_called()
+    assert mock_subprocess.Popen.call_args[1]["start_new_session"]
+    mocklog.info.assert_any_call("Using the existing MariaDB data directory")
+    mocklog.info.assert_any_call("Started MariaDB server successfully")
+
+
+def _server_config(tmp_path, mocklog):
+    cfg = ClientConfig(mocklog, name="nonexistentcfg.json")  # default config
+    # A process standing for the server
+    proc = subprocess.Popen(["sleep", "30"])
+    # Until exec, the process still runs the command line of pytest
+    while not open(f"/proc/{proc.pid}/cmdline", "rb").read().startswith(b"sleep"):
+        time.sleep(0.01)
+    pidfile = tmp_path / "mysqld.pid"
+    pidfile.write_text(str(proc.pid))
+    cfg.default_config.update({"server_bin": "sleep", "server_pid": str(pidfile)})
+    return cfg, proc
+
+
+def test_mariadb_server_last_kernel_stops_the_server(tmp_path):
+    from ..mariadb_server import MariaDBServer
+
+    mocklog = Mock()
+    cfg, proc = _server_config(tmp_path, mocklog)
+    first = MariaDBServer(mocklog, cfg)
+    second = MariaDBServer(mocklog, cfg)
+
+    assert first.attach() and second.attach()
+    first.detach(0)
+    assert proc.poll() is None
+
+    second.detach(0)
+    proc.wait(timeout=5)
+    mocklog.info.assert_any_call("Stopped MariaDB server successfully")
+
+
+def test_mariadb_server_is_kept_warm_after_the_last_kernel(tmp_path):
+    from unittest.mock import patch
+    from ..mariadb_server import MariaDBServer
+
+    mocklog = Mock()
+    cfg, proc = _server_config(tmp_path, mocklog)
+    server = MariaDBServer(mocklog, cfg)
+
+    try:
+        assert server.attach()
+        with patch("mariadb_kernel.mariadb_server.spawn_reaper") as mock_reaper:
+            server.detach(600)
+
+        assert proc.poll() is None
+        token = server.leases.idle_token()
+        mock_reaper.assert_called_once_with(
+            str(tmp_path), cfg.get_server_pidfile(), 600, token
+        )
+
+        # A kernel attaching again cancels the reaper
+        assert MariaDBServer(mocklog, cfg).attach()
+        assert server.leases.idle_token() is None
+    finally:
+        proc.kill()
+        proc.wait()
@@ -0,0 +1,74 @@
+import threading
+from unittest.mock import patch, Mock
+
+from ..client_config import ClientConfig
+from ..mariadb_client import ServerIsDownError
+from ..metadata_client import MetadataClient
+from ..result_set import ResultSet
+
+
+def _metadata_client():
+    cfg = ClientConfig(Mock())
+    cfg.default_config["metadata_timeout"] = "2"
+    return MetadataClient(Mock(), cfg)
+
+
+def test_metadata_client_connects_when_first_needed():
+    metadata = _metadata_client()
+    rows = ResultSet.from_rows(["SCHEMA_NAME"], [None], [["shop"]])
+
+    with patch("mariadb_kernel.metadata_client.create_client") as create:
+        client = create.return_value
+        client.iserror.return_value = False
+        client.run_statement.return_value = rows
+        assert metadata.query(
+            "SELECT SCHEMA_NAME FROM information_schema.SCHEMATA"
+        ) == [("shop",)]
+        client.run_statement.return_value = "Query OK"
+        assert metadata.query("SELECT 1") == []
+
+    create.assert_called_once_with(metadata.log, metadata.config)
+    client.start.assert_called_once_with()
+    client.run_statement.assert_called_with("SELECT 1;", timeout=2.0)
+
+    metadata.stop()
+    client.stop.assert_called_once_with()
+    assert metadata.client is None
+
+
+def test_metadata_client_reports_failures_as_no_answer():
+    metadata = _metadata_client()
+
+    with patch("mariadb_kernel.metadata_client.create_client") as create:
+        create.return_value.start.side_effect = ServerIsDownError()
+        assert metadata.query("SELECT 1") is None
+        assert metadata.client is None
+
+        create.return_value.start.side_effect = None
+        create.return_value.iserror.return_value = True
+        # e.g. the query was killed after metadata_timeout
+        assert metadata.query("SELECT 1") is None
+
+
+def test_metadata_client_does_not_wait_for_a_running_query():
+    metadata = _metadata_client()
+    metadata.client = Mock()
+    running = threading.Event()
+    done = threading.Event()
+
+    def run_statement(sql, timeout):
+        running.set()
+        done.wait(5)
+        return "Query OK"
+
+    metadata.client.iserror.return_value = False
+    metadata.client.run_statement.side_effect = run_statement
+    query = threading.Thread(target=metadata.query, args=("SELECT 1",))
+    query.start()
+    running.wait(5)
+    try:
+        assert metadata.query("SELECT 2") is None
+    finally:
+        done.set()
+        query.join()
+    assert metadata.client.run_statement.call_count == 1
@@ -0,0 +1,58 @@
+import pytest
+
+from mariadb_kernel.plot_query import MAX_GROUPS, AggregateQuery
+
+
+def test_aggregate_query_counts_rows_by_default():
+    query = AggregateQuery("country", table="orders")
+
+    assert query.y_name() == "count"
+    assert query.statement() == (
+        "SELECT `country` AS `country`, COUNT(*) AS `count`\n"
+        "FROM `orders`\n"
+        f"GROUP BY 1\nORDER BY 1\nLIMIT {MAX_GROUPS}"
+    )
+
+
+def test_aggregate_query_buckets_dates():
+    query = AggregateQuery(
+        "created", "amount", "AVG", query="SELECT * FROM orders WHERE shop=3;"
+    )
+
+    assert query.statement("month") == (
+        "SELECT DATE_FORMAT(`created`, '%Y-%m-01') AS `created`, "
+        "AVG(`amount`) AS `avg(amount)`\n"
+        "FROM (\nSELECT * FROM orders WHERE shop=3\n) AS source\n"
+        f"GROUP BY 1\nORDER BY 1\nLIMIT {MAX_GROUPS}"
+    )
+
+
+def test_aggregate_query_buckets_numbers():
+    query = AggregateQuery("price", table="orders")
+
+    assert "FLOOR(`price` / 10) * 10 AS `price`" in query.statement("10")
+    assert "FLOOR(`price` / 0.5) * 0.5 AS `price`" in query.statement("0.5")
+    with pytest.raises(ValueError, match="Invalid bucket fortnight"):
+        query.statement("fortnight")
+
+
+def test_aggregate_query_keeps_the_top_groups():
+    query = AggregateQuery("country", "amount", "max", table="orders")
+
+    assert query.statement(top=5).endswith("ORDER BY 2 DESC\nLIMIT 5")
+
+
+@pytest.mark.parametrize(
+    "args, error",
+    [
+        (("x", None, None, None, None), "Give either a table or a query"),
+        (("x", None, None, "t", "select 1"), "Give either a table or a query"),
+        ((None, None, None, "t", None), "The x option names the column"),
+        (("x", "y", "median", "t", None), "Unknown aggregate median"),
+        (("x", None, "sum", "t", None), "The y option names the column to sum"),
+    ],
+)
+def test_aggregate_query_rejects_invalid_options(args, error):
+    x, y, agg, table, query = args
+    with pytest.raises(ValueError, match=error):
+        AggregateQuery(x, y, agg, table=table, query=query)
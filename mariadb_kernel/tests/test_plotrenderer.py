@@ -0,0 +1,94 @@
+import base64
+
+import numpy
+from pandas import DataFrame
+import pytest
+
+from mariadb_kernel.plot_renderer import PlotRenderer, create_renderer, downsample
+
+
+def test_downsample_keeps_small_results():
+    df = DataFrame({"y": range(10)})
+    assert downsample(df, 100, {}) is df
+    assert downsample(df, 0, {}) is df
+
+
+def test_downsample_keeps_the_extremes_of_every_bucket():
+    y = numpy.zeros(10000)
+    y[1234] = 5
+    y[8765] = -5
+    df = DataFrame({"x": range(10000), "y": y})
+
+    rows = downsample(df, 100, {"x": "x", "y": "y"})
+
+    assert len(rows) <= 102
+    assert rows["y"].max() == 5
+    assert rows["y"].min() == -5
+    assert list(rows["x"]) == sorted(rows["x"])
+    assert rows["x"].iloc[0] == 0 and rows["x"].iloc[-1] == 9999
+
+
+def test_downsample_without_numeric_columns():
+    df = DataFrame({"name": [str(i) for i in range(1000)]})
+
+    rows = downsample(df, 100, {})
+
+    assert len(rows) == 50
+    assert rows["name"].iloc[0] == "0"
+
+
+def test_render_png():
+    image = PlotRenderer().render(DataFrame({"y": [1, 2]}), {"kind": "line"})
+    assert base64.b64decode(image).startswith(b"\x89PNG")
+
+
+def test_render_rejects_unknown_formats():
+    with pytest.raises(ValueError):
+        PlotRenderer("gif")
+
+
+def test_vega_lite_spec_of_a_bar_plot():
+    df = DataFrame({"country": ["FR", "DE"], "a.b": [1, 2], "c": [3.5, None]})
+
+    spec = create_renderer("vegalite").render(df, {"kind": "bar", "x": "country"})
+
+    assert spec["data"] == {
+        "values": "country,a.b,c\nFR,1,3.5\nDE,2,\n",
+        "format": {
+            "type": "csv",
+            "parse": {"country": "string", "a.b": "number", "c": "number"},
+        },
+    }
+    assert spec["transform"] == [{"fold": ["a\\.b", "c"], "as": ["column", "value"]}]
+    assert spec["mark"] == {"type": "bar"}
+    assert spec["encoding"] == {
+        "x": {"field": "country", "type": "nominal", "sort": None},
+        "y": {"field": "value", "type": "quantitative"},
+        "color": {"field": "column", "type": "nominal"},
+        "xOffset": {"field": "column"},
+    }
+
+
+def test_vega_lite_spec_of_a_pie_plot():
+    df = DataFrame({"country": ["FR", "DE"], "total": [1, 2]}).set_index("country")
+
+    spec = create_renderer("vegalite").render(
+        df, {"kind": "pie", "y": "total", "title": "Sales"}
+    )
+
+    assert spec["title"] == "Sales"
+    assert spec["mark"] == {"type": "arc"}
+    assert spec["encoding"] == {
+        "theta": {"field": "total", "type": "quantitative"},
+        "color": {"field": "country", "type": "nominal", "sort": None},
+    }
+
+
+def test_vega_lite_spec_rejects_unknown_columns():
+    with pytest.raises(ValueError, match="Unknown column z"):
+        create_renderer("vegalite").render(DataFrame({"y": [1]}), {"y": "z"})
+
+
+def test_create_renderer_rejects_unknown_formats():
+    with pytest.raises(ValueError, match="Unknown plot format gif"):
+        create_renderer("gif")
@@ -0,0 +1,74 @@
+from ..result_cache import ResultCache, normalize
+from ..result_set import ResultSet
+
+
+def _rs(num_rows):
+    rs = ResultSet(["a", "b"])
+    for i in range(num_rows):
+        rs.append_row([i, i])
+    return rs
+
+
+def test_normalize_keeps_quoted_text():
+    assert normalize("select  *\n from t\twhere a = 'x  y' ;", ";") == (
+        "select * from t where a = 'x  y'"
+    )
+    assert normalize("select `a  b` from t//", "//") == "select `a  b` from t"
+
+
+def test_only_deterministic_selects_are_cacheable():
+    cache = ResultCache(10, 1000)
+    assert cache.cacheable("select * from t where a > 1;", "db")
+    assert cache.cacheable("WITH x AS (select 1) select * from x;", "db")
+    assert not cache.cacheable("select now();", "db")
+    assert not cache.cacheable("select rand() from t;", "db")
+    assert not cache.cacheable("select @a;", "db")
+    assert not cache.cacheable("select * from t for update;", "db")
+    assert not cache.cacheable("select * from information_schema.tables;", "db")
+    assert not cache.cacheable("select * from tables;", "information_schema")
+    assert not cache.cacheable("select 1 into @a;", "db")
+    assert not cache.cacheable("show tables;", "db")
+    assert not cache.cacheable("insert into t values (1);", "db")
+
+
+def test_results_are_keyed_on_normalized_sql_and_database():
+    cache = ResultCache(10, 1000)
+    results = [_rs(3)]
+    cache.put("select * from t;", "db", ";", results)
+
+    assert cache.get("select *\n  from t ;", "db", ";") is results
+    assert cache.get("select * from t;", "other", ";") is None
+    assert cache.get("SELECT * from t;", "db", ";") is None
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_writes_invalidate_the_queries_reading_the_table():
+    cache = ResultCache(10, 1000)
+    cache.put("select * from t join u on t.a = u.a;", "db", ";", [_rs(1)])
+    cache.put("select * from other.v;", "db", ";", [_rs(1)])
+    cache.put("select * from w;", "db", ";", [_rs(1)])
+
+    cache.invalidate("select * from t;", "db")
+    cache.invalidate("use other;", "db")
+    assert len(cache.entries()) == 3
+
+    cache.invalidate("update u set a = 2;", "db")
+    cache.invalidate("insert into v values (1);", "other")
+    assert [key[0] for key, _ in cache.entries()] == ["select * from w"]
+
+    # Statements whose targets can't be told drop everything
+    cache.invalidate("call refresh();", "db")
+    assert cache.entries() == []
+
+
+def test_cache_is_bounded_by_cells():
+    cache = ResultCache(10, 100)
+    cache.put("select 1 from a;", "db", ";", [_rs(30)])
+    cache.put("select 2 from a;", "db", ";", [_rs(30)])
+    assert cache.cells() == 60
+    cache.put("select 3 from a;", "db", ";", [_rs(30)])
+    assert cache.cells() == 60
+    assert cache.get("select 1 from a;", "db", ";") is None
+    # Larger than the whole cache
+    cache.put("select 4 from a;", "db", ";", [_rs(51)])
+    assert cache.get("select 4 from a;", "db", ";") is None
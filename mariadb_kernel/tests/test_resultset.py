@@ -0,0 +1,115 @@
+import datetime
+from decimal import Decimal
+
+from ..result_set import ClientOutputParser, ResultSet
+
+
+def test_result_set_parses_client_html_once():
+    html = (
+        "<TABLE BORDER=1><TR><TH>a</TH><TH>b</TH></TR>"
+        "<TR><TD>1</TD><TD>x &amp; &quot;y&quot;</TD></TR>"
+        "<TR><TD>NULL</TD><TD>z</TD></TR></TABLE>"
+        "<TABLE BORDER=1><TR><TH>c</TH></TR><TR><TD>2</TD></TR></TABLE>"
+    )
+
+    results = ResultSet.from_html(html)
+
+    assert len(results) == 2
+    assert results[0].columns == ["a", "b"]
+    assert results[0].values == [["1", None], ['x & "y"', "z"]]
+    assert results[0].num_rows() == 2
+    assert results[1].columns == ["c"]
+
+    # Rendering gives back exactly what the client printed
+    assert "".join(str(r) for r in results) == html
+
+
+def test_result_set_dataframe_infers_text_columns():
+    rs = ResultSet(["num", "text"])
+    rs.append_row(["1", "a"])
+    rs.append_row([None, "b"])
+
+    df = rs.to_dataframe()
+
+    assert list(df.columns) == ["num", "text"]
+    assert df["num"].dtype.kind == "f"
+    assert list(df["text"]) == ["a", "b"]
+
+
+def test_result_set_dataframe_keeps_server_types():
+    now = datetime.datetime(2021, 6, 8, 12, 30)
+    rs = ResultSet.from_rows(
+        ["i", "d", "t", "i"],
+        ["LONG", "NEWDECIMAL", "DATETIME", "LONG"],
+        [(1, Decimal("1.5"), now, 2), (3, Decimal("2.5"), now, 4)],
+    )
+
+    df = rs.to_dataframe()
+
+    # Duplicate column names must survive too
+    assert list(df.columns) == ["i", "d", "t", "i"]
+    assert df.iloc[:, 0].dtype.kind == "i"
+    assert df["d"].dtype.kind == "f"
+    assert df["t"].dtype.kind == "M"
+
+
+def test_result_set_without_rows():
+    rs = ResultSet(affected_rows=3)
+
+    assert not rs.has_rows()
+    assert rs.to_dataframe().empty
+    assert str(rs) == "Query OK, 3 rows affected"
+    assert str(ResultSet()) == "Query OK"
+
+    rs = ResultSet.from_rows(["a"], ["LONG"], [])
+    assert rs.has_rows()
+    assert rs.num_rows() == 0
+    assert list(rs.to_dataframe().columns) == ["a"]
+
+
+def test_client_output_parser_reads_rows_as_they_arrive():
+    parser = ClientOutputParser()
+
+    parser.feed("<TAB")
+    assert parser.current() is None
+    parser.feed("LE BORDER=1><TR><TH>a</TH></TR><TR><TD>1</T")
+    assert parser.current().columns == ["a"]
+    assert parser.current().num_rows() == 0
+    parser.feed("D></TR><TR><TD>2</TD></TR>")
+    assert parser.current().values == [["1", "2"]]
+    parser.feed("</TABLE>\r\n")
+    parser.close()
+
+    assert len(parser.results()) == 1
+    assert parser.text().strip() == ""
+
+
+def test_client_output_parser_keeps_text_output_as_is():
+    parser = ClientOutputParser()
+
+    parser.feed("ERROR 1064 (42000): ... near '<TABLE>")
+    parser.feed(" x' at line 1")
+    parser.close()
+
+    assert parser.results() == []
+    assert parser.text() == "ERROR 1064 (42000): ... near '<TABLE> x' at line 1"
+
+
+def test_result_set_keeps_the_first_and_last_rows():
+    rs = ResultSet(["n", "sq"])
+    rs.keep_at_most(10, 3)
+    for i in range(100):
+        rs.append_row([i, i * i])
+
+    assert rs.total_rows() == 100
+    assert rs.num_rows() < 13
+    assert rs.head_rows() == 7
+    assert [n for n, _ in rs.rows(0, 7)] == list(range(7))
+    assert [n for n, _ in rs.rows(rs.num_rows() - 3)] == [97, 98, 99]
+
+    small = ResultSet(["n"])
+    small.keep_at_most(10, 3)
+    for i in range(10):
+        small.append_row([i])
+    assert small.skipped_rows == 0
+    assert small.head_rows() == 10
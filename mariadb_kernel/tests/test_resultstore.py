@@ -0,0 +1,89 @@
+import logging
+import os
+
+import pytest
+from pandas import DataFrame
+
+from ..result_store import ResultStore
+
+
+def _store(max_bytes=1 << 20, spill=False):
+    return ResultStore(logging.getLogger("test_resultstore"), max_bytes, spill)
+
+
+def _df(num_rows):
+    return DataFrame({"a": range(num_rows), "b": [float(i) for i in range(num_rows)]})
+
+
+def test_store_keeps_results_by_execution_count_and_name():
+    store = _store()
+    first = _df(3)
+    second = _df(4)
+    store.add(1, first)
+    store.add(2, second)
+
+    assert store.get(1) is first
+    assert store.get(2) is second
+    assert store.get(3) is None
+
+    assert store.name("sales")
+    assert store.name("first", 1)
+    assert not store.name("missing", 3)
+    assert store.get("sales") is second
+    assert store.get("first") is first
+    assert store.get("missing") is None
+
+    assert store.drop("first")
+    assert not store.drop("first")
+    assert store.get("first") is None
+
+
+def test_store_lists_the_most_recent_cells_first():
+    store = _store()
+    store.add(1, _df(3))
+    store.add(2, _df(4))
+    store.add(2, _df(5))
+    store.name("sales")
+
+    entries = store.entries()
+    assert [(r.execution_count, names, loc) for r, names, loc in entries] == [
+        (2, ["sales"], "memory"),
+        (1, [], "memory"),
+    ]
+    assert (entries[0][0].num_rows, entries[0][0].num_columns) == (5, 2)
+
+
+def test_store_drops_the_least_recently_used_results():
+    store = _store(max_bytes=1)
+    store.add(1, _df(10))
+    assert store.get(1) is None
+
+    one = DataFrame({"a": range(100)})
+    nbytes = int(one.memory_usage(index=True, deep=True).sum())
+    store = _store(max_bytes=2 * nbytes)
+    store.add(1, DataFrame({"a": range(100)}))
+    store.add(2, DataFrame({"a": range(100)}))
+    store.get(1)
+    store.add(3, DataFrame({"a": range(100)}))
+
+    assert 2 not in store
+    assert 1 in store and 3 in store
+
+
+def test_store_spills_evicted_results_to_disk():
+    pytest.importorskip("pyarrow")
+    one = _df(100)
+    nbytes = int(one.memory_usage(index=True, deep=True).sum())
+    store = _store(max_bytes=nbytes, spill=True)
+    store.add(1, one)
+    store.add(2, _df(100))
+
+    assert [loc for _, _, loc in store.entries()] == ["memory", "disk"]
+    spill_dir = store.spill_dir
+    assert len(os.listdir(spill_dir)) == 1
+
+    assert list(store.get(1)["a"]) == list(range(100))
+    assert [loc for _, _, loc in store.entries()] == ["disk", "memory"]
+
+    store.close()
+    assert not os.path.exists(spill_dir)
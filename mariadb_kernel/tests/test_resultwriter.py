@@ -0,0 +1,89 @@
+import gzip
+
+import pytest
+
+from mariadb_kernel.result_set import ResultSet
+from mariadb_kernel.result_writer import detect_format, open_writer
+
+
+def _result_set(rows):
+    rs = ResultSet(["id", "name"])
+    for row in rows:
+        rs.append_row(row)
+    return rs
+
+
+def test_detect_format():
+    assert detect_format("out.csv") == "csv"
+    assert detect_format("OUT.CSV.GZ") == "csv.gz"
+    assert detect_format("out.parquet") == "parquet"
+    assert detect_format("out.feather") == "feather"
+    assert detect_format("out") == "csv"
+
+
+def test_csv_writer_writes_the_header_once(tmp_path):
+    path = tmp_path / "out.csv"
+    writer = open_writer(str(path), "csv")
+    writer.write(_result_set([["1", "a,b"]]))
+    writer.write(_result_set([["2", None]]))
+    writer.close()
+
+    assert path.read_bytes() == b'id,name\r\n1,"a,b"\r\n2,\r\n'
+
+
+def test_csv_writer_compresses(tmp_path):
+    path = tmp_path / "out.csv.gz"
+    writer = open_writer(str(path), "csv.gz")
+    writer.write(_result_set([["1", "a"]]))
+    writer.close()
+
+    with gzip.open(path, "rt", newline="") as f:
+        assert f.read() == "id,name\r\n1,a\r\n"
+
+
+def test_open_writer_rejects_unknown_formats(tmp_path):
+    with pytest.raises(ValueError, match="Unknown format xlsx"):
+        open_writer(str(tmp_path / "out.xlsx"), "xlsx")
+
+
+def test_arrow_writer_writes_batches(tmp_path):
+    pyarrow = pytest.importorskip("pyarrow")
+    import pyarrow.parquet
+
+    path = tmp_path / "out.parquet"
+    writer = open_writer(str(path), "parquet")
+    writer.write(_result_set([["1", "a"]]))
+    writer.write(_result_set([["2", "b"]]))
+    writer.close()
+
+    assert pyarrow.parquet.read_table(path).num_rows == 2
+
+
+def test_arrow_writer_keeps_the_schema_of_the_first_batch(tmp_path):
+    pyarrow = pytest.importorskip("pyarrow")
+    import pyarrow.parquet
+
+    # Types guessed from the values of each batch would differ
+    path = tmp_path / "out.parquet"
+    writer = open_writer(str(path), "parquet")
+    writer.write(_result_set([["1", None], ["2", None]]))
+    writer.write(_result_set([["x3", "b"]]))
+    writer.close()
+
+    table = pyarrow.parquet.read_table(path)
+    assert table.column("id").to_pylist() == ["1", "2", "x3"]
+    assert table.column("name").to_pylist() == [None, None, "b"]
+
+    # Typed values from the native client, NULL columns become strings
+    path = tmp_path / "typed.feather"
+    writer = open_writer(str(path), "feather")
+    typed = ResultSet.from_rows(["id", "name"], ["LONG", "VAR_STRING"], [[1, None]])
+    writer.write(typed)
+    writer.write(
+        ResultSet.from_rows(["id", "name"], ["LONG", "VAR_STRING"], [[2, "b"]])
+    )
+    writer.close()
+
+    table = pyarrow.ipc.open_file(str(path)).read_all()
+    assert table.column("id").to_pylist() == [1, 2]
+    assert table.column("name").to_pylist() == [None, "b"]
@@ -0,0 +1,80 @@
+from unittest.mock import Mock
+
+from ..schema_index import PrefixList, SchemaIndex, split_name
+
+
+def _query():
+    def query(sql):
+        if "SCHEMATA" in sql:
+            return [("shop",), ("test",)]
+        if "ROUTINES" in sql:
+            return [("p",)]
+        if "TABLES" in sql and "'shop'" in sql:
+            return [("orders",), ("Customers",)]
+        if "COLUMNS" in sql and "'shop'" in sql:
+            return [("orders", "id"), ("orders", "total"), ("Customers", "id")]
+        return []
+
+    return Mock(side_effect=query)
+
+
+def test_prefix_list_matches_case_insensitively():
+    names = PrefixList(["orders", "Order_items", "customers", "ord"])
+    assert names.matches("ORD") == ["ord", "Order_items", "orders"]
+    assert names.matches("x") == []
+    assert "CUSTOMERS" in names
+    assert "custom" not in names
+
+
+def test_split_name():
+    assert split_name("t") == (None, "t")
+    assert split_name("db.t") == ("db", "t")
+    assert split_name("`my.db`.`t``1`") == ("my.db", "t`1")
+
+
+def test_index_loads_each_database_once():
+    query = _query()
+    index = SchemaIndex(Mock(), query)
+
+    assert index.get_tables("shop").matches("") == ["Customers", "orders"]
+    assert index.get_columns("shop", "ORDERS").matches("") == ["id", "total"]
+    assert index.get_columns("shop", "customers").matches("") == ["id"]
+    assert index.get_tables("shop").matches("o") == ["orders"]
+    assert query.call_count == 2
+
+    assert index.get_databases().matches("s") == ["shop"]
+    assert index.get_routines().matches("") == ["p"]
+    index.get_databases()
+    assert query.call_count == 4
+
+
+def test_index_invalidates_what_ddl_changes():
+    query = _query()
+    index = SchemaIndex(Mock(), query)
+    index.get_databases()
+    index.get_tables("shop")
+    index.get_tables("test")
+    index.get_routines()
+
+    index.invalidate("select * from orders;", "shop")
+    index.invalidate("create table shop.t (a int);", "test")
+    assert "shop" not in index.tables
+    assert "test" in index.tables
+    assert index.databases is not None
+
+    index.invalidate("drop procedure p;", "shop")
+    assert index.routines is None
+    assert "test" in index.tables
+
+    index.invalidate("create database if not exists other;", "shop")
+    assert index.databases is None
+    assert index.tables == {}
+
+
+def test_index_retries_when_the_server_cannot_be_queried():
+    index = SchemaIndex(Mock(), Mock(return_value=None))
+    assert index.get_tables("shop").matches("") == []
+    assert index.get_databases().matches("") == []
+
+    index.query = _query()
+    assert index.get_tables("shop").matches("o") == ["orders"]
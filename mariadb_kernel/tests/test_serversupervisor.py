@@ -0,0 +1,66 @@
+import os
+import subprocess
+import time
+
+from ..server_supervisor import ServerLeases, pid_alive, reap, spawn_reaper
+
+
+def _sleeper(tmp_path):
+    proc = subprocess.Popen(["sleep", "30"])
+    pidfile = tmp_path / "mysqld.pid"
+    pidfile.write_text(f"{proc.pid}\n")
+    return proc, str(pidfile)
+
+
+def test_leases_are_held_by_running_kernels(tmp_path):
+    leases = ServerLeases(str(tmp_path))
+    with leases.lock():
+        leases.acquire()
+        # The lease of a kernel that died without releasing it
+        open(os.path.join(leases.lease_dir, "999999999.dead"), "w").close()
+
+        assert leases.holders() == [leases.lease]
+        assert os.listdir(leases.lease_dir) == [os.path.basename(leases.lease)]
+
+        leases.release()
+        assert leases.holders() == []
+
+
+def test_reaper_stops_the_idle_server(tmp_path):
+    proc, pidfile = _sleeper(tmp_path)
+    leases = ServerLeases(str(tmp_path))
+    with leases.lock():
+        token = leases.mark_idle()
+
+    assert not reap(str(tmp_path), pidfile, 0, "a later reaper")
+    assert reap(str(tmp_path), pidfile, 0, token)
+    proc.wait(timeout=5)
+    assert leases.idle_token() is None
+
+
+def test_reaper_leaves_a_leased_server_running(tmp_path):
+    proc, pidfile = _sleeper(tmp_path)
+    leases = ServerLeases(str(tmp_path))
+    with leases.lock():
+        token = leases.mark_idle()
+        other = ServerLeases(str(tmp_path))
+        other.acquire()
+
+    try:
+        assert not reap(str(tmp_path), pidfile, 0, token)
+        assert proc.poll() is None
+    finally:
+        proc.kill()
+        proc.wait()
+
+
+def test_spawned_reaper_outlives_its_parent(tmp_path):
+    proc, pidfile = _sleeper(tmp_path)
+    leases = ServerLeases(str(tmp_path))
+    with leases.lock():
+        token = leases.mark_idle()
+
+    spawn_reaper(str(tmp_path), pidfile, 0.1, token)
+
+    proc.wait(timeout=10)
+    assert not pid_alive(proc.pid)
@@ -0,0 +1,41 @@
+from ..session_journal import SessionJournal, MAX_SET_STATEMENTS
+
+
+def test_journal_records_session_changes():
+    journal = SessionJournal()
+    assert journal.replay() == []
+
+    journal.record("use test;")
+    journal.record("set @a = 1;")
+    journal.record("SET SESSION sql_mode = 'ANSI';")
+    journal.record("set global max_connections = 10;")
+    journal.record("set password = password('x');")
+    journal.record("select 1;")
+    journal.record("USE `my db`;")
+    # Exact duplicates only run once, at their latest position
+    journal.record("set @a = 1;")
+
+    assert journal.replay() == [
+        "USE `my db`;",
+        "SET SESSION sql_mode = 'ANSI';",
+        "set @a = 1;",
+    ]
+
+
+def test_journal_follows_the_delimiter():
+    journal = SessionJournal()
+    journal.record("delimiter $$")
+    journal.record("set @b = 2$$")
+
+    assert journal.delimiter == "$$"
+    assert journal.replay() == ["set @b = 2;"]
+
+
+def test_journal_forgets_the_oldest_set_statements():
+    journal = SessionJournal()
+    for i in range(MAX_SET_STATEMENTS + 5):
+        journal.record(f"set @v{i} = {i};")
+
+    replay = journal.replay()
+    assert len(replay) == MAX_SET_STATEMENTS
+    assert replay[0] == "set @v5 = 5;"
@@ -15,6 +15,7 @@ setup(
     author_email="foundation@mariadb.org",
     url="https://github.com/MariaDB/mariadb_kernel",
     install_requires=open("requirements.txt").read().splitlines(),
+    extras_require={"native": ["PyMySQL"], "spill": ["pyarrow"]},
     python_requires=">=3.5",
     classifiers=[
         "License :: OSI Approved :: BSD License",